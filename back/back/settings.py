@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "bodega.middleware.InstrumentacionMiddleware",  # primero: mide la request completa
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -83,6 +84,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # BEGIN IMMEDIATE: con varios workers el posteo espera el lock de escritura
+        # en vez de fallar con "database is locked" al pasar de lectura a escritura.
+        # Solo lo toman los atomic(): las lecturas van en autocommit (sin
+        # ATOMIC_REQUESTS) y todo atomic() de bodega escribe. No envolver lecturas
+        # en atomic() ni activar ATOMIC_REQUESTS con este modo.
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
     }
 }
 
@@ -122,6 +129,73 @@ USE_TZ = True
 STATIC_URL = 'static/'
 
 
+# ==============================
+# DRF
+# ==============================
+
+# Alias de CACHES para compartir la cache de nombres de referencia (y la
+# versión de la LRU de códigos) entre procesos (locmem/file/Redis). None =
+# cache en memoria de cada proceso, que compara su versión con la base (un
+# query chico como mucho una vez por segundo) para ver cambios de otros workers.
+BODEGA_CACHE_REFERENCIA = None
+
+# Máximo de códigos en la LRU del endpoint de lectores (/productos/codigo/)
+BODEGA_CACHE_CODIGOS = 4096
+
+# Alias de CACHES para guardar listados serializados por ETag (productos,
+# categorías). None = solo GET condicional (304), sin cache de respuestas.
+BODEGA_CACHE_LISTADOS = None
+
+# Listados de stock y movimientos leídos con values_list() y serializados sin
+# instanciar modelos (bodega.serializers.LecturaRapida), con la misma salida
+# que los serializers. False = camino normal de DRF (ver el escenario *_drf de
+# manage.py bench).
+BODEGA_LECTURA_RAPIDA = True
+
+# Días que se guardan los tombstones del feed /bodega/sync/; un token más
+# viejo recibe 410 y el cliente debe sincronizar desde cero.
+BODEGA_SYNC_RETENCION_DIAS = 90
+
+# Segundos que el feed de sync deja fuera de cada ventana por transacciones en
+# vuelo (filas con actualizado_en anterior que aún no se confirman). None =
+# timeout de la base + reintentos del posteo (ver bodega.sync.margen); subirlo
+# si hay escrituras más largas (ej. importaciones grandes) o en PostgreSQL
+# según el lock_timeout.
+BODEGA_SYNC_MARGEN_SEGUNDOS = None
+
+# Máximo de queries por request según la ruta (nombre de la vista). La clave
+# "ruta" vale para GET/HEAD; las escrituras se controlan solo si tienen su
+# propia clave ("ruta", "POST"). Sobre el presupuesto, InstrumentacionMiddleware
+# registra un warning y lo cuenta en /bodega/metrics; en tests,
+# bodega.metricas.verificar_presupuesto() falla.
+BODEGA_PRESUPUESTO_QUERIES = {
+    "producto-list": 6, "producto-detail": 3, "producto-buscar": 2, "producto-codigo": 2,
+    "categoria-list": 3, "categoria-detail": 1, "categoria-ancestros": 1, "categoria-descendientes": 1,
+    "marca-list": 2, "marca-detail": 1, "unidadmedida-list": 2, "unidadmedida-detail": 1,
+    "proveedor-list": 2, "proveedor-detail": 1, "productoproveedor-list": 2, "productoproveedor-detail": 1,
+    "bodega-list": 2, "bodega-detail": 1,
+    "stock-list": 2, "stock-detail": 1, "stock-a-fecha": 2,
+    "stocklote-list": 2, "stocklote-detail": 1, "stocklote-por-vencer": 2,
+    "kardex-list": 2, "kardex-detail": 1, "alertareposicion-list": 2, "alertareposicion-detail": 1,
+    "resumeninventario-list": 2, "resumeninventario-detail": 1,
+    "movimientoentrada-list": 3, "movimientoentrada-detail": 3,
+    "movimientosalida-list": 3, "movimientosalida-detail": 3,
+    "movimientotransferencia-list": 3, "movimientotransferencia-detail": 3,
+    "sync": 8,
+}
+
+REST_FRAMEWORK = {
+    # keyset por defecto; ?page=N para paginación numerada
+    "DEFAULT_PAGINATION_CLASS": "bodega.pagination.PaginacionCursor",
+    "PAGE_SIZE": 50,
+    # JSON con orjson si está instalado (misma salida que el JSONRenderer de DRF)
+    "DEFAULT_RENDERER_CLASSES": [
+        "bodega.renderers.JSONRapidoRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+
 # ==============================
 # CORS CONFIG (React + Vite)
 # ==============================
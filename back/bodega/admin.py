@@ -2,8 +2,8 @@ from django.contrib import admin
 from .models import (
     Categoria, Marca, UnidadMedida, Proveedor,
     Producto, ProductoProveedor,
-    Bodega, Stock,
-    MovimientoEntrada, MovimientoSalida, MovimientoLinea
+    Bodega, Stock, StockLote, Eliminacion, Kardex, KardexCierre, AlertaReposicion, ResumenInventario, CodigoProducto,
+    MovimientoEntrada, MovimientoSalida, MovimientoTransferencia, MovimientoLinea
 )
 
 @admin.register(Categoria)
@@ -73,6 +73,52 @@ class StockAdmin(admin.ModelAdmin):
     search_fields = ("producto__sku", "producto__nombre", "bodega__nombre")
     autocomplete_fields = ("bodega", "producto")
 
+@admin.register(Eliminacion)
+class EliminacionAdmin(admin.ModelAdmin):
+    list_display = ("id", "modelo", "objeto_id", "eliminado_en")
+    list_filter = ("modelo",)
+
+@admin.register(StockLote)
+class StockLoteAdmin(admin.ModelAdmin):
+    list_display = ("id", "bodega", "producto", "lote", "vencimiento", "cantidad", "actualizado_en")
+    list_filter = ("bodega",)
+    search_fields = ("producto__sku", "producto__nombre", "lote")
+    autocomplete_fields = ("bodega", "producto")
+
+@admin.register(Kardex)
+class KardexAdmin(admin.ModelAdmin):
+    list_display = ("id", "fecha", "bodega", "producto", "tipo", "movimiento_id", "delta", "saldo")
+    list_filter = ("tipo", "bodega")
+    search_fields = ("producto__sku", "producto__nombre")
+    autocomplete_fields = ("bodega", "producto")
+
+
+@admin.register(KardexCierre)
+class KardexCierreAdmin(admin.ModelAdmin):
+    list_display = ("id", "fecha", "bodega", "producto", "saldo")
+    list_filter = ("bodega",)
+    search_fields = ("producto__sku", "producto__nombre")
+    autocomplete_fields = ("bodega", "producto")
+
+@admin.register(AlertaReposicion)
+class AlertaReposicionAdmin(admin.ModelAdmin):
+    list_display = ("id", "bodega", "producto", "cantidad", "faltante", "sugerido", "actualizado_en")
+    list_filter = ("bodega",)
+    search_fields = ("producto__sku", "producto__nombre")
+    autocomplete_fields = ("bodega", "producto")
+
+@admin.register(ResumenInventario)
+class ResumenInventarioAdmin(admin.ModelAdmin):
+    list_display = ("id", "bodega", "dimension", "referencia", "cantidad", "valor", "productos", "actualizado_en")
+    list_filter = ("bodega", "dimension")
+
+@admin.register(CodigoProducto)
+class CodigoProductoAdmin(admin.ModelAdmin):
+    list_display = ("id", "codigo", "tipo", "producto")
+    list_filter = ("tipo",)
+    search_fields = ("codigo", "producto__sku", "producto__nombre")
+    autocomplete_fields = ("producto",)
+
 class MovimientoLineaEntradaInline(admin.TabularInline):
     model = MovimientoLinea
     extra = 0
@@ -91,6 +137,15 @@ class MovimientoLineaSalidaInline(admin.TabularInline):
     fk_name = "movimiento_salida"
 
 
+class MovimientoLineaTransferenciaInline(admin.TabularInline):
+    model = MovimientoLinea
+    extra = 0
+    autocomplete_fields = ("producto",)
+
+    # Solo se verá en MovimientoTransferencia
+    fk_name = "movimiento_transferencia"
+
+
 @admin.register(MovimientoEntrada)
 class MovimientoEntradaAdmin(admin.ModelAdmin):
     list_display = ("id", "estado", "fecha", "bodega", "proveedor", "referencia", "posteado_en")
@@ -109,8 +164,17 @@ class MovimientoSalidaAdmin(admin.ModelAdmin):
     inlines = [MovimientoLineaSalidaInline]
 
 
+@admin.register(MovimientoTransferencia)
+class MovimientoTransferenciaAdmin(admin.ModelAdmin):
+    list_display = ("id", "estado", "fecha", "bodega", "bodega_destino", "referencia", "posteado_en")
+    list_filter = ("estado", "bodega", "bodega_destino")
+    search_fields = ("referencia", "observacion")
+    autocomplete_fields = ("bodega", "bodega_destino", "creado_por")
+    inlines = [MovimientoLineaTransferenciaInline]
+
+
 @admin.register(MovimientoLinea)
 class MovimientoLineaAdmin(admin.ModelAdmin):
-    list_display = ("id", "producto", "cantidad", "movimiento_entrada", "movimiento_salida", "creado_en")
+    list_display = ("id", "producto", "cantidad", "movimiento_entrada", "movimiento_salida", "movimiento_transferencia", "creado_en")
     search_fields = ("producto__sku", "producto__nombre", "lote")
-    autocomplete_fields = ("producto", "movimiento_entrada", "movimiento_salida")
+    autocomplete_fields = ("producto", "movimiento_entrada", "movimiento_salida", "movimiento_transferencia")
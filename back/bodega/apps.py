@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class BodegaConfig(AppConfig):
     name = 'bodega'
+
+    def ready(self):
+        from . import signals  # noqa: F401
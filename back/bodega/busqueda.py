@@ -0,0 +1,120 @@
+import re
+from collections import defaultdict
+
+from django.db import OperationalError, connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Producto
+
+TABLA = "bodega_producto_fts"
+COLUMNAS = ["sku", "nombre", "descripcion", "marca", "categorias"]
+PESOS = [10.0, 5.0, 1.0, 3.0, 2.0]  # bm25 por columna, en el orden de COLUMNAS
+LIMITE = 20
+LOTE = 1000
+
+_fts = {}  # alias de la conexión -> hay tabla FTS5
+
+
+def fts_disponible():
+    """La tabla FTS5 existe (SQLite con FTS5; la crea la migración 0009)."""
+    alias = connection.alias
+    if alias not in _fts:
+        if connection.vendor != "sqlite":
+            _fts[alias] = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLA])
+                _fts[alias] = cursor.fetchone() is not None
+    return _fts[alias]
+
+
+def _documentos(productos_ids):
+    # (id, sku, nombre, descripcion, marca, "cat1 cat2") en dos queries
+    productos = Producto.objects.all() if productos_ids is None else Producto.objects.filter(pk__in=productos_ids)
+    categorias = defaultdict(list)
+    through = Producto.categorias.through.objects.filter(producto__in=productos)
+    for producto_id, nombre in through.values_list("producto_id", "categoria__nombre"):
+        categorias[producto_id].append(nombre)
+    for pk, sku, nombre, descripcion, marca in productos.values_list(
+        "id", "sku", "nombre", "descripcion", "marca__nombre"
+    ).iterator(chunk_size=LOTE):
+        yield pk, sku, nombre, descripcion, marca or "", " ".join(categorias[pk])
+
+
+def indexar(productos_ids=None):
+    """
+    Reescribe en el índice las filas de esos productos (None = todo el catálogo).
+    Los ids que ya no existen simplemente se borran del índice.
+    """
+    if not fts_disponible():
+        return
+    with connection.cursor() as cursor:
+        if productos_ids is None:
+            cursor.execute(f"DELETE FROM {TABLA}")
+        else:
+            productos_ids = list(productos_ids)
+            for i in range(0, len(productos_ids), LOTE):
+                lote = productos_ids[i:i + LOTE]
+                cursor.execute(f"DELETE FROM {TABLA} WHERE rowid IN ({', '.join(['%s'] * len(lote))})", lote)
+        filas, sql = [], f"INSERT INTO {TABLA} (rowid, {', '.join(COLUMNAS)}) VALUES (%s, %s, %s, %s, %s, %s)"
+        for doc in _documentos(productos_ids):
+            filas.append(doc)
+            if len(filas) >= LOTE:
+                cursor.executemany(sql, filas)
+                filas = []
+        if filas:
+            cursor.executemany(sql, filas)
+
+
+def _terminos(q):
+    return [t for t in re.split(r"[^\w]+", q or "") if t]
+
+
+def buscar(q, limite=LIMITE):
+    """
+    Ids de productos que contienen todos los términos (como prefijo), del más al
+    menos relevante. Se rankean todos los calces (el ORDER BY ... LIMIT de
+    SQLite guarda solo los `limite` mejores mientras recorre).
+    """
+    terminos = _terminos(q)
+    if not terminos:
+        return []
+    if fts_disponible():
+        # cada término entre comillas (sin operadores FTS del usuario) y con * para prefijo
+        consulta = " ".join(f'"{t}"*' for t in terminos)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT rowid FROM {TABLA} WHERE {TABLA} MATCH %s "
+                    f"ORDER BY bm25({TABLA}, {', '.join(map(str, PESOS))}), rowid DESC LIMIT %s",
+                    [consulta, limite],
+                )
+                return [r[0] for r in cursor.fetchall()]
+        except OperationalError:
+            pass  # consulta que FTS5 no acepta: se resuelve con el respaldo
+    return _buscar_respaldo(terminos, limite)
+
+
+def _buscar_respaldo(terminos, limite):
+    # portable (PostgreSQL, SQLite sin FTS5): icontains por término, puntaje por dónde calza el primero
+    filtro = Q()
+    for t in terminos:
+        filtro &= (
+            Q(sku__icontains=t) | Q(nombre__icontains=t) | Q(descripcion__icontains=t)
+            | Q(marca__nombre__icontains=t) | Q(categorias__nombre__icontains=t)
+        )
+    t = terminos[0]
+    puntaje = Case(
+        When(sku__iexact=t, then=Value(100)),
+        When(sku__istartswith=t, then=Value(50)),
+        When(nombre__istartswith=t, then=Value(40)),
+        When(nombre__icontains=t, then=Value(20)),
+        When(marca__nombre__icontains=t, then=Value(10)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    ids = (
+        Producto.objects.filter(filtro).annotate(puntaje=puntaje)
+        .order_by("-puntaje", "nombre", "id").values_list("id", flat=True).distinct()[:limite]
+    )
+    return list(ids)
@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Count, Max
+
+VERIFICAR_VERSION_CADA = 1.0  # segundos entre consultas a la versión (compartida o de la base)
+TTL_DATOS = 24 * 60 * 60
+
+
+class CacheReferencia:
+    """
+    Cache read-through de {id: nombre} para tablas de referencia chicas (Marca,
+    UnidadMedida, Categoria, Bodega). Se carga la tabla completa en memoria con
+    un solo query y se invalida por signals (ver signals.py).
+
+    Con settings.BODEGA_CACHE_REFERENCIA = "<alias de CACHES>" la versión y los
+    datos se comparten entre procesos (locmem/file/Redis). Sin cache compartida
+    la versión es (max(actualizado_en), count) de la tabla en la base, así los
+    cambios hechos en otros procesos (workers) también se ven. En ambos casos
+    cada proceso revisa la versión como mucho una vez por segundo.
+    """
+
+    def __init__(self, modelo, campo="nombre"):
+        self.modelo = modelo
+        self.campo = campo
+        self.clave = f"bodega:ref:{modelo._meta.model_name}"
+        self.hits = 0
+        self.misses = 0
+        self._datos = None
+        self._version = None
+        self._verificado = 0.0
+        self._lock = threading.Lock()
+
+    def _backend(self):
+        alias = getattr(settings, "BODEGA_CACHE_REFERENCIA", None)
+        return caches[alias] if alias else None
+
+    def _version_tabla(self):
+        # un query chico; un borrado no mueve el max pero sí el count
+        v = self.modelo.objects.aggregate(modificado=Max("actualizado_en"), filas=Count("pk"))
+        return v["modificado"], v["filas"]
+
+    def _vigente(self):
+        if self._datos is None:
+            return False
+        if time.monotonic() - self._verificado <= VERIFICAR_VERSION_CADA:
+            return True
+        self._verificado = time.monotonic()
+        backend = self._backend()
+        if backend is not None:
+            return backend.get(f"{self.clave}:v") == self._version
+        return self._version_tabla() == self._version
+
+    def _cargar(self):
+        backend = self._backend()
+        version, datos = None, None
+        if backend is not None:
+            version = backend.get_or_set(f"{self.clave}:v", time.time_ns())
+            datos = backend.get(f"{self.clave}:{version}")
+        if datos is None:
+            filas = list(self.modelo.objects.values_list("id", self.campo, "actualizado_en"))
+            datos = {pk: valor for pk, valor, _ in filas}
+            if backend is None:
+                # la misma versión que _version_tabla(), sin otro query
+                version = (max((f[2] for f in filas), default=None), len(filas))
+            # dentro de una transacción se podrían publicar datos que luego se deshacen
+            elif not connection.in_atomic_block:
+                backend.set(f"{self.clave}:{version}", datos, TTL_DATOS)
+        self._datos, self._version, self._verificado = datos, version, time.monotonic()
+
+    def get(self, pk):
+        if pk is None:
+            return None
+        datos = self._datos if self._vigente() else None
+        if datos is not None and pk in datos:
+            self.hits += 1
+            return datos[pk]
+        # miss: tabla no cargada, versión vieja o id nuevo creado en otro proceso
+        self.misses += 1
+        with self._lock:
+            self._cargar()
+            return self._datos.get(pk)
+
+    def invalidar(self):
+        self._datos = None
+        backend = self._backend()
+        if backend is not None:
+            transaction.on_commit(lambda: backend.set(f"{self.clave}:v", time.time_ns(), None))
+
+    def estadisticas(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "filas": len(self._datos or {}),
+        }
+
+
+class CacheCodigos:
+    """
+    LRU en proceso de código normalizado -> productos (sin stock, que se lee
+    siempre en vivo) para el endpoint de lectores de código de barra. Se vacía
+    por signals ante cambios de productos, códigos de proveedor o unidades; con
+    settings.BODEGA_CACHE_REFERENCIA la invalidación llega a los demás procesos
+    por la versión compartida, igual que CacheReferencia. Sin cache compartida
+    la versión sale de la base: max(id) y count de CodigoProducto (cada
+    sincronizar() borra y recrea los códigos del producto) y la última
+    modificación de las unidades.
+    """
+
+    clave = "bodega:codigos:v"
+
+    def __init__(self, maximo=None):
+        self.maximo = maximo or getattr(settings, "BODEGA_CACHE_CODIGOS", 4096)
+        self.hits = 0
+        self.misses = 0
+        self._datos = OrderedDict()
+        self._generacion = 0  # evita guardar una carga que empezó antes de invalidar
+        self._version = None
+        self._verificado = 0.0
+        self._lock = threading.Lock()
+
+    def _backend(self):
+        alias = getattr(settings, "BODEGA_CACHE_REFERENCIA", None)
+        return caches[alias] if alias else None
+
+    def _version_tablas(self):
+        from .models import CodigoProducto, UnidadMedida
+
+        v = CodigoProducto.objects.aggregate(ultimo=Max("pk"), filas=Count("pk"))
+        return v["ultimo"], v["filas"], UnidadMedida.objects.aggregate(m=Max("actualizado_en"))["m"]
+
+    def _verificar_version(self):
+        if time.monotonic() - self._verificado <= VERIFICAR_VERSION_CADA:
+            return
+        self._verificado = time.monotonic()
+        backend = self._backend()
+        version = backend.get_or_set(self.clave, time.time_ns()) if backend is not None else self._version_tablas()
+        if version != self._version:
+            self._datos.clear()
+            self._generacion += 1
+            self._version = version
+
+    def get(self, codigo, cargar):
+        with self._lock:
+            self._verificar_version()
+            if codigo in self._datos:
+                self.hits += 1
+                self._datos.move_to_end(codigo)
+                return self._datos[codigo]
+            self.misses += 1
+            generacion = self._generacion
+        valor = cargar(codigo)
+        with self._lock:
+            # dentro de una transacción se podría guardar un dato que luego se deshace
+            if generacion == self._generacion and not connection.in_atomic_block:
+                self._datos[codigo] = valor
+                if len(self._datos) > self.maximo:
+                    self._datos.popitem(last=False)
+        return valor
+
+    def _limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._generacion += 1
+
+    def _publicar(self):
+        # de nuevo al confirmar: otra request pudo cargar el dato viejo mientras tanto
+        self._limpiar()
+        backend = self._backend()
+        if backend is not None:
+            backend.set(self.clave, time.time_ns(), None)
+
+    def invalidar(self):
+        self._limpiar()
+        transaction.on_commit(self._publicar)
+
+    def estadisticas(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "filas": len(self._datos),
+        }
+
+
+codigos = CacheCodigos()
+
+_referencias = {}
+
+
+def referencia(modelo):
+    if modelo not in _referencias:
+        _referencias[modelo] = CacheReferencia(modelo)
+    return _referencias[modelo]
+
+
+def estadisticas():
+    datos = {m._meta.model_name: c.estadisticas() for m, c in _referencias.items()}
+    datos["codigos"] = codigos.estadisticas()
+    return datos
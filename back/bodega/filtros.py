@@ -0,0 +1,164 @@
+import re
+from datetime import datetime, time
+
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers
+
+
+def parse_fecha(valor, fin_del_dia=True):
+    # acepta fecha (YYYY-MM-DD = fin de ese día, o inicio con fin_del_dia=False) o datetime ISO
+    valor = valor or ""
+    dia = parse_date(valor)
+    fecha = datetime.combine(dia, time.max if fin_del_dia else time.min) if dia else parse_datetime(valor)
+    if fecha is None:
+        return None
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def entero(valor):
+    if not valor.isdigit():
+        raise ValueError("Debe ser un entero.")
+    return int(valor)
+
+
+def booleano(valor):
+    if valor.lower() in ("1", "true"):
+        return True
+    if valor.lower() in ("0", "false"):
+        return False
+    raise ValueError("Debe ser 1/0 o true/false.")
+
+
+def texto(valor):
+    return valor
+
+
+def elegir(opciones):
+    def convertir(valor):
+        if valor.upper() not in opciones:
+            raise ValueError(f"Opciones: {', '.join(opciones)}.")
+        return valor.upper()
+    return convertir
+
+
+def desde(valor):
+    fecha = parse_fecha(valor, fin_del_dia=False)
+    if fecha is None:
+        raise ValueError("Fecha inválida (YYYY-MM-DD o ISO 8601).")
+    return fecha
+
+
+def hasta(valor):
+    fecha = parse_fecha(valor)
+    if fecha is None:
+        raise ValueError("Fecha inválida (YYYY-MM-DD o ISO 8601).")
+    return fecha
+
+
+class Filtro:
+    """
+    ?param=valor -> qs.filter(lookup=convertir(valor)). lookup puede ser una
+    función valor -> Q/expresión para filtros que no son una columna
+    (ej: movimientos que tienen un producto). Valores inválidos dan 400.
+    """
+
+    def __init__(self, lookup, convertir=entero):
+        self.lookup = lookup
+        self.convertir = convertir
+
+    def aplicar(self, qs, valor):
+        if callable(self.lookup):
+            return qs.filter(self.lookup(valor))
+        return qs.filter(**{self.lookup: valor})
+
+
+class FiltrosMixin:
+    """
+    Filtros y orden del listado (y de la exportación) por query params:
+
+        filtros = {"bodega": Filtro("bodega_id"), ...}
+        ordenamientos = ("fecha", "id")   # admitidos en ?ordering=-fecha
+
+    Cada filtro tiene un índice que lo respalda; consultas_indexadas son las
+    combinaciones que verifica `manage.py verificar_indices` con EXPLAIN.
+    """
+    filtros = {}
+    ordenamientos = ()
+    consultas_indexadas = ()
+
+    @property
+    def ordering(self):
+        request = getattr(self, "request", None)
+        pedido = request.query_params.get("ordering") if request is not None else None
+        if not pedido:
+            return None  # Meta.ordering del modelo
+        campos = [c.strip() for c in pedido.split(",") if c.strip()]
+        invalidos = [c for c in campos if c.lstrip("-") not in self.ordenamientos]
+        if invalidos or not campos:
+            raise serializers.ValidationError({"ordering": f"Se puede ordenar por: {', '.join(self.ordenamientos)}."})
+        return campos
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        errores = {}
+        for param, filtro in self.filtros.items():
+            valor = self.request.query_params.get(param)
+            if valor in (None, ""):
+                continue
+            try:
+                queryset = filtro.aplicar(queryset, filtro.convertir(valor))
+            except ValueError as e:
+                errores[param] = str(e)
+        if errores:
+            raise serializers.ValidationError(errores)
+        if self.ordering:
+            queryset = queryset.order_by(*self.ordering)
+        return queryset
+
+
+# --- índices: EXPLAIN QUERY PLAN (SQLite) ---------------------------------------
+
+class IndiceNoUsado(AssertionError):
+    pass
+
+
+_PASO = re.compile(r"\b(SCAN|SEARCH) (\S+)(?: AS \S+)?(.*)$")
+
+
+def plan_de_consulta(qs):
+    """Pasos de EXPLAIN QUERY PLAN del queryset: [(SCAN|SEARCH, tabla, detalle)]."""
+    if connection.vendor != "sqlite":
+        raise NotImplementedError(f"Solo se interpreta el plan de SQLite (base actual: {connection.vendor}).")
+    pasos = []
+    for linea in qs.explain().splitlines():
+        m = _PASO.search(linea)
+        if m:
+            pasos.append((m.group(1), m.group(2), m.group(3).strip()))
+    return pasos
+
+
+def consulta_del_listado(vista, params):
+    """El queryset que arma el listado de la vista (clase ViewSet) con esos query params."""
+    from rest_framework.test import APIRequestFactory
+
+    view = vista(action_map={"get": "list"}, format_kwarg=None, kwargs={}, args=())
+    view.request = view.initialize_request(APIRequestFactory().get("/", params))
+    return view.filter_queryset(view.get_queryset())
+
+
+def verificar_indices(vista, params):
+    """
+    Falla (IndiceNoUsado, un AssertionError) si el listado filtrado recorre
+    alguna tabla completa (SCAN, aunque sea en orden de un índice) en vez de
+    buscar por índice. Retorna los pasos del plan.
+    """
+    pasos = plan_de_consulta(consulta_del_listado(vista, params))
+    escaneos = [p for p in pasos if p[0] == "SCAN"]
+    if escaneos:
+        detalle = "\n".join(f"  {' '.join(p)}" for p in pasos)
+        raise IndiceNoUsado(f"{vista.__name__} {params}: recorre {', '.join(t for _, t, _ in escaneos)}\n{detalle}")
+    return pasos
@@ -0,0 +1,259 @@
+import csv
+import io
+import json
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, models, transaction
+from django.utils import timezone
+
+from . import busqueda
+from .cache import referencia
+from .models import (
+    AlertaReposicion, Categoria, CategoriaArbol, CodigoProducto, Marca, Producto, ResumenInventario, UnidadMedida,
+)
+
+LOTE = 1000
+
+CAMPOS_TEXTO = ["nombre", "descripcion", "codigo_barra", "ubicacion"]
+CAMPOS_DECIMAL = ["stock_minimo", "stock_maximo", "costo_promedio", "precio_referencia"]
+CAMPOS_BOOL = ["activo", "permite_fraccion"]
+VERDADEROS = {"1", "true", "si", "sí", "s", "yes", "y", "x"}
+FALSOS = {"0", "false", "no", "n", ""}
+
+
+def leer_filas(contenido, formato):
+    """contenido (str/bytes) CSV o JSON -> lista de dicts."""
+    if isinstance(contenido, bytes):
+        contenido = contenido.decode("utf-8-sig")
+    if formato == "json":
+        data = json.loads(contenido)
+        if not isinstance(data, list):
+            raise ValueError("El JSON debe ser una lista de productos.")
+        return data
+    return list(csv.DictReader(io.StringIO(contenido)))
+
+
+def _nombres(valor):
+    # "A|B;C" o ["A", "B"] -> ["A", "B", "C"]
+    if valor is None:
+        return None
+    if isinstance(valor, str):
+        valor = valor.replace(";", "|").split("|")
+    return [str(v).strip() for v in valor if str(v).strip()]
+
+
+class ImportadorProductos:
+    """
+    Importación masiva de productos (upsert por sku). Resuelve marca, unidad y
+    categorías por nombre en mapas en memoria (creando las faltantes en bloque),
+    hace upsert de productos por lotes y reescribe producto.categorias en bloque.
+    Los errores se reportan por fila sin abortar el resto.
+    """
+
+    def __init__(self, lote=LOTE):
+        self.lote = lote
+        self.errores = []
+        self.creados = 0
+        self.actualizados = 0
+
+    def importar(self, filas):
+        inicio = time.perf_counter()
+        validas = self._validar(filas)
+        self._resolver_referencias(validas)
+        for i in range(0, len(validas), self.lote):
+            self._procesar_lote(validas[i:i + self.lote])
+        return {
+            "filas": len(filas),
+            "creados": self.creados,
+            "actualizados": self.actualizados,
+            "errores": sorted(self.errores, key=lambda e: e["fila"]),
+            "segundos": round(time.perf_counter() - inicio, 3),
+        }
+
+    # --- validación --------------------------------------------------------
+
+    def _error(self, n, fila, mensaje):
+        self.errores.append({"fila": n, "sku": (fila.get("sku") or "").strip(), "error": mensaje})
+
+    def _validar(self, filas):
+        validas, vistos = [], set()
+        for n, fila in enumerate(filas, start=1):
+            if not isinstance(fila, dict):
+                self._error(n, {}, "La fila debe ser un objeto.")
+                continue
+            sku = str(fila.get("sku") or "").strip()
+            nombre = str(fila.get("nombre") or "").strip()
+            unidad = str(fila.get("unidad_medida") or "").strip()
+            if not sku or not nombre or not unidad:
+                self._error(n, fila, "sku, nombre y unidad_medida son obligatorios.")
+                continue
+            if sku in vistos:
+                self._error(n, fila, "SKU duplicado en el archivo.")
+                continue
+
+            datos = {"sku": sku, "nombre": nombre}
+            for c in CAMPOS_TEXTO[1:]:
+                if fila.get(c) is not None:
+                    datos[c] = str(fila[c]).strip()
+            try:
+                for c in CAMPOS_DECIMAL + CAMPOS_BOOL:
+                    if fila.get(c) in (None, ""):
+                        continue
+                    if c in CAMPOS_BOOL:
+                        datos[c] = self._bool(fila[c])
+                    else:
+                        datos[c] = Producto._meta.get_field(c).to_python(str(fila[c]).strip().replace(",", "."))
+                # max_length, max_digits y decimal_places del modelo: el upsert no pasa por full_clean()
+                for c, valor in datos.items():
+                    Producto._meta.get_field(c).run_validators(valor)
+            except (ValidationError, ValueError) as e:
+                detalle = "; ".join(getattr(e, "messages", [str(e)]))
+                self._error(n, fila, f"Valor inválido en {c}: {fila.get(c)!r} ({detalle})")
+                continue
+
+            vistos.add(sku)
+            validas.append({
+                "n": n,
+                "datos": datos,
+                "marca": str(fila.get("marca") or "").strip() if "marca" in fila else None,
+                "unidad_medida": unidad,
+                "categorias": _nombres(fila.get("categorias")),
+            })
+        return validas
+
+    @staticmethod
+    def _bool(valor):
+        if isinstance(valor, bool):
+            return valor
+        v = str(valor).strip().lower()
+        if v in VERDADEROS:
+            return True
+        if v in FALSOS:
+            return False
+        raise ValueError(f"'{valor}' no es booleano")
+
+    # --- referencias -------------------------------------------------------
+
+    def _mapa(self, modelo, nombres, extra=None):
+        # {nombre.lower(): id}; crea en bloque los que faltan
+        mapa = {}
+        for pk, nombre, *otros in modelo.objects.values_list("id", "nombre", *(extra or [])):
+            mapa[nombre.lower()] = pk
+            for o in otros:
+                if o:
+                    mapa.setdefault(o.lower(), pk)
+        faltantes = {}
+        for n in nombres:
+            if n and n.lower() not in mapa:
+                faltantes.setdefault(n.lower(), n)
+        if faltantes:
+            modelo.objects.bulk_create([modelo(nombre=n) for n in faltantes.values()], ignore_conflicts=True)
+            nuevos = dict(modelo.objects.filter(nombre__in=faltantes.values()).values_list("id", "nombre"))
+            for pk, nombre in nuevos.items():
+                mapa[nombre.lower()] = pk
+            referencia(modelo).invalidar()  # bulk_create no dispara post_save
+            if modelo is Categoria:
+                # las categorías nuevas entran al árbol como raíces
+                CategoriaArbol.objects.bulk_create(
+                    [CategoriaArbol(ancestro_id=pk, descendiente_id=pk, profundidad=0) for pk in nuevos],
+                    ignore_conflicts=True,
+                )
+        return mapa
+
+    def _resolver_referencias(self, validas):
+        self.marcas = self._mapa(Marca, {f["marca"] for f in validas if f["marca"]})
+        self.unidades = self._mapa(UnidadMedida, {f["unidad_medida"] for f in validas}, extra=["simbolo"])
+        self.categorias = self._mapa(Categoria, {c for f in validas for c in (f["categorias"] or [])})
+
+    # --- escritura ---------------------------------------------------------
+
+    def _valores(self, f):
+        valores = dict(f["datos"], unidad_medida_id=self.unidades[f["unidad_medida"].lower()])
+        if f["marca"] is not None:
+            valores["marca_id"] = self.marcas.get(f["marca"].lower()) if f["marca"] else None
+        return valores
+
+    def _procesar_lote(self, lote):
+        try:
+            with transaction.atomic():
+                self._escribir(lote)
+        except DatabaseError:
+            # se aísla la(s) fila(s) con problema
+            for f in lote:
+                try:
+                    with transaction.atomic():
+                        self._escribir([f])
+                except DatabaseError as e:
+                    self.errores.append({"fila": f["n"], "sku": f["datos"]["sku"], "error": str(e)})
+
+    def _upsert(self, filas):
+        """
+        INSERT ... ON CONFLICT (sku) DO UPDATE con executemany (SQLite >= 3.24 y
+        PostgreSQL). Solo se pisan las columnas presentes en la fila; las demás
+        toman el default del modelo al insertar. El bulk_create del ORM gasta
+        más en armar el SQL campo por campo que en escribir.
+        """
+        qn = connection.ops.quote_name
+        campos = [f for f in Producto._meta.concrete_fields if not f.primary_key]
+        ahora = timezone.now()
+        defaults = {f.attname: ahora if f.attname in ("creado_en", "actualizado_en") else f.get_default() for f in campos}
+        decimales = {f.attname: f for f in campos if isinstance(f, models.DecimalField)}
+
+        def prep(columna, v):
+            if columna in decimales and v is not None:
+                f = decimales[columna]
+                return connection.ops.adapt_decimalfield_value(v, f.max_digits, f.decimal_places)
+            if columna in ("creado_en", "actualizado_en"):
+                return connection.ops.adapt_datetimefield_value(v)
+            return v
+
+        grupos = {}
+        for valores in filas:
+            actualizar = tuple(sorted(set(valores) - {"sku"})) + ("actualizado_en",)
+            grupos.setdefault(actualizar, []).append(valores)
+
+        columnas = [f.attname for f in campos]
+        insert = (
+            f"INSERT INTO {qn(Producto._meta.db_table)} ({', '.join(qn(c) for c in columnas)}) "
+            f"VALUES ({', '.join(['%s'] * len(columnas))}) ON CONFLICT ({qn('sku')}) DO UPDATE SET "
+        )
+        with connection.cursor() as cursor:
+            for actualizar, grupo in grupos.items():
+                sql = insert + ", ".join(f"{qn(c)} = excluded.{qn(c)}" for c in actualizar)
+                cursor.executemany(sql, [
+                    [prep(c, valores.get(c, defaults[c])) for c in columnas] for valores in grupo
+                ])
+
+    def _escribir(self, lote):
+        skus = [f["datos"]["sku"] for f in lote]
+        existentes = set(Producto.objects.filter(sku__in=skus).values_list("sku", flat=True))
+        ids = Producto.objects.filter(sku__in=skus).values("id")  # subquery: se evalúa en cada uso
+        # costo_promedio, marca y categorías entran al resumen de inventario
+        with ResumenInventario.ajustando(ids):
+            self._upsert([self._valores(f) for f in lote])
+            self._escribir_categorias(lote)
+        AlertaReposicion.actualizar(ids)
+        CodigoProducto.sincronizar(ids)  # el upsert no dispara post_save
+        busqueda.indexar(ids.values_list("id", flat=True))
+
+        self.actualizados += len(existentes)
+        self.creados += len(lote) - len(existentes)
+
+    def _escribir_categorias(self, lote):
+        con_categorias = [f for f in lote if f["categorias"] is not None]
+        if con_categorias:
+            ids = dict(Producto.objects.filter(sku__in=[f["datos"]["sku"] for f in con_categorias]).values_list("sku", "id"))
+            Through = Producto.categorias.through
+            Through.objects.filter(producto_id__in=ids.values()).delete()
+            # executemany directo: instanciar un modelo por fila de la tabla intermedia domina el tiempo
+            filas = {
+                (ids[f["datos"]["sku"]], self.categorias[c.lower()])
+                for f in con_categorias for c in f["categorias"]
+            }
+            qn = connection.ops.quote_name
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {qn(Through._meta.db_table)} (producto_id, categoria_id) VALUES (%s, %s)",
+                    sorted(filas),
+                )
@@ -0,0 +1,297 @@
+import json
+import logging
+import math
+import platform
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from bodega.importacion import ImportadorProductos
+from bodega.metricas import Medicion
+from bodega.models import (
+    Bodega, MovimientoEntrada, MovimientoLinea, MovimientoSalida, MovimientoTransferencia, Producto, Stock,
+    postear_documentos,
+)
+
+ESCENARIOS = [
+    "postear_entrada", "postear_salida", "postear_transferencia",
+    "listar_stock", "listar_stock_drf", "listar_movimientos", "listar_movimientos_drf", "buscar_productos",
+    "exportar_stock", "exportar_movimientos",
+]
+BUSQUEDAS = ["torn", "tuerca", "galv acero", "perno inox", "cable", "broca 10"]
+
+# vocabulario del generador: nombres con palabras repetidas para que la búsqueda tenga calces
+ARTICULOS = ["Tornillo", "Tuerca", "Perno", "Arandela", "Clavo", "Broca", "Cable", "Tubo", "Codo", "Llave"]
+MATERIALES = ["acero", "galvanizado", "inox", "bronce", "pvc", "cobre"]
+MARCAS = ["Acme", "Ferrum", "Norte", "Sur", "Tecno", "Vulcano", "Andes", "Pacífico"]
+CATEGORIAS = ["Fijaciones", "Herramientas", "Eléctrico", "Gasfitería", "Construcción", "Pinturas", "Jardín", "Seguridad"]
+
+
+def _percentil(valores, q):
+    # nearest-rank: siempre un valor observado
+    ordenados = sorted(valores)
+    return ordenados[max(math.ceil(q * len(ordenados)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de regresión: crea una base de test, genera datos deterministas "
+        "(--semilla) a la escala indicada y mide p50/p95 y queries de posteo, listados, "
+        "búsqueda y exports. --salida guarda el resultado en JSON; --comparar lo contrasta "
+        "con un resultado guardado y falla si algo empeoró más que la tolerancia. "
+        "Usa DATABASES[...]['TEST'] (en SQLite, en memoria salvo que se indique TEST NAME)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bodegas", type=int, default=3)
+        parser.add_argument("--productos", type=int, default=2000)
+        parser.add_argument("--movimientos", type=int, default=300, help="movimientos ya posteados en los datos")
+        parser.add_argument("--lineas", type=int, default=10, help="líneas por movimiento")
+        parser.add_argument("--repeticiones", type=int, default=30, help="mediciones por escenario (más una de calentamiento)")
+        parser.add_argument("--semilla", type=int, default=1)
+        parser.add_argument("--escenarios", nargs="+", choices=ESCENARIOS, default=ESCENARIOS)
+        parser.add_argument("--salida", help="archivo JSON donde guardar el resultado")
+        parser.add_argument("--comparar", help="resultado JSON de referencia (baseline)")
+        parser.add_argument("--tolerancia", type=float, default=0.25, help="aumento relativo de p50/p95 aceptado (0.25 = 25%%)")
+        parser.add_argument("--piso-ms", type=float, default=1.0, help="diferencias menores a esto no cuentan como regresión")
+
+    def handle(self, *args, **options):
+        if "postear_transferencia" in options["escenarios"] and options["bodegas"] < 2:
+            raise CommandError("postear_transferencia necesita --bodegas 2 o más.")
+        baseline = None
+        if options["comparar"]:
+            with open(options["comparar"], encoding="utf-8") as f:
+                baseline = json.load(f)
+
+        nombre = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        logger = logging.getLogger("bodega")
+        nivel = logger.level
+        logger.setLevel(logging.ERROR)  # sin los warnings de presupuesto por request: las queries van en el reporte
+        try:
+            t0 = time.perf_counter()
+            self.rnd = random.Random(options["semilla"])
+            self._generar(**options)
+            self.stdout.write(f"datos generados en {time.perf_counter() - t0:.1f} s")
+            self.client = APIClient(HTTP_HOST=self._host())
+
+            resultados = {}
+            for escenario in options["escenarios"]:
+                resultados[escenario] = self._medir(escenario, options["repeticiones"], options["lineas"])
+        finally:
+            logger.setLevel(nivel)
+            connection.creation.destroy_test_db(nombre, verbosity=0)
+
+        resultado = {
+            "fecha": timezone.now().isoformat(timespec="seconds"),
+            "escala": {k: options[k] for k in ("bodegas", "productos", "movimientos", "lineas", "repeticiones", "semilla")},
+            "entorno": {
+                "python": platform.python_version(), "django": django.get_version(),
+                "base": connection.vendor, "maquina": platform.node(),
+            },
+            "escenarios": resultados,
+        }
+        if options["salida"]:
+            with open(options["salida"], "w", encoding="utf-8") as f:
+                json.dump(resultado, f, indent=2, ensure_ascii=False)
+                f.write("\n")
+
+        regresiones = self._reportar(resultado, baseline, options["tolerancia"], options["piso_ms"])
+        if regresiones:
+            raise CommandError(f"{len(regresiones)} regresiones respecto de {options['comparar']}: {', '.join(regresiones)}")
+
+    def _host(self):
+        for host in settings.ALLOWED_HOSTS:
+            if host not in ("*",) and not host.startswith("."):
+                return host
+        return "localhost"
+
+    # --- datos ------------------------------------------------------------------
+
+    def _generar(self, bodegas, productos, movimientos, lineas, **options):
+        rnd = self.rnd
+        filas = []
+        for i in range(productos):
+            articulo, material = rnd.choice(ARTICULOS), rnd.choice(MATERIALES)
+            medida = rnd.choice([4, 6, 8, 10, 12, 16, 20])
+            filas.append({
+                "sku": f"BENCH-{i:06d}",
+                "nombre": f"{articulo} {material} {medida} mm",
+                "descripcion": f"{articulo} de {material}, medida {medida} mm",
+                "marca": rnd.choice(MARCAS),
+                "unidad_medida": "Unidad",
+                "categorias": rnd.sample(CATEGORIAS, rnd.randint(1, 2)),
+                "costo_promedio": str(rnd.randint(100, 5000)),
+                "stock_minimo": str(rnd.randint(0, 20)),
+            })
+        resumen = ImportadorProductos().importar(filas)
+        if resumen["errores"]:
+            raise CommandError(f"Error generando productos: {resumen['errores'][0]}")
+
+        self.bodegas = Bodega.objects.bulk_create(Bodega(nombre=f"Bodega bench {i + 1}") for i in range(bodegas))
+        self.productos = list(Producto.objects.filter(sku__startswith="BENCH-").order_by("sku").values_list("id", flat=True))
+        if lineas > len(self.productos):
+            raise CommandError("--lineas no puede ser mayor que --productos.")
+
+        # 2 de cada 3 son entradas; las salidas sacan poco y de lo ya ingresado a esa bodega
+        inicio = timezone.now() - timedelta(days=30)
+        documentos, lineas_doc, ingresados = [], [], {b.pk: set() for b in self.bodegas}
+        for i in range(movimientos):
+            bodega = rnd.choice(self.bodegas)
+            salida = i % 3 == 2 and len(ingresados[bodega.pk]) >= lineas
+            modelo = MovimientoSalida if salida else MovimientoEntrada
+            doc = modelo(bodega=bodega, fecha=inicio + timedelta(minutes=i), referencia=f"BENCH-{i}")
+            documentos.append(doc)
+            lineas_doc.append(self._lineas(doc, lineas, ingresados[bodega.pk] if salida else self.productos))
+            if not salida:
+                ingresados[bodega.pk].update(l.producto_id for l in lineas_doc[-1])
+        MovimientoEntrada.objects.bulk_create([d for d in documentos if isinstance(d, MovimientoEntrada)])
+        MovimientoSalida.objects.bulk_create([d for d in documentos if isinstance(d, MovimientoSalida)])
+        for doc, lineas_ in zip(documentos, lineas_doc):
+            for l in lineas_:
+                l.movimiento_entrada_id = doc.pk if isinstance(doc, MovimientoEntrada) else None
+                l.movimiento_salida_id = doc.pk if isinstance(doc, MovimientoSalida) else None
+        MovimientoLinea.objects.bulk_create([l for lineas_ in lineas_doc for l in lineas_], batch_size=2000)
+        for i in range(0, len(documentos), 50):
+            with transaction.atomic():
+                postear_documentos(documentos[i:i + 50])
+
+    def _lineas(self, doc, n, productos):
+        rnd = self.rnd
+        lineas = []
+        for producto_id in rnd.sample(sorted(set(productos)), n):
+            if isinstance(doc, MovimientoEntrada):
+                lineas.append(MovimientoLinea(
+                    producto_id=producto_id,
+                    cantidad=Decimal(rnd.randint(20, 200)), costo_unitario=Decimal(rnd.randint(100, 5000)),
+                    lote=f"L{rnd.randint(1, 4)}", vencimiento=date.today() + timedelta(days=rnd.randint(10, 400)),
+                ))
+            else:
+                lineas.append(MovimientoLinea(producto_id=producto_id, cantidad=Decimal(rnd.randint(1, 5))))
+        return lineas
+
+    # --- escenarios --------------------------------------------------------------
+
+    def _medir(self, escenario, repeticiones, lineas):
+        preparar = getattr(self, f"_preparar_{escenario}", None)
+        ejecutar = getattr(self, f"_{escenario}")
+        tiempos, queries, bytes_ = [], [], 0
+        for i in range(repeticiones + 1):
+            argumento = preparar(i, lineas) if preparar else i
+            medicion = Medicion()
+            with medicion.midiendo():
+                t0 = time.perf_counter()
+                bytes_ = ejecutar(argumento)
+                ms = (time.perf_counter() - t0) * 1000
+            if i:  # la primera calienta caches
+                tiempos.append(ms)
+                queries.append(medicion.queries)
+        return {
+            "n": len(tiempos),
+            "p50_ms": round(_percentil(tiempos, 0.5), 2),
+            "p95_ms": round(_percentil(tiempos, 0.95), 2),
+            "media_ms": round(sum(tiempos) / len(tiempos), 2),
+            "queries": max(queries),
+            "bytes": bytes_,
+        }
+
+    def _get(self, url):
+        response = self.client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f"GET {url}: {response.status_code}")
+        contenido = b"".join(response.streaming_content) if response.streaming else response.content
+        return len(contenido)
+
+    def _documento(self, modelo, lineas):
+        origen = self.rnd.choice(self.bodegas)
+        if modelo is MovimientoTransferencia:
+            destino = self.rnd.choice([b for b in self.bodegas if b != origen])
+            doc = modelo.objects.create(bodega=origen, bodega_destino=destino)
+        else:
+            doc = modelo.objects.create(bodega=origen)
+        productos = self.productos
+        if modelo is not MovimientoEntrada:
+            productos = Stock.objects.filter(bodega=doc.bodega, cantidad__gte=5).values_list("producto_id", flat=True)
+        nuevas = self._lineas(doc, lineas, productos)
+        for l in nuevas:
+            setattr(l, modelo.linea_fk, doc)
+        MovimientoLinea.objects.bulk_create(nuevas)
+        return doc
+
+    def _preparar_postear_entrada(self, i, lineas):
+        return self._documento(MovimientoEntrada, lineas)
+
+    def _preparar_postear_salida(self, i, lineas):
+        return self._documento(MovimientoSalida, lineas)
+
+    def _preparar_postear_transferencia(self, i, lineas):
+        return self._documento(MovimientoTransferencia, lineas)
+
+    def _postear_entrada(self, doc):
+        doc.postear()
+        return 0
+
+    _postear_salida = _postear_transferencia = _postear_entrada
+
+    def _listar_stock(self, i):
+        return self._get(f"{reverse('stock-list')}?page_size=500")
+
+    def _listar_movimientos(self, i):
+        return self._get(f"{reverse('movimientoentrada-list')}?page_size=50")
+
+    # el mismo listado por los serializers de DRF: la referencia de la lectura rápida
+    @override_settings(BODEGA_LECTURA_RAPIDA=False)
+    def _listar_stock_drf(self, i):
+        return self._listar_stock(i)
+
+    @override_settings(BODEGA_LECTURA_RAPIDA=False)
+    def _listar_movimientos_drf(self, i):
+        return self._listar_movimientos(i)
+
+    def _buscar_productos(self, i):
+        return self._get(f"{reverse('producto-buscar')}?q={BUSQUEDAS[i % len(BUSQUEDAS)]}")
+
+    def _exportar_stock(self, i):
+        return self._get(f"{reverse('stock-list')}?format=csv")
+
+    def _exportar_movimientos(self, i):
+        return self._get(f"{reverse('movimientoentrada-list')}?format=csv")
+
+    # --- reporte -----------------------------------------------------------------
+
+    def _reportar(self, resultado, baseline, tolerancia, piso_ms):
+        base = (baseline or {}).get("escenarios", {})
+        if baseline and baseline.get("escala") != resultado["escala"]:
+            self.stderr.write(f"Ojo: la escala del baseline ({baseline.get('escala')}) no es la de esta corrida.")
+
+        regresiones = []
+        self.stdout.write(f"{'escenario':<22} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8}  comparación")
+        for escenario, r in resultado["escenarios"].items():
+            notas = []
+            b = base.get(escenario)
+            if b:
+                for clave in ("p50_ms", "p95_ms"):
+                    cambio = (r[clave] - b[clave]) / b[clave] if b[clave] else 0
+                    notas.append(f"{clave[:3]} {cambio:+.0%}")
+                    if cambio > tolerancia and r[clave] - b[clave] > piso_ms:
+                        regresiones.append(f"{escenario} {clave[:3]}")
+                if r["queries"] != b["queries"]:
+                    notas.append(f"queries {b['queries']} -> {r['queries']}")
+                    if r["queries"] > b["queries"]:
+                        regresiones.append(f"{escenario} queries")
+            drf = resultado["escenarios"].get(f"{escenario}_drf")
+            if drf and r["p50_ms"]:
+                notas.append(f"{drf['p50_ms'] / r['p50_ms']:.1f}x más rápido que DRF")
+            linea = f"{escenario:<22} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['queries']:>8}  {', '.join(notas)}"
+            empeoro = any(x.startswith(escenario + " ") for x in regresiones)
+            self.stdout.write(self.style.ERROR(linea) if empeoro else linea)
+        return regresiones
@@ -0,0 +1,56 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from bodega.models import (
+    Bodega, Producto, UnidadMedida,
+    MovimientoEntrada, MovimientoSalida, MovimientoLinea,
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mide queries y latencia de postear() para entradas/salidas de 10/100/1000 líneas (no deja datos)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lineas", nargs="+", type=int, default=[10, 100, 1000])
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'líneas':>8} {'tipo':>8} {'queries':>8} {'ms':>10}")
+        try:
+            with transaction.atomic():
+                for n in options["lineas"]:
+                    for fila in self._medir(n):
+                        self.stdout.write("{:>8} {:>8} {:>8} {:>10.1f}".format(*fila))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _medir(self, n):
+        um, _ = UnidadMedida.objects.get_or_create(nombre="__bench__")
+        bodega = Bodega.objects.create(nombre=f"__bench_{n}__")
+        productos = Producto.objects.bulk_create(
+            Producto(sku=f"__bench_{n}_{i}", nombre=f"Bench {i}", unidad_medida=um) for i in range(n)
+        )
+
+        entrada = MovimientoEntrada.objects.create(bodega=bodega)
+        MovimientoLinea.objects.bulk_create(
+            MovimientoLinea(movimiento_entrada=entrada, producto=p, cantidad=Decimal("10")) for p in productos
+        )
+        salida = MovimientoSalida.objects.create(bodega=bodega)
+        MovimientoLinea.objects.bulk_create(
+            MovimientoLinea(movimiento_salida=salida, producto=p, cantidad=Decimal("4")) for p in productos
+        )
+
+        for tipo, mov in (("entrada", entrada), ("salida", salida)):
+            with CaptureQueriesContext(connection) as ctx:
+                t0 = time.perf_counter()
+                mov.postear()
+                ms = (time.perf_counter() - t0) * 1000
+            yield n, tipo, len(ctx.captured_queries), ms
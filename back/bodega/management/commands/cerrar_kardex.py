@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from bodega.models import Bodega, KardexCierre, stock_a_fecha
+
+
+class Command(BaseCommand):
+    help = "Crea un checkpoint (KardexCierre) del saldo de cada producto por bodega a una fecha."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fecha", help="Fecha/hora ISO del cierre (por defecto: ahora)")
+        parser.add_argument("--bodega", type=int, action="append", help="Limitar a estas bodegas")
+
+    def handle(self, *args, **options):
+        fecha = timezone.now()
+        if options["fecha"]:
+            fecha = parse_datetime(options["fecha"])
+            if fecha is None:
+                raise CommandError("Fecha inválida.")
+            if timezone.is_naive(fecha):
+                fecha = timezone.make_aware(fecha)
+
+        bodegas = Bodega.objects.all()
+        if options["bodega"]:
+            bodegas = bodegas.filter(pk__in=options["bodega"])
+
+        total = 0
+        with transaction.atomic():
+            for bodega_id in bodegas.values_list("id", flat=True):
+                filas = stock_a_fecha(bodega_id, fecha).values_list("producto_id", "cantidad_a_fecha")
+                creados = KardexCierre.objects.bulk_create(
+                    (KardexCierre(bodega_id=bodega_id, producto_id=p, fecha=fecha, saldo=saldo) for p, saldo in filas.iterator()),
+                    ignore_conflicts=True,
+                )
+                total += len(creados)
+        self.stdout.write(self.style.SUCCESS(f"{total} saldos cerrados al {fecha:%Y-%m-%d %H:%M}."))
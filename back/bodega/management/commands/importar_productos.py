@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bodega.importacion import LOTE, ImportadorProductos, leer_filas
+
+
+class Command(BaseCommand):
+    help = "Importa/actualiza productos por sku desde un CSV o JSON (errores por fila, sin abortar)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo")
+        parser.add_argument("--formato", choices=["csv", "json"], help="Por defecto según la extensión")
+        parser.add_argument("--lote", type=int, default=LOTE)
+
+    def handle(self, *args, **options):
+        ruta = Path(options["archivo"])
+        if not ruta.exists():
+            raise CommandError(f"No existe {ruta}")
+        formato = options["formato"] or ("json" if ruta.suffix.lower() == ".json" else "csv")
+
+        try:
+            filas = leer_filas(ruta.read_bytes(), formato)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        r = ImportadorProductos(lote=options["lote"]).importar(filas)
+        for e in r["errores"]:
+            self.stderr.write(f"fila {e['fila']} ({e['sku']}): {e['error']}")
+        velocidad = r["filas"] / r["segundos"] if r["segundos"] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{r['creados']} creados, {r['actualizados']} actualizados, {len(r['errores'])} errores "
+            f"en {r['segundos']}s ({velocidad:.0f} filas/s)."
+        ))
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bodega.models import Eliminacion
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra los tombstones del feed de sincronización más viejos que la retención "
+        "(BODEGA_SYNC_RETENCION_DIAS); esos tokens ya reciben 410."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=None)
+
+    def handle(self, *args, **options):
+        dias = options["dias"] or getattr(settings, "BODEGA_SYNC_RETENCION_DIAS", 90)
+        borrados, _ = Eliminacion.objects.filter(eliminado_en__lt=timezone.now() - timedelta(days=dias)).delete()
+        self.stdout.write(self.style.SUCCESS(f"{borrados} tombstones borrados (más de {dias} días)."))
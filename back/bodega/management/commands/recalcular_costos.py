@@ -0,0 +1,89 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+
+from bodega.models import (
+    CENTAVO, BaseMovimiento, MovimientoLinea, Producto, Proveedor, ResumenInventario, _actualizar_por_id,
+)
+
+LOTE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula costo_promedio del catálogo y costo_ultima_compra de ProductoProveedor "
+        "reproduciendo las líneas posteadas en orden, en una sola pasada en streaming."
+    )
+
+    def handle(self, *args, **options):
+        posteado = BaseMovimiento.Estado.POSTEADO
+        lineas = (
+            MovimientoLinea.objects
+            .filter(Q(movimiento_entrada__estado=posteado) | Q(movimiento_salida__estado=posteado))
+            .annotate(
+                posteado_en=Coalesce("movimiento_entrada__posteado_en", "movimiento_salida__posteado_en"),
+                proveedor_id=F("movimiento_entrada__proveedor_id"),
+            )
+            .order_by("producto_id", "posteado_en", "id")
+            .values_list("producto_id", "movimiento_entrada_id", "proveedor_id", "cantidad", "costo_unitario")
+        )
+
+        promedios, ultimas = [], defaultdict(dict)  # ultimas: proveedor -> {producto: costo}
+        total = 0
+        # estado del producto en curso; la entrada en curso se acumula y se aplica
+        # completa, igual que el posteo (_CostoPromedio)
+        actual, cantidad, promedio = None, Decimal("0"), Decimal("0")
+        entrada_actual, q_entrada, valor_entrada = None, Decimal("0"), Decimal("0")
+
+        def aplicar_entrada():
+            nonlocal cantidad, promedio, entrada_actual, q_entrada, valor_entrada
+            if entrada_actual is not None:
+                promedio = ((cantidad * promedio + valor_entrada) / (cantidad + q_entrada)).quantize(CENTAVO)
+                cantidad += q_entrada
+            entrada_actual, q_entrada, valor_entrada = None, Decimal("0"), Decimal("0")
+
+        def cerrar_producto():
+            nonlocal promedios, total
+            aplicar_entrada()
+            promedios.append((actual, promedio))
+            total += 1
+            if len(promedios) >= LOTE:
+                _actualizar_por_id(Producto, "costo_promedio", promedios)
+                promedios = []
+
+        with transaction.atomic():
+            for producto_id, entrada_id, proveedor_id, q, costo in lineas.iterator(chunk_size=LOTE):
+                if producto_id != actual:
+                    if actual is not None:
+                        cerrar_producto()
+                    actual, cantidad, promedio = producto_id, Decimal("0"), Decimal("0")
+                if entrada_id != entrada_actual:
+                    aplicar_entrada()
+
+                if entrada_id is None:  # salida: baja el stock, no cambia el costo
+                    cantidad = max(cantidad - q, Decimal("0"))
+                    continue
+                if costo > 0 and proveedor_id:
+                    ultimas[proveedor_id][producto_id] = costo
+                entrada_actual = entrada_id
+                q_entrada += q
+                valor_entrada += q * (costo if costo > 0 else promedio)
+
+            if actual is not None:
+                cerrar_producto()
+            if promedios:
+                _actualizar_por_id(Producto, "costo_promedio", promedios)
+
+            for proveedor in Proveedor.objects.filter(pk__in=ultimas):
+                proveedor.registrar_ultima_compra(ultimas[proveedor.pk])
+
+            ResumenInventario.reconstruir()  # el valor del inventario depende del costo promedio
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Costo promedio recalculado para {total} productos; "
+            f"última compra actualizada para {len(ultimas)} proveedores."
+        ))
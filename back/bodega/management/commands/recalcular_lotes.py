@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from bodega.models import StockLote
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye los saldos por lote desde las líneas posteadas, cuadrados contra Stock "
+        "(el exceso se descuenta FEFO y lo que falta queda sin lote)."
+    )
+
+    def handle(self, *args, **options):
+        StockLote.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"{StockLote.objects.count()} lotes con saldo."))
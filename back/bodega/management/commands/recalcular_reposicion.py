@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from bodega.models import AlertaReposicion
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero la tabla de alertas de reposición (productos bajo stock_minimo)."
+
+    def handle(self, *args, **options):
+        AlertaReposicion.actualizar()
+        self.stdout.write(self.style.SUCCESS(f"{AlertaReposicion.objects.count()} alertas de reposición."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from bodega.models import ResumenInventario
+
+
+class Command(BaseCommand):
+    help = "Reconstruye desde cero el resumen de inventario (unidades y valor por bodega, categoría y marca)."
+
+    def handle(self, *args, **options):
+        ResumenInventario.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"{ResumenInventario.objects.count()} filas de resumen de inventario."))
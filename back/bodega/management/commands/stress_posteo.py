@@ -0,0 +1,154 @@
+import multiprocessing
+import time
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Sum
+
+
+def _iniciar():
+    import django
+    django.setup()  # no-op con fork; necesario con spawn (Windows/macOS)
+
+
+def _trabajar(documentos):
+    """Postea [(tipo, id)] uno por uno desde un proceso aparte."""
+    from bodega.models import MovimientoEntrada, MovimientoSalida, contadores_posteo
+
+    modelos = {"entrada": MovimientoEntrada, "salida": MovimientoSalida}
+    resultado = Counter()
+    for tipo, pk in documentos:
+        movimiento = modelos[tipo].objects.get(pk=pk)
+        try:
+            movimiento.postear()
+            resultado["posteados"] += 1
+        except Exception as e:
+            if "Stock insuficiente" in str(e):
+                resultado["rechazados"] += 1  # esperable: las salidas compiten por el mismo stock
+            else:
+                resultado["errores"] += 1
+                resultado[f"error: {type(e).__name__}: {e}"] += 1
+    resultado.update(contadores_posteo)
+    connections.close_all()
+    return resultado
+
+
+class Command(BaseCommand):
+    help = (
+        "Postea movimientos desde varios procesos a la vez sobre pocos productos y "
+        "verifica que no haya updates perdidos (stock = suma de lo posteado = saldo del kardex = suma de lotes). "
+        "Usa la base configurada y borra lo que crea (salvo --conservar)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--procesos", type=int, default=4)
+        parser.add_argument("--documentos", type=int, default=50, help="movimientos por proceso")
+        parser.add_argument("--lineas", type=int, default=5)
+        parser.add_argument("--productos", type=int, default=10, help="pocos productos = más contención")
+        parser.add_argument("--conservar", action="store_true")
+
+    def handle(self, *args, **options):
+        trabajos, bodega, productos = self._preparar(**options)
+        connections.close_all()  # los procesos hijos abren su propia conexión
+
+        t0 = time.perf_counter()
+        with multiprocessing.Pool(options["procesos"], initializer=_iniciar) as pool:
+            resultados = pool.map(_trabajar, trabajos)
+        segundos = time.perf_counter() - t0
+
+        total = sum(resultados, Counter())
+        self.stdout.write(
+            f"procesos={options['procesos']} documentos={sum(len(t) for t in trabajos)} "
+            f"posteados={total['posteados']} rechazados={total['rechazados']} errores={total['errores']} "
+            f"conflictos={total['conflictos']} reintentos={total['reintentos']}"
+        )
+        for clave, n in total.items():
+            if clave.startswith("error: "):
+                self.stdout.write(f"  {n} x {clave}")
+        self.stdout.write(f"{segundos:.2f} s, {total['posteados'] / segundos:.1f} posteos/s")
+
+        diferencias = self._verificar(bodega, productos)
+        if not options["conservar"]:
+            self._limpiar(bodega, productos)
+        if diferencias:
+            for d in diferencias:
+                self.stderr.write(d)
+            raise CommandError(f"{len(diferencias)} productos con stock inconsistente.")
+        self.stdout.write(self.style.SUCCESS("OK: stock = suma de lo posteado = saldo del kardex = suma de lotes"))
+
+    def _preparar(self, procesos, documentos, lineas, productos, **_):
+        from bodega.models import (
+            Bodega, MovimientoEntrada, MovimientoLinea, MovimientoSalida, Producto, UnidadMedida,
+        )
+
+        um, _ = UnidadMedida.objects.get_or_create(nombre="__stress__")
+        bodega = Bodega.objects.create(nombre=f"__stress_{time.time_ns()}__")
+        prods = Producto.objects.bulk_create(
+            Producto(sku=f"__stress_{bodega.pk}_{i}", nombre=f"Stress {i}", unidad_medida=um, permite_fraccion=True)
+            for i in range(productos)
+        )
+
+        trabajos = [[] for _ in range(procesos)]
+        filas = []
+        for w in range(procesos):
+            for n in range(documentos):
+                # 2 entradas (0.7 y 0.1) por cada salida de 0.8, todas sobre los mismos productos:
+                # cantidades fraccionarias que en binario no suman exacto y dejan el stock justo en 0
+                if n % 3 == 2:
+                    mov, tipo, cantidad = MovimientoSalida.objects.create(bodega=bodega), "salida", Decimal("0.800")
+                    fk, lote = "movimiento_salida", {}  # sin lote: se asigna FEFO
+                else:
+                    cantidad = Decimal("0.700") if n % 3 == 0 else Decimal("0.100")
+                    mov, tipo = MovimientoEntrada.objects.create(bodega=bodega), "entrada"
+                    fk, lote = "movimiento_entrada", {"lote": f"L{n % 4}", "vencimiento": date.today() + timedelta(days=n % 4)}
+                for j in range(lineas):
+                    filas.append(MovimientoLinea(
+                        **{fk: mov}, producto=prods[(w + n + j) % productos],
+                        cantidad=cantidad, costo_unitario=Decimal(100 + n), **lote,
+                    ))
+                trabajos[w].append((tipo, mov.pk))
+        MovimientoLinea.objects.bulk_create(filas)
+        return trabajos, bodega, [p.pk for p in prods]
+
+    def _verificar(self, bodega, productos):
+        from bodega.models import BaseMovimiento, Kardex, MovimientoLinea, Stock, StockLote
+
+        posteado = BaseMovimiento.Estado.POSTEADO
+        esperado = Counter()
+        for fk, signo in (("movimiento_entrada", 1), ("movimiento_salida", -1)):
+            filas = (
+                MovimientoLinea.objects
+                .filter(**{f"{fk}__bodega": bodega, f"{fk}__estado": posteado})
+                .values("producto_id").annotate(total=Sum("cantidad"))
+            )
+            for f in filas:
+                esperado[f["producto_id"]] += signo * f["total"]
+
+        stock = dict(Stock.objects.filter(bodega=bodega).values_list("producto_id", "cantidad"))
+        lotes = dict(
+            StockLote.objects.filter(bodega=bodega).values("producto_id").annotate(total=Sum("cantidad"))
+            .values_list("producto_id", "total")
+        )
+        ultimo = {}
+        for producto_id, saldo in Kardex.objects.filter(bodega=bodega).order_by("id").values_list("producto_id", "saldo"):
+            ultimo[producto_id] = saldo
+
+        diferencias = []
+        for pk in productos:
+            valores = tuple(d.get(pk, Decimal("0")) for d in (esperado, stock, ultimo, lotes))
+            if len(set(valores)) > 1 or valores[1] < 0:
+                diferencias.append(
+                    f"producto {pk}: posteado={valores[0]} stock={valores[1]} kardex={valores[2]} lotes={valores[3]}"
+                )
+        return diferencias
+
+    def _limpiar(self, bodega, productos):
+        from bodega.models import MovimientoEntrada, MovimientoSalida, Producto
+
+        MovimientoEntrada.objects.filter(bodega=bodega).delete()
+        MovimientoSalida.objects.filter(bodega=bodega).delete()
+        bodega.delete()
+        Producto.objects.filter(pk__in=productos).delete()
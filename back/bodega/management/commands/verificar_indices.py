@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bodega.filtros import IndiceNoUsado, verificar_indices
+from bodega.urls import router
+
+
+class Command(BaseCommand):
+    help = (
+        "Corre EXPLAIN QUERY PLAN sobre los listados filtrados (consultas_indexadas de cada "
+        "ViewSet con FiltrosMixin) y falla si alguno recorre una tabla completa en vez de usar un índice."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--plan", action="store_true", help="Muestra el plan de cada consulta.")
+
+    def handle(self, *args, **options):
+        fallas = []
+        for prefijo, vista, _ in router.registry:
+            for params in getattr(vista, "consultas_indexadas", ()):
+                etiqueta = f"{prefijo}/?" + "&".join(f"{k}={v}" for k, v in params.items())
+                try:
+                    pasos = verificar_indices(vista, params)
+                except IndiceNoUsado as e:
+                    fallas.append(str(e))
+                    self.stdout.write(self.style.ERROR(f"SCAN    {etiqueta}"))
+                    continue
+                self.stdout.write(f"ok      {etiqueta}")
+                if options["plan"]:
+                    for paso in pasos:
+                        self.stdout.write(f"          {' '.join(paso)}")
+
+        if fallas:
+            raise CommandError("Consultas sin índice:\n" + "\n".join(fallas))
+        self.stdout.write(self.style.SUCCESS("Todos los filtros usan índices."))
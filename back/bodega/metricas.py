@@ -0,0 +1,214 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # segundos
+
+
+class Medicion:
+    """Queries y tiempos de una request; se llena con execute_wrapper (ver InstrumentacionMiddleware)."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.render = 0.0  # solo el render de la respuesta; serializer.data queda en la vista
+        self.sql = []  # solo con guardar_sql (presupuesto())
+        self.guardar_sql = False
+
+    def __call__(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - t0
+            if self.guardar_sql:
+                self.sql.append(sql)
+
+    @contextmanager
+    def midiendo(self):
+        # todas las conexiones (alias) de la request
+        with ExitStack() as stack:
+            for conexion in connections.all():
+                stack.enter_context(conexion.execute_wrapper(self))
+            yield self
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.inicio
+
+
+class Registro:
+    """
+    Acumulados por (ruta, método) en memoria del proceso; /bodega/metrics los
+    expone en formato Prometheus (cada worker tiene los suyos: se scrapea por
+    proceso o se suman en Prometheus).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.limpiar()
+
+    def limpiar(self):
+        with self._lock:
+            self.requests = defaultdict(int)  # (ruta, método, estado) -> n
+            self.buckets = defaultdict(lambda: [0] * len(BUCKETS))  # (ruta, método) -> acumulado por bucket
+            self.sumas = defaultdict(lambda: {"n": 0, "total": 0.0, "db": 0.0, "render": 0.0, "queries": 0, "max_queries": 0})
+            self.excedidos = defaultdict(int)  # (ruta, método) -> requests sobre su presupuesto de queries
+
+    def registrar(self, ruta, metodo, estado, medicion, excedido=False):
+        total = medicion.total
+        clave = (ruta, metodo)
+        with self._lock:
+            self.requests[(ruta, metodo, str(estado))] += 1
+            buckets = self.buckets[clave]
+            for i, limite in enumerate(BUCKETS):
+                if total <= limite:
+                    buckets[i] += 1
+            s = self.sumas[clave]
+            s["n"] += 1
+            s["total"] += total
+            s["db"] += medicion.db
+            s["render"] += medicion.render
+            s["queries"] += medicion.queries
+            s["max_queries"] = max(s["max_queries"], medicion.queries)
+            if excedido:
+                self.excedidos[clave] += 1
+
+
+registro = Registro()
+
+
+def ruta_de(request_o_path):
+    """Nombre de la vista (ej: producto-list) o "sin_ruta"."""
+    match = getattr(request_o_path, "resolver_match", None)
+    if match is None and isinstance(request_o_path, str):
+        try:
+            match = resolve(request_o_path.split("?")[0])
+        except Resolver404:
+            match = None
+    return (match.view_name or match._func_path) if match else "sin_ruta"
+
+
+def presupuesto_de(ruta, metodo="GET"):
+    # "ruta" es el presupuesto de lectura (GET/HEAD); una escritura solo tiene
+    # presupuesto si se declara como ("ruta", "POST")
+    presupuestos = getattr(settings, "BODEGA_PRESUPUESTO_QUERIES", {})
+    if (ruta, metodo) in presupuestos:
+        return presupuestos[(ruta, metodo)]
+    return presupuestos.get(ruta) if metodo in ("GET", "HEAD") else None
+
+
+# --- formato Prometheus ---------------------------------------------------------
+
+def _etiquetas(**kw):
+    def escapar(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in kw.items()) + "}"
+
+
+def prometheus():
+    from .cache import estadisticas
+    from .models import contadores_posteo
+
+    lineas = []
+
+    def metrica(nombre, tipo, ayuda, filas):
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        lineas.extend(f"{nombre}{etiquetas} {valor}" for etiquetas, valor in filas)
+
+    with registro._lock:
+        requests = sorted(registro.requests.items())
+        sumas = sorted((k, dict(v)) for k, v in registro.sumas.items())
+        buckets = {k: list(v) for k, v in registro.buckets.items()}
+        excedidos = sorted(registro.excedidos.items())
+
+    metrica("bodega_http_requests_total", "counter", "Requests por ruta, método y estado.", [
+        (_etiquetas(ruta=r, metodo=m, estado=e), n) for (r, m, e), n in requests
+    ])
+    lineas.append("# HELP bodega_http_request_seconds Duración total de la request.")
+    lineas.append("# TYPE bodega_http_request_seconds histogram")
+    for (r, m), s in sumas:
+        for limite, n in zip(BUCKETS, buckets[(r, m)]):
+            lineas.append(f"bodega_http_request_seconds_bucket{_etiquetas(ruta=r, metodo=m, le=limite)} {n}")
+        lineas.append(f"bodega_http_request_seconds_bucket{_etiquetas(ruta=r, metodo=m, le='+Inf')} {s['n']}")
+        lineas.append(f"bodega_http_request_seconds_sum{_etiquetas(ruta=r, metodo=m)} {s['total']:.6f}")
+        lineas.append(f"bodega_http_request_seconds_count{_etiquetas(ruta=r, metodo=m)} {s['n']}")
+
+    metrica("bodega_db_queries_total", "counter", "Queries SQL ejecutadas.", [
+        (_etiquetas(ruta=r, metodo=m), s["queries"]) for (r, m), s in sumas
+    ])
+    metrica("bodega_db_queries_max", "gauge", "Máximo de queries en una sola request.", [
+        (_etiquetas(ruta=r, metodo=m), s["max_queries"]) for (r, m), s in sumas
+    ])
+    metrica("bodega_db_seconds_total", "counter", "Tiempo en la base de datos.", [
+        (_etiquetas(ruta=r, metodo=m), f"{s['db']:.6f}") for (r, m), s in sumas
+    ])
+    metrica("bodega_render_seconds_total", "counter", "Tiempo de render de la respuesta (JSON/CSV/HTML), sin serializers.", [
+        (_etiquetas(ruta=r, metodo=m), f"{s['render']:.6f}") for (r, m), s in sumas
+    ])
+    metrica("bodega_presupuesto_excedido_total", "counter", "Requests sobre su presupuesto de queries.", [
+        (_etiquetas(ruta=r, metodo=m), n) for (r, m), n in excedidos
+    ])
+
+    caches = sorted(estadisticas().items())
+    metrica("bodega_cache_hits_total", "counter", "Hits de las caches en proceso.", [
+        (_etiquetas(cache=c), e["hits"]) for c, e in caches
+    ])
+    metrica("bodega_cache_misses_total", "counter", "Misses de las caches en proceso.", [
+        (_etiquetas(cache=c), e["misses"]) for c, e in caches
+    ])
+    metrica("bodega_cache_filas", "gauge", "Filas cargadas en cada cache.", [
+        (_etiquetas(cache=c), e["filas"]) for c, e in caches
+    ])
+    metrica("bodega_posteo_conflictos_total", "counter", "Conflictos de stock o bloqueos al postear.", [
+        ("", contadores_posteo["conflictos"])
+    ])
+    metrica("bodega_posteo_reintentos_total", "counter", "Reintentos de posteo.", [
+        ("", contadores_posteo["reintentos"])
+    ])
+    return "\n".join(lineas) + "\n"
+
+
+# --- presupuesto de queries para tests ----------------------------------------
+
+class PresupuestoExcedido(AssertionError):
+    pass
+
+
+@contextmanager
+def presupuesto(maximo, descripcion=""):
+    """
+    with presupuesto(5): client.get("/bodega/productos/")
+    Falla (PresupuestoExcedido, un AssertionError) si el bloque ejecuta más de
+    `maximo` queries, listando el SQL.
+    """
+    medicion = Medicion()
+    medicion.guardar_sql = True
+    with medicion.midiendo():
+        yield medicion
+    if medicion.queries > maximo:
+        detalle = "\n".join(f"  {i}. {sql}" for i, sql in enumerate(medicion.sql, 1))
+        raise PresupuestoExcedido(
+            f"{descripcion or 'bloque'}: {medicion.queries} queries, presupuesto {maximo}\n{detalle}"
+        )
+
+
+def verificar_presupuesto(client, url, maximo=None, **kwargs):
+    """
+    GET con el test client y falla si la ruta supera su presupuesto (el de
+    settings.BODEGA_PRESUPUESTO_QUERIES si no se indica). Retorna la respuesta.
+    """
+    ruta = ruta_de(url)
+    maximo = presupuesto_de(ruta) if maximo is None else maximo
+    if maximo is None:
+        raise AssertionError(f"{ruta} no tiene presupuesto de queries en BODEGA_PRESUPUESTO_QUERIES.")
+    with presupuesto(maximo, f"GET {url} ({ruta})"):
+        return client.get(url, **kwargs)
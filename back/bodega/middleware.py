@@ -0,0 +1,58 @@
+import logging
+import time
+
+from .metricas import Medicion, presupuesto_de, registro, ruta_de
+
+logger = logging.getLogger("bodega")
+
+
+class InstrumentacionMiddleware:
+    """
+    Mide cada request: queries y tiempo de SQL (execute_wrapper sobre todas las
+    conexiones), render de la respuesta (JSON/CSV/HTML) y total. Lo agrega en
+    el registro que expone /bodega/metrics y lo devuelve en el header Server-Timing:
+
+        Server-Timing: db;dur=12.1;desc="8 queries", render;dur=3.4, app;dur=5.0, total;dur=20.5
+
+    app = vista y serializers (serializer.data) sin el SQL. Las respuestas en
+    streaming (exports) se miden hasta los headers. Si la ruta supera su
+    presupuesto de BODEGA_PRESUPUESTO_QUERIES para ese método se registra un warning.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = Medicion()
+        request._medicion = medicion
+        with medicion.midiendo():
+            response = self.get_response(request)
+
+        ruta = ruta_de(request)
+        maximo = presupuesto_de(ruta, request.method)
+        excedido = maximo is not None and medicion.queries > maximo
+        if excedido:
+            logger.warning("%s %s: %d queries (presupuesto %d)", request.method, ruta, medicion.queries, maximo)
+        registro.registrar(ruta, request.method, response.status_code, medicion, excedido)
+
+        total = medicion.total * 1000
+        db, render = medicion.db * 1000, medicion.render * 1000
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={db:.1f};desc="{medicion.queries} queries"',
+            f"render;dur={render:.1f}",
+            f"app;dur={max(total - db - render, 0):.1f}",
+            f"total;dur={total:.1f}",
+        ])
+        return response
+
+    def process_template_response(self, request, response):
+        # las Response de DRF se renderizan después de este hook
+        medicion = getattr(request, "_medicion", None)
+        if medicion is not None:
+            inicio = time.perf_counter()
+
+            def fin(_response):
+                medicion.render += time.perf_counter() - inicio
+
+            response.add_post_render_callback(fin)
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientoentrada',
+            index=models.Index(fields=['-fecha', '-id'], name='movimientoentrada_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientosalida',
+            index=models.Index(fields=['-fecha', '-id'], name='movimientosalida_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def apertura_desde_stock(apps, schema_editor):
+    # el stock ya existente entra al kardex como saldo de apertura
+    Stock = apps.get_model("bodega", "Stock")
+    Kardex = apps.get_model("bodega", "Kardex")
+    Kardex.objects.bulk_create(
+        Kardex(bodega_id=s.bodega_id, producto_id=s.producto_id, delta=s.cantidad, saldo=s.cantidad,
+               fecha=s.actualizado_en, tipo="APERTURA")
+        for s in Stock.objects.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega', '0002_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Kardex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('saldo', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('tipo', models.CharField(choices=[('APERTURA', 'Apertura'), ('ENTRADA', 'Entrada'), ('SALIDA', 'Salida')], max_length=20)),
+                ('movimiento_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kardex', to='bodega.bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kardex', to='bodega.producto')),
+            ],
+            options={
+                'ordering': ['-fecha', '-id'],
+                'indexes': [models.Index(fields=['bodega', 'producto', 'fecha', 'id'], name='kardex_bod_prod_fecha_idx'), models.Index(fields=['tipo', 'movimiento_id'], name='kardex_origen_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='KardexCierre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('saldo', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kardex_cierres', to='bodega.bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kardex_cierres', to='bodega.producto')),
+            ],
+            options={
+                'ordering': ['-fecha'],
+                'unique_together': {('bodega', 'producto', 'fecha')},
+            },
+        ),
+        migrations.RunPython(apertura_desde_stock, migrations.RunPython.noop),
+    ]
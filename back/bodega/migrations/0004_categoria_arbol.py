@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def construir_arbol(apps, schema_editor):
+    Categoria = apps.get_model("bodega", "Categoria")
+    CategoriaArbol = apps.get_model("bodega", "CategoriaArbol")
+    padres = dict(Categoria.objects.values_list("id", "padre_id"))
+    filas = []
+    for categoria_id in padres:
+        actual, profundidad, vistos = categoria_id, 0, set()
+        while actual and actual not in vistos:
+            vistos.add(actual)
+            filas.append(CategoriaArbol(ancestro_id=actual, descendiente_id=categoria_id, profundidad=profundidad))
+            actual, profundidad = padres.get(actual), profundidad + 1
+    CategoriaArbol.objects.bulk_create(filas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega', '0003_kardex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoriaArbol',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profundidad', models.PositiveSmallIntegerField()),
+                ('ancestro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='arbol_descendientes', to='bodega.categoria')),
+                ('descendiente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='arbol_ancestros', to='bodega.categoria')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendiente', 'ancestro'], name='categoriaarbol_desc_idx')],
+                'unique_together': {('ancestro', 'descendiente')},
+            },
+        ),
+        migrations.RunPython(construir_arbol, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def calcular_alertas(apps, schema_editor):
+    from decimal import Decimal
+    from django.db.models import F, Sum
+
+    Stock = apps.get_model("bodega", "Stock")
+    Producto = apps.get_model("bodega", "Producto")
+    AlertaReposicion = apps.get_model("bodega", "AlertaReposicion")
+
+    def fila(bodega_id, producto_id, cantidad, minimo, maximo):
+        objetivo = maximo if maximo > minimo else minimo
+        return AlertaReposicion(bodega_id=bodega_id, producto_id=producto_id, cantidad=cantidad,
+                                faltante=minimo - cantidad, sugerido=objetivo - cantidad)
+
+    filas = [
+        fila(*f) for f in Stock.objects.filter(producto__activo=True, cantidad__lt=F("producto__stock_minimo"))
+        .values_list("bodega_id", "producto_id", "cantidad", "producto__stock_minimo", "producto__stock_maximo")
+    ]
+    for pk, total, minimo, maximo in (
+        Producto.objects.filter(activo=True, stock_minimo__gt=0).annotate(total=Sum("stocks__cantidad"))
+        .values_list("id", "total", "stock_minimo", "stock_maximo")
+    ):
+        total = total or Decimal("0")
+        if total < minimo:
+            filas.append(fila(None, pk, total, minimo, maximo))
+    AlertaReposicion.objects.bulk_create(filas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega', '0004_categoria_arbol'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertaReposicion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('faltante', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('sugerido', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('bodega', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alertas_reposicion', to='bodega.bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas_reposicion', to='bodega.producto')),
+            ],
+            options={
+                'ordering': ['bodega_id', '-faltante'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('bodega__isnull', False)), fields=('bodega', 'producto'), name='alerta_bodega_producto_uniq'), models.UniqueConstraint(condition=models.Q(('bodega__isnull', True)), fields=('producto',), name='alerta_total_producto_uniq')],
+            },
+        ),
+        migrations.RunPython(calcular_alertas, migrations.RunPython.noop),
+    ]
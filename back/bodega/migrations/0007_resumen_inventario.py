@@ -0,0 +1,63 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def calcular_resumen(apps, schema_editor):
+    # misma cuenta que ResumenInventario.aportes() / reconstruir()
+    from collections import defaultdict
+    from decimal import Decimal
+
+    Stock = apps.get_model("bodega", "Stock")
+    Producto = apps.get_model("bodega", "Producto")
+    ResumenInventario = apps.get_model("bodega", "ResumenInventario")
+
+    categorias = defaultdict(list)
+    for producto_id, categoria_id in Producto.categorias.through.objects.values_list("producto_id", "categoria_id"):
+        categorias[producto_id].append(categoria_id)
+
+    grupos = defaultdict(lambda: [Decimal("0"), Decimal("0"), 0])
+    filas = Stock.objects.values_list("bodega_id", "producto_id", "cantidad", "producto__costo_promedio", "producto__marca_id")
+    for bodega_id, producto_id, cantidad, costo, marca_id in filas:
+        valor = (cantidad * costo).quantize(Decimal("0.01"))
+        claves = [(bodega_id, "TOTAL", 0), (bodega_id, "MARCA", marca_id or 0)]
+        claves += [(bodega_id, "CATEGORIA", c) for c in categorias[producto_id] or [0]]
+        for clave in claves:
+            grupos[clave][0] += cantidad
+            grupos[clave][1] += valor
+            grupos[clave][2] += cantidad > 0
+
+    ResumenInventario.objects.bulk_create(
+        [ResumenInventario(bodega_id=b, dimension=d, referencia=r, cantidad=c, valor=v, productos=n)
+         for (b, d, r), (c, v, n) in grupos.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega', '0006_stock_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('TOTAL', 'Total'), ('CATEGORIA', 'Categoría'), ('MARCA', 'Marca')], max_length=10)),
+                ('referencia', models.PositiveBigIntegerField(default=0)),
+                ('cantidad', models.DecimalField(decimal_places=3, default=0, max_digits=16)),
+                ('valor', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('productos', models.IntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_inventario', to='bodega.bodega')),
+            ],
+            options={
+                'ordering': ['bodega_id', 'dimension', '-valor'],
+                'constraints': [models.UniqueConstraint(fields=('bodega', 'dimension', 'referencia'), name='resumen_inventario_uniq')],
+            },
+        ),
+        migrations.RunPython(calcular_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def normalizar(valor):
+    # copia de bodega.models.normalizar_codigo al momento de la migración
+    codigo = "".join(str(valor or "").split()).upper()
+    if codigo.isdigit() and 12 <= len(codigo) <= 14:
+        codigo = codigo.zfill(14)
+    return codigo
+
+
+def cargar_codigos(apps, schema_editor):
+    Producto = apps.get_model("bodega", "Producto")
+    ProductoProveedor = apps.get_model("bodega", "ProductoProveedor")
+    CodigoProducto = apps.get_model("bodega", "CodigoProducto")
+
+    filas = set()
+    for pk, sku, barra in Producto.objects.values_list("id", "sku", "codigo_barra"):
+        filas.add((normalizar(sku), "SKU", pk))
+        if normalizar(barra):
+            filas.add((normalizar(barra), "BARRA", pk))
+    for pk, codigo in ProductoProveedor.objects.values_list("producto_id", "codigo_proveedor"):
+        if normalizar(codigo):
+            filas.add((normalizar(codigo), "PROVEEDOR", pk))
+    CodigoProducto.objects.bulk_create(
+        [CodigoProducto(codigo=c, tipo=t, producto_id=p) for c, t, p in sorted(filas)], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega', '0007_resumen_inventario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodigoProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=80)),
+                ('tipo', models.CharField(choices=[('SKU', 'SKU'), ('BARRA', 'Código de barra'), ('PROVEEDOR', 'Código de proveedor')], max_length=10)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='codigos', to='bodega.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('codigo', 'tipo', 'producto'), name='codigo_producto_uniq')],
+            },
+        ),
+        migrations.RunPython(cargar_codigos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:40
+
+from collections import defaultdict
+
+from django.db import OperationalError, migrations
+
+TABLA = "bodega_producto_fts"
+
+
+def crear_indice(apps, schema_editor):
+    # solo SQLite con FTS5; en otros motores la búsqueda usa el respaldo portable
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA} USING fts5("
+                "sku, nombre, descripcion, marca, categorias, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+        except OperationalError:
+            return  # SQLite compilado sin FTS5
+
+        Producto = apps.get_model("bodega", "Producto")
+        categorias = defaultdict(list)
+        for producto_id, nombre in Producto.categorias.through.objects.values_list("producto_id", "categoria__nombre"):
+            categorias[producto_id].append(nombre)
+        filas = [
+            (pk, sku, nombre, descripcion, marca or "", " ".join(categorias[pk]))
+            for pk, sku, nombre, descripcion, marca in Producto.objects.values_list(
+                "id", "sku", "nombre", "descripcion", "marca__nombre"
+            )
+        ]
+        cursor.executemany(
+            f"INSERT INTO {TABLA} (rowid, sku, nombre, descripcion, marca, categorias) VALUES (%s, %s, %s, %s, %s, %s)",
+            filas,
+        )
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega', '0008_codigo_producto'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def calcular_lotes(apps, schema_editor):
+    # misma cuenta que StockLote.reconstruir(): líneas posteadas por lote, cuadradas contra Stock
+    import datetime
+    from collections import defaultdict
+    from decimal import Decimal
+
+    Stock = apps.get_model("bodega", "Stock")
+    StockLote = apps.get_model("bodega", "StockLote")
+    MovimientoLinea = apps.get_model("bodega", "MovimientoLinea")
+
+    lotes = defaultdict(lambda: [Decimal("0"), None])
+    for fk, signo in (("movimiento_entrada", 1), ("movimiento_salida", -1)):
+        filas = MovimientoLinea.objects.filter(**{f"{fk}__estado": "POSTEADO"}).values_list(
+            f"{fk}__bodega_id", "producto_id", "lote", "vencimiento", "cantidad"
+        )
+        for bodega_id, producto_id, lote, vencimiento, cantidad in filas:
+            fila = lotes[(bodega_id, producto_id, lote)]
+            fila[0] += signo * cantidad
+            if signo > 0 and vencimiento and not fila[1]:
+                fila[1] = vencimiento
+
+    por_clave = defaultdict(list)
+    for (b, p, lote), (cantidad, vencimiento) in lotes.items():
+        por_clave[(b, p)].append([lote, vencimiento, max(cantidad, Decimal("0"))])
+    filas = []
+    for b, p, total in Stock.objects.values_list("bodega_id", "producto_id", "cantidad"):
+        propios = sorted(
+            por_clave.get((b, p), []),
+            key=lambda f: (f[1] is None, f[1] or datetime.date.max, f[0] == "", f[0]),
+        )
+        exceso = sum(f[2] for f in propios) - total
+        for f in propios:
+            if exceso <= 0:
+                break
+            descontado = min(f[2], exceso)
+            f[2] -= descontado
+            exceso -= descontado
+        if exceso < 0:
+            sin_lote = next((f for f in propios if f[0] == ""), None)
+            if sin_lote is None:
+                sin_lote = ["", None, Decimal("0")]
+                propios.append(sin_lote)
+            sin_lote[2] -= exceso
+        filas += [StockLote(bodega_id=b, producto_id=p, lote=l, vencimiento=v, cantidad=c) for l, v, c in propios if c > 0]
+    StockLote.objects.bulk_create(filas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega', '0009_producto_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockLote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lote', models.CharField(blank=True, default='', max_length=80)),
+                ('vencimiento', models.DateField(blank=True, null=True)),
+                ('cantidad', models.DecimalField(decimal_places=3, default=0, max_digits=14)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_lotes', to='bodega.bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_lotes', to='bodega.producto')),
+            ],
+            options={
+                'ordering': ['bodega_id', 'producto_id', models.OrderBy(models.F('vencimiento'), nulls_last=True), 'lote'],
+                'indexes': [models.Index(fields=['vencimiento', 'bodega'], name='stock_lote_vence_idx')],
+                'constraints': [models.UniqueConstraint(fields=('bodega', 'producto', 'lote'), name='stock_lote_uniq'), models.CheckConstraint(condition=models.Q(('cantidad__gte', 0)), name='stock_lote_no_negativo')],
+            },
+        ),
+        migrations.RunPython(calcular_lotes, migrations.RunPython.noop),
+    ]
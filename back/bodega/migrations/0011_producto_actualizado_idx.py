@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega', '0010_stock_lote'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['actualizado_en'], name='producto_actualizado_idx'),
+        ),
+    ]
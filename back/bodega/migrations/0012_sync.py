@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega', '0011_producto_actualizado_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=40)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('eliminado_en', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['eliminado_en', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bodega',
+            index=models.Index(fields=['actualizado_en', 'id'], name='bodega_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='categoria',
+            index=models.Index(fields=['actualizado_en', 'id'], name='categoria_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marca',
+            index=models.Index(fields=['actualizado_en', 'id'], name='marca_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['actualizado_en', 'id'], name='stock_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eliminacion',
+            index=models.Index(fields=['eliminado_en', 'id'], name='eliminacion_fecha_idx'),
+        ),
+    ]
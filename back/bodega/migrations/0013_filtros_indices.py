@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-18 20:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega', '0012_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='movimientolinea',
+            name='bodega_movi_product_ed91aa_idx',
+        ),
+        migrations.AddIndex(
+            model_name='movimientoentrada',
+            index=models.Index(fields=['bodega', 'estado', '-fecha', '-id'], name='movimientoentrada_bodega_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoentrada',
+            index=models.Index(fields=['referencia'], name='movimientoentrada_ref_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoentrada',
+            index=models.Index(fields=['proveedor', '-fecha', '-id'], name='movimientoentrada_prov_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientolinea',
+            index=models.Index(fields=['producto', 'movimiento_entrada'], name='linea_producto_entrada_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientolinea',
+            index=models.Index(fields=['producto', 'movimiento_salida'], name='linea_producto_salida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientosalida',
+            index=models.Index(fields=['bodega', 'estado', '-fecha', '-id'], name='movimientosalida_bodega_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientosalida',
+            index=models.Index(fields=['referencia'], name='movimientosalida_ref_idx'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 6.0.1 on 2026-10-18 20:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega', '0013_filtros_indices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoTransferencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('estado', models.CharField(choices=[('BORRADOR', 'Borrador'), ('POSTEADO', 'Posteado')], default='BORRADOR', max_length=20)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('referencia', models.CharField(blank=True, default='', max_length=120)),
+                ('observacion', models.TextField(blank=True, default='')),
+                ('posteado_en', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-fecha', '-id'],
+                'abstract': False,
+            },
+        ),
+        migrations.RemoveConstraint(
+            model_name='movimientolinea',
+            name='linea_xor_entrada_salida',
+        ),
+        migrations.AlterField(
+            model_name='kardex',
+            name='tipo',
+            field=models.CharField(choices=[('APERTURA', 'Apertura'), ('ENTRADA', 'Entrada'), ('SALIDA', 'Salida'), ('TRANSFERENCIA', 'Transferencia')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='movimientotransferencia',
+            name='bodega',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_movimientos', to='bodega.bodega'),
+        ),
+        migrations.AddField(
+            model_name='movimientotransferencia',
+            name='bodega_destino',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transferencias_recibidas', to='bodega.bodega'),
+        ),
+        migrations.AddField(
+            model_name='movimientotransferencia',
+            name='creado_por',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='movimientolinea',
+            name='movimiento_transferencia',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='bodega.movimientotransferencia'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientolinea',
+            index=models.Index(fields=['producto', 'movimiento_transferencia'], name='linea_producto_transf_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='movimientolinea',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('movimiento_entrada__isnull', False), ('movimiento_salida__isnull', True), ('movimiento_transferencia__isnull', True)), models.Q(('movimiento_entrada__isnull', True), ('movimiento_salida__isnull', False), ('movimiento_transferencia__isnull', True)), models.Q(('movimiento_entrada__isnull', True), ('movimiento_salida__isnull', True), ('movimiento_transferencia__isnull', False)), _connector='OR'), name='linea_un_movimiento'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientotransferencia',
+            index=models.Index(fields=['-fecha', '-id'], name='transferencia_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientotransferencia',
+            index=models.Index(fields=['bodega', 'estado', '-fecha', '-id'], name='transferencia_bodega_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientotransferencia',
+            index=models.Index(fields=['bodega_destino', 'estado', '-fecha', '-id'], name='transferencia_destino_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientotransferencia',
+            index=models.Index(fields=['referencia'], name='transferencia_ref_idx'),
+        ),
+    ]
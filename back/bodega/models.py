@@ -1,9 +1,21 @@
+import random
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import UTC, date, datetime, timedelta
+from decimal import Decimal
+from time import sleep  # no `import time`: views/serializers hacen `from .models import *` y pisaría datetime.time
+
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models, transaction
-from django.db.models import Q
+from django.db import OperationalError, connection, models, transaction
+from django.db.models import F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from .cache import codigos as cache_codigos
+
+CENTAVO = Decimal("0.01")
+
 class TimeStampedModel(models.Model):
     creado_en = models.DateTimeField(auto_now_add=True)
     actualizado_en = models.DateTimeField(auto_now=True)
@@ -18,16 +30,88 @@ class Categoria(TimeStampedModel):
 
     class Meta:
         ordering = ["nombre"]
+        indexes = [models.Index(fields=["actualizado_en", "id"], name="categoria_actualizado_idx")]  # sync
 
     def __str__(self):
         return self.nombre
 
+    def clean(self):
+        if self.pk and self.padre_id and CategoriaArbol.objects.filter(
+            ancestro_id=self.pk, descendiente_id=self.padre_id
+        ).exists():
+            raise ValidationError("La categoría padre no puede ser la misma categoría ni una subcategoría suya.")
+
+class CategoriaArbol(models.Model):
+    """
+    Closure table del árbol Categoria.padre: una fila por par (ancestro, descendiente),
+    incluida la fila de la propia categoría con profundidad 0. Se mantiene desde
+    signals.py (alta, cambio de padre y borrado).
+    """
+    ancestro = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name="arbol_descendientes")
+    descendiente = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name="arbol_ancestros")
+    profundidad = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = [("ancestro", "descendiente")]
+        indexes = [models.Index(fields=["descendiente", "ancestro"], name="categoriaarbol_desc_idx")]
+
+    def __str__(self):
+        return f"{self.ancestro_id} -> {self.descendiente_id} ({self.profundidad})"
+
+    @classmethod
+    def descendientes_ids(cls, categoria_id):
+        return cls.objects.filter(ancestro_id=categoria_id).values("descendiente_id")
+
+    @classmethod
+    def insertar(cls, categoria_id, padre_id):
+        filas = [cls(ancestro_id=categoria_id, descendiente_id=categoria_id, profundidad=0)]
+        if padre_id:
+            filas += [
+                cls(ancestro_id=a, descendiente_id=categoria_id, profundidad=p + 1)
+                for a, p in cls.objects.filter(descendiente_id=padre_id).values_list("ancestro_id", "profundidad")
+            ]
+        cls.objects.bulk_create(filas, ignore_conflicts=True)
+
+    @classmethod
+    def desligar(cls, categoria_id):
+        # corta el subárbol de categoria_id de todos sus ancestros (queda como raíz)
+        subarbol = list(cls.objects.filter(ancestro_id=categoria_id).values_list("descendiente_id", flat=True))
+        cls.objects.filter(descendiente_id__in=subarbol).exclude(ancestro_id__in=subarbol).delete()
+        return subarbol
+
+    @classmethod
+    def mover(cls, categoria_id, padre_id):
+        cls.desligar(categoria_id)
+        if not padre_id:
+            return
+        ancestros = list(cls.objects.filter(descendiente_id=padre_id).values_list("ancestro_id", "profundidad"))
+        subarbol = list(cls.objects.filter(ancestro_id=categoria_id).values_list("descendiente_id", "profundidad"))
+        cls.objects.bulk_create(
+            [cls(ancestro_id=a, descendiente_id=d, profundidad=pa + pd + 1) for a, pa in ancestros for d, pd in subarbol],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def reconstruir(cls):
+        padres = dict(Categoria.objects.values_list("id", "padre_id"))
+        filas = []
+        for categoria_id in padres:
+            actual, profundidad, vistos = categoria_id, 0, set()
+            while actual and actual not in vistos:
+                vistos.add(actual)
+                filas.append(cls(ancestro_id=actual, descendiente_id=categoria_id, profundidad=profundidad))
+                actual, profundidad = padres.get(actual), profundidad + 1
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(filas)
+
 class Marca(TimeStampedModel):
     nombre = models.CharField(max_length=120, unique=True)
     activa = models.BooleanField(default=True)
 
     class Meta:
         ordering = ["nombre"]
+        indexes = [models.Index(fields=["actualizado_en", "id"], name="marca_actualizado_idx")]  # sync
 
     def __str__(self):
         return self.nombre
@@ -58,6 +142,20 @@ class Proveedor(TimeStampedModel):
     def __str__(self):
         return self.nombre
 
+    def registrar_ultima_compra(self, costos):
+        # costos: {producto_id: costo}; crea el vínculo ProductoProveedor si no existe
+        existentes = dict(
+            ProductoProveedor.objects.filter(proveedor=self, producto_id__in=costos)
+            .values_list("producto_id", "id")
+        )
+        cambios = [(existentes[p], c) for p, c in costos.items() if p in existentes]
+        if cambios:
+            _actualizar_por_id(ProductoProveedor, "costo_ultima_compra", cambios)
+        ProductoProveedor.objects.bulk_create(
+            ProductoProveedor(producto_id=p, proveedor=self, costo_ultima_compra=c)
+            for p, c in costos.items() if p not in existentes
+        )
+
 class Producto(TimeStampedModel):
     sku = models.CharField(max_length=60, unique=True)
     nombre = models.CharField(max_length=200)
@@ -85,6 +183,7 @@ class Producto(TimeStampedModel):
             models.Index(fields=["sku"]),
             models.Index(fields=["nombre"]),
             models.Index(fields=["codigo_barra"]),
+            models.Index(fields=["actualizado_en"], name="producto_actualizado_idx"),  # ETag de listados y sync
         ]
 
     def __str__(self):
@@ -106,6 +205,101 @@ class ProductoProveedor(TimeStampedModel):
     def __str__(self):
         return f"{self.producto.sku} -> {self.proveedor.nombre}"
 
+
+def normalizar_codigo(valor):
+    """Sin espacios y en mayúsculas; GTIN de 12 a 14 dígitos a 14, así UPC-A y EAN-13 coinciden."""
+    codigo = "".join(str(valor or "").split()).upper()
+    if codigo.isdigit() and 12 <= len(codigo) <= 14:
+        codigo = codigo.zfill(14)
+    return codigo
+
+class CodigoProducto(models.Model):
+    """
+    Índice normalizado de códigos -> producto (sku, código de barra y códigos de
+    proveedor) para los lectores. Se regenera por producto desde signals y desde
+    la importación; ver CodigoProducto.buscar().
+    """
+    class Tipo(models.TextChoices):
+        SKU = "SKU", "SKU"
+        BARRA = "BARRA", "Código de barra"
+        PROVEEDOR = "PROVEEDOR", "Código de proveedor"
+
+    codigo = models.CharField(max_length=80)
+    tipo = models.CharField(max_length=10, choices=Tipo.choices)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="codigos")
+
+    class Meta:
+        constraints = [
+            # también es el índice de búsqueda (codigo primero)
+            models.UniqueConstraint(fields=["codigo", "tipo", "producto"], name="codigo_producto_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.codigo} ({self.tipo}) -> {self.producto_id}"
+
+    @classmethod
+    def sincronizar(cls, productos_ids):
+        filas = set()
+        for pk, sku, barra in Producto.objects.filter(pk__in=productos_ids).values_list("id", "sku", "codigo_barra"):
+            filas.add((normalizar_codigo(sku), cls.Tipo.SKU, pk))
+            if normalizar_codigo(barra):
+                filas.add((normalizar_codigo(barra), cls.Tipo.BARRA, pk))
+        proveedores = ProductoProveedor.objects.filter(producto_id__in=productos_ids).exclude(codigo_proveedor="")
+        for pk, codigo in proveedores.values_list("producto_id", "codigo_proveedor"):
+            if normalizar_codigo(codigo):
+                filas.add((normalizar_codigo(codigo), cls.Tipo.PROVEEDOR, pk))
+        with transaction.atomic():
+            cls.objects.filter(producto_id__in=productos_ids).delete()
+            cls.objects.bulk_create([cls(codigo=c, tipo=t, producto_id=p) for c, t, p in sorted(filas)], ignore_conflicts=True)
+        cache_codigos.invalidar()
+
+    @classmethod
+    def _cargar(cls, codigo):
+        # un solo query: código -> producto + unidad + stock por bodega (LEFT JOIN)
+        filas = (
+            cls.objects.filter(codigo=codigo)
+            .order_by("producto_id", "tipo")
+            .values_list(
+                "producto_id", "tipo", "producto__sku", "producto__nombre", "producto__unidad_medida__simbolo",
+                "producto__stocks__bodega_id", "producto__stocks__cantidad",
+            )
+        )
+        productos, stock = {}, defaultdict(dict)
+        for pk, tipo, sku, nombre, unidad, bodega_id, cantidad in filas:
+            productos.setdefault(pk, {"id": pk, "sku": sku, "nombre": nombre, "unidad": unidad, "coincide": tipo})
+            if bodega_id is not None:
+                stock[pk][bodega_id] = cantidad
+        return list(productos.values()), stock
+
+    @classmethod
+    def buscar(cls, codigo):
+        """
+        Productos con ese código exacto (normalizado) y su stock por bodega. La
+        cabecera sale de la LRU (cache_codigos); el stock se lee siempre en vivo,
+        así que un acierto cuesta un query por índice y un fallo, uno con join.
+        """
+        codigo = normalizar_codigo(codigo)
+        cargado = []
+
+        def cargar(c):
+            productos, stock = cls._cargar(c)
+            cargado.append(stock)
+            return productos
+
+        productos = cache_codigos.get(codigo, cargar)
+        if cargado:
+            stock = cargado[0]
+        else:
+            stock = defaultdict(dict)
+            if productos:
+                filas = Stock.objects.filter(producto_id__in=[p["id"] for p in productos])
+                for pk, bodega_id, cantidad in filas.values_list("producto_id", "bodega_id", "cantidad"):
+                    stock[pk][bodega_id] = cantidad
+        return [
+            dict(p, stock=[{"bodega": b, "cantidad": c} for b, c in sorted(stock[p["id"]].items())])
+            for p in productos
+        ]
+
 class Bodega(TimeStampedModel):
     nombre = models.CharField(max_length=120, unique=True)
     direccion = models.CharField(max_length=255, blank=True, default="")
@@ -113,6 +307,7 @@ class Bodega(TimeStampedModel):
 
     class Meta:
         ordering = ["nombre"]
+        indexes = [models.Index(fields=["actualizado_en", "id"], name="bodega_actualizado_idx")]  # sync
 
     def __str__(self):
         return self.nombre
@@ -122,10 +317,14 @@ class Stock(TimeStampedModel):
     bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="stocks")
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="stocks")
     cantidad = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+    version = models.PositiveIntegerField(default=0)  # +1 en cada UPDATE del posteo (control optimista)
 
     class Meta:
         unique_together = [("bodega", "producto")]
-        indexes = [models.Index(fields=["bodega", "producto"])]
+        indexes = [
+            models.Index(fields=["bodega", "producto"]),
+            models.Index(fields=["actualizado_en", "id"], name="stock_actualizado_idx"),  # sync
+        ]
         constraints = [
             models.CheckConstraint(condition=Q(cantidad__gte=0), name="stock_no_negativo"),
 
@@ -135,6 +334,497 @@ class Stock(TimeStampedModel):
         return f"{self.bodega} | {self.producto.sku} = {self.cantidad}"
 
 
+class Eliminacion(models.Model):
+    """Tombstone de una fila borrada, para el feed de sincronización (ver sync.py)."""
+    modelo = models.CharField(max_length=40)  # _meta.model_name
+    objeto_id = models.PositiveBigIntegerField()
+    eliminado_en = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["eliminado_en", "id"]
+        indexes = [models.Index(fields=["eliminado_en", "id"], name="eliminacion_fecha_idx")]
+
+    def __str__(self):
+        return f"{self.modelo} {self.objeto_id} @ {self.eliminado_en:%Y-%m-%d %H:%M}"
+
+
+class StockLote(models.Model):
+    """
+    Saldo por lote de cada (bodega, producto); la suma de sus lotes es
+    Stock.cantidad. Se mueve en el mismo posteo que Stock (ver _Lotes). Las
+    entradas sin lote van al lote "" y el vencimiento del lote es el de la
+    primera entrada que lo informa. Las salidas sin lote se reparten FEFO.
+    """
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="stock_lotes")
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="stock_lotes")
+    lote = models.CharField(max_length=80, blank=True, default="")
+    vencimiento = models.DateField(null=True, blank=True)
+    cantidad = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["bodega_id", "producto_id", F("vencimiento").asc(nulls_last=True), "lote"]
+        constraints = [
+            models.UniqueConstraint(fields=["bodega", "producto", "lote"], name="stock_lote_uniq"),
+            models.CheckConstraint(condition=Q(cantidad__gte=0), name="stock_lote_no_negativo"),
+        ]
+        indexes = [
+            models.Index(fields=["vencimiento", "bodega"], name="stock_lote_vence_idx"),  # "vence dentro de N días"
+        ]
+
+    def __str__(self):
+        return f"{self.bodega_id}/{self.producto_id} lote {self.lote or '-'} ({self.vencimiento or 's/v'}) = {self.cantidad}"
+
+    @staticmethod
+    def orden_fefo(lote, vencimiento):
+        # primero el que vence antes; los sin vencimiento al final y el lote "" al último
+        return (vencimiento is None, vencimiento or date.max, lote == "", lote)
+
+    @classmethod
+    def por_vencer(cls, dias, bodega_id=None):
+        """Lotes con saldo que vencen hasta dentro de `dias` días (incluye los ya vencidos)."""
+        qs = cls.objects.filter(cantidad__gt=0, vencimiento__lte=timezone.localdate() + timedelta(days=dias))
+        if bodega_id is not None:
+            qs = qs.filter(bodega_id=bodega_id)
+        return qs.order_by("vencimiento", "id")  # mismo orden que el cursor de /stock-lotes/por-vencer/
+
+    @classmethod
+    def reconstruir(cls):
+        """
+        Recalcula los lotes desde las líneas posteadas (entradas - salidas por
+        lote, las transferencias restan en origen y suman en destino, sin bajar
+        de 0) y los cuadra contra Stock: el exceso se descuenta FEFO y lo que
+        falta queda en el lote "".
+        """
+        posteado = BaseMovimiento.Estado.POSTEADO
+        lotes = defaultdict(lambda: [Decimal("0"), None])  # (bodega, producto, lote) -> [cantidad, vencimiento]
+        efectos = [
+            ("movimiento_entrada", "bodega", 1), ("movimiento_salida", "bodega", -1),
+            ("movimiento_transferencia", "bodega", -1), ("movimiento_transferencia", "bodega_destino", 1),
+        ]
+        for fk, bodega, signo in efectos:
+            filas = MovimientoLinea.objects.filter(**{f"{fk}__estado": posteado}).values_list(
+                f"{fk}__{bodega}_id", "producto_id", "lote", "vencimiento", "cantidad"
+            )
+            for bodega_id, producto_id, lote, vencimiento, cantidad in filas:
+                fila = lotes[(bodega_id, producto_id, lote)]
+                fila[0] += signo * cantidad
+                if signo > 0 and vencimiento and not fila[1]:
+                    fila[1] = vencimiento
+
+        por_clave = defaultdict(list)
+        for (b, p, lote), (cantidad, vencimiento) in lotes.items():
+            por_clave[(b, p)].append([lote, vencimiento, max(cantidad, Decimal("0"))])
+        filas = []
+        for b, p, total in Stock.objects.values_list("bodega_id", "producto_id", "cantidad"):
+            propios = sorted(por_clave.get((b, p), []), key=lambda f: cls.orden_fefo(f[0], f[1]))
+            exceso = sum(f[2] for f in propios) - total
+            for f in propios:
+                if exceso <= 0:
+                    break
+                descontado = min(f[2], exceso)
+                f[2] -= descontado
+                exceso -= descontado
+            if exceso < 0:
+                sin_lote = next((f for f in propios if f[0] == ""), None)
+                if sin_lote is None:
+                    sin_lote = ["", None, Decimal("0")]
+                    propios.append(sin_lote)
+                sin_lote[2] -= exceso
+            filas += [cls(bodega_id=b, producto_id=p, lote=l, vencimiento=v, cantidad=c) for l, v, c in propios if c > 0]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(filas, batch_size=1000)
+
+
+class Kardex(models.Model):
+    """
+    Libro de stock append-only: una fila por (movimiento, bodega, producto)
+    posteado, fechada con la fecha del movimiento (un movimiento con fecha
+    atrasada cae en su día). `saldo` es el stock que dejó el posteo, en orden de
+    posteo; el stock a una fecha se calcula sumando deltas (ver stock_a_fecha).
+    """
+    class Tipo(models.TextChoices):
+        APERTURA = "APERTURA", "Apertura"
+        ENTRADA = "ENTRADA", "Entrada"
+        SALIDA = "SALIDA", "Salida"
+        TRANSFERENCIA = "TRANSFERENCIA", "Transferencia"  # dos filas: -origen y +destino
+
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="kardex")
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="kardex")
+    delta = models.DecimalField(max_digits=14, decimal_places=3)  # con signo
+    saldo = models.DecimalField(max_digits=14, decimal_places=3)  # stock resultante al postear
+    fecha = models.DateTimeField(default=timezone.now)  # fecha del movimiento
+
+    tipo = models.CharField(max_length=20, choices=Tipo.choices)
+    movimiento_id = models.PositiveBigIntegerField(null=True, blank=True)  # id del movimiento origen según tipo
+
+    class Meta:
+        ordering = ["-fecha", "-id"]
+        indexes = [
+            models.Index(fields=["bodega", "producto", "fecha", "id"], name="kardex_bod_prod_fecha_idx"),
+            models.Index(fields=["tipo", "movimiento_id"], name="kardex_origen_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.bodega_id}/{self.producto_id} {self.delta:+} = {self.saldo}"
+
+class KardexCierre(models.Model):
+    """
+    Checkpoint del saldo por (bodega, producto) a una fecha (manage.py
+    cerrar_kardex): saldo = suma de los deltas del kardex con fecha <= la del
+    cierre. stock_a_fecha parte del último cierre y solo suma el kardex
+    posterior; un posteo con fecha anterior a un cierre lo corrige
+    (_ajustar_cierres).
+    """
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="kardex_cierres")
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="kardex_cierres")
+    fecha = models.DateTimeField()
+    saldo = models.DecimalField(max_digits=14, decimal_places=3)
+
+    class Meta:
+        ordering = ["-fecha"]
+        unique_together = [("bodega", "producto", "fecha")]
+
+    def __str__(self):
+        return f"{self.bodega_id}/{self.producto_id} @ {self.fecha:%Y-%m-%d} = {self.saldo}"
+
+class AlertaReposicion(models.Model):
+    """
+    Productos bajo stock_minimo, por bodega y en total (bodega nula). Se mantiene
+    incrementalmente desde aplicar_deltas_stock() solo para las claves tocadas,
+    y al cambiar mínimos/máximos del producto.
+    """
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, null=True, blank=True, related_name="alertas_reposicion")
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="alertas_reposicion")
+    cantidad = models.DecimalField(max_digits=14, decimal_places=3)  # stock actual
+    faltante = models.DecimalField(max_digits=14, decimal_places=3)  # stock_minimo - cantidad
+    sugerido = models.DecimalField(max_digits=14, decimal_places=3)  # hasta stock_maximo (o el mínimo si no hay máximo)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["bodega_id", "-faltante"]
+        constraints = [
+            models.UniqueConstraint(fields=["bodega", "producto"], condition=Q(bodega__isnull=False), name="alerta_bodega_producto_uniq"),
+            models.UniqueConstraint(fields=["producto"], condition=Q(bodega__isnull=True), name="alerta_total_producto_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.bodega_id or 'total'} | {self.producto_id}: {self.cantidad} (faltan {self.faltante})"
+
+    @classmethod
+    def _fila(cls, bodega_id, producto_id, cantidad, minimo, maximo):
+        objetivo = maximo if maximo > minimo else minimo
+        return cls(bodega_id=bodega_id, producto_id=producto_id, cantidad=cantidad,
+                   faltante=minimo - cantidad, sugerido=objetivo - cantidad)
+
+    @classmethod
+    def actualizar(cls, productos_ids=None, bodegas_ids=None):
+        """
+        Recalcula las alertas de esos productos (None = todo el catálogo) en la DB:
+        solo vuelven filas bajo el mínimo. bodegas_ids acota las alertas por bodega.
+        """
+        por_bodega = Stock.objects.filter(producto__activo=True, cantidad__lt=F("producto__stock_minimo"))
+        totales = (
+            Producto.objects.filter(activo=True, stock_minimo__gt=0)
+            .annotate(total=Coalesce(Sum("stocks__cantidad"), Value(Decimal("0")), output_field=models.DecimalField(max_digits=14, decimal_places=3)))
+            .filter(total__lt=F("stock_minimo"))
+        )
+        viejas = cls.objects.all()
+        if productos_ids is not None:
+            por_bodega = por_bodega.filter(producto_id__in=productos_ids)
+            totales = totales.filter(pk__in=productos_ids)
+            viejas = viejas.filter(producto_id__in=productos_ids)
+        if bodegas_ids is not None:
+            por_bodega = por_bodega.filter(bodega_id__in=bodegas_ids)
+            viejas = viejas.filter(Q(bodega_id__in=bodegas_ids) | Q(bodega__isnull=True))
+
+        filas = [
+            cls._fila(*f) for f in por_bodega.values_list(
+                "bodega_id", "producto_id", "cantidad", "producto__stock_minimo", "producto__stock_maximo"
+            )
+        ]
+        filas += [cls._fila(None, *f) for f in totales.values_list("id", "total", "stock_minimo", "stock_maximo")]
+        with transaction.atomic():
+            viejas.delete()
+            cls.objects.bulk_create(filas)
+
+class ResumenInventario(models.Model):
+    """
+    Unidades, valor (cantidad * costo_promedio) y productos con stock por bodega,
+    agrupados por categoría, por marca y en total. Se mantiene por diferencia
+    (aportes de los productos tocados antes y después del cambio) desde el
+    posteo, los cambios de producto/categorías y la importación; el dashboard
+    lee O(grupos) filas. referencia = id de la categoría o marca; 0 = sin
+    categoría / sin marca / total de la bodega.
+    """
+    class Dimension(models.TextChoices):
+        TOTAL = "TOTAL", "Total"
+        CATEGORIA = "CATEGORIA", "Categoría"
+        MARCA = "MARCA", "Marca"
+
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="resumenes_inventario")
+    dimension = models.CharField(max_length=10, choices=Dimension.choices)
+    referencia = models.PositiveBigIntegerField(default=0)
+    cantidad = models.DecimalField(max_digits=16, decimal_places=3, default=0)
+    valor = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    productos = models.IntegerField(default=0)  # productos con stock > 0
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["bodega_id", "dimension", "-valor"]
+        constraints = [
+            models.UniqueConstraint(fields=["bodega", "dimension", "referencia"], name="resumen_inventario_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.bodega_id} | {self.dimension} {self.referencia}: {self.cantidad} / ${self.valor}"
+
+    @classmethod
+    def aportes(cls, productos_ids=None):
+        """{(bodega, dimension, referencia): [cantidad, valor, productos]} del stock de esos productos (None = todos)."""
+        stock = Stock.objects.all()
+        categorias = Producto.categorias.through.objects.all()
+        if productos_ids is not None:
+            stock = stock.filter(producto_id__in=productos_ids)
+            categorias = categorias.filter(producto_id__in=productos_ids)
+        por_producto = defaultdict(list)
+        for producto_id, categoria_id in categorias.values_list("producto_id", "categoria_id"):
+            por_producto[producto_id].append(categoria_id)
+
+        aportes = defaultdict(lambda: [Decimal("0"), Decimal("0"), 0])
+        filas = stock.values_list("bodega_id", "producto_id", "cantidad", "producto__costo_promedio", "producto__marca_id")
+        for bodega_id, producto_id, cantidad, costo, marca_id in filas:
+            valor = (cantidad * costo).quantize(CENTAVO)  # redondeo por fila, igual en aportes y reconstruir
+            claves = [(bodega_id, cls.Dimension.TOTAL, 0), (bodega_id, cls.Dimension.MARCA, marca_id or 0)]
+            claves += [(bodega_id, cls.Dimension.CATEGORIA, c) for c in por_producto[producto_id] or [0]]
+            for clave in claves:
+                aporte = aportes[clave]
+                aporte[0] += cantidad
+                aporte[1] += valor
+                aporte[2] += cantidad > 0
+        return aportes
+
+    @classmethod
+    def aplicar(cls, antes, despues):
+        # suma (despues - antes) a cada grupo con UPDATE relativo: no pisa a otro posteo concurrente
+        cero = (Decimal("0"), Decimal("0"), 0)
+        diferencias = {}
+        for clave in antes.keys() | despues.keys():
+            d = [a - b for a, b in zip(despues.get(clave, cero), antes.get(clave, cero))]
+            if any(d):
+                diferencias[clave] = d
+        if not diferencias:
+            return
+
+        def ids():
+            filas = cls.objects.filter(
+                bodega_id__in={b for b, _, _ in diferencias}, referencia__in={r for _, _, r in diferencias}
+            ).values_list("bodega_id", "dimension", "referencia", "id")
+            return {(b, d, r): pk for b, d, r, pk in filas if (b, d, r) in diferencias}
+
+        existentes = ids()
+        if len(existentes) < len(diferencias):
+            cls.objects.bulk_create(
+                [cls(bodega_id=b, dimension=d, referencia=r) for b, d, r in diferencias if (b, d, r) not in existentes],
+                ignore_conflicts=True,
+            )
+            existentes = ids()
+        _actualizar_por_id(
+            cls, ("cantidad", "valor", "productos"),
+            [(existentes[k], *d) for k, d in sorted(diferencias.items())], sumar=True,
+        )
+
+    @classmethod
+    @contextmanager
+    def ajustando(cls, productos_ids):
+        """with ResumenInventario.ajustando(ids): <cambia stock, costos, marca o categorías de esos productos>"""
+        antes = cls.aportes(productos_ids)
+        yield
+        cls.aplicar(antes, cls.aportes(productos_ids))
+
+    @classmethod
+    def reconstruir(cls):
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [cls(bodega_id=b, dimension=d, referencia=r, cantidad=c, valor=v, productos=n)
+                 for (b, d, r), (c, v, n) in sorted(cls.aportes().items())],
+                batch_size=1000,
+            )
+
+def stock_a_fecha(bodega_id, fecha):
+    """
+    Stock de la bodega tal como estaba en `fecha`: anota cada fila de Stock con
+    `cantidad_a_fecha` = saldo del último cierre <= fecha más los deltas del
+    kardex entre ese cierre y `fecha` (un rango por producto sobre
+    kardex_bod_prod_fecha_idx; sin cierres, desde el inicio).
+    """
+    decimal = models.DecimalField(max_digits=14, decimal_places=3)
+    cierre = KardexCierre.objects.filter(
+        bodega_id=OuterRef("bodega_id"), producto_id=OuterRef("producto_id"), fecha__lte=fecha
+    ).order_by("-fecha")
+    inicio = Value(datetime(1, 1, 1, tzinfo=UTC), output_field=models.DateTimeField())
+    qs = Stock.objects.filter(bodega_id=bodega_id).annotate(
+        cierre_fecha=Coalesce(Subquery(cierre.values("fecha")[:1]), inicio),
+        cierre_saldo=Coalesce(Subquery(cierre.values("saldo")[:1], output_field=decimal), Value(Decimal("0"), output_field=decimal)),
+    )
+    movido = (
+        Kardex.objects.filter(
+            bodega_id=OuterRef("bodega_id"), producto_id=OuterRef("producto_id"),
+            fecha__gt=OuterRef("cierre_fecha"), fecha__lte=fecha,
+        )
+        .order_by().values("producto_id").annotate(total=Sum("delta")).values("total")
+    )
+    return qs.annotate(
+        cantidad_a_fecha=F("cierre_saldo") + Coalesce(Subquery(movido, output_field=decimal), Value(Decimal("0"), output_field=decimal))
+    )
+
+STOCK_LOTE_UPDATE = 500  # filas por UPDATE (límite de parámetros en SQLite)
+POSTEO_INTENTOS = 5
+POSTEO_ESPERA = 0.02  # segundos; se duplica en cada reintento
+
+REINTENTABLES = ("locked", "deadlock", "could not serialize")  # SQLite / PostgreSQL
+
+contadores_posteo = {"conflictos": 0, "reintentos": 0}
+
+class ConflictoStock(Exception):
+    """Otro proceso modificó filas de Stock entre la lectura y el UPDATE."""
+
+def _lote(items, n):
+    for i in range(0, len(items), n):
+        yield items[i:i + n]
+
+def con_reintentos(funcion, intentos=POSTEO_INTENTOS, espera=POSTEO_ESPERA):
+    """
+    Ejecuta funcion() en su propia transacción y la repite con backoff
+    exponencial (con jitter) si choca con un posteo concurrente: conflicto de
+    versión en Stock, base bloqueada (SQLite) o deadlock (PostgreSQL).
+    """
+    for intento in range(intentos):
+        try:
+            with transaction.atomic():
+                return funcion()
+        except (ConflictoStock, OperationalError) as e:
+            if isinstance(e, OperationalError) and not any(m in str(e) for m in REINTENTABLES):
+                raise
+            contadores_posteo["conflictos"] += 1
+            if intento == intentos - 1:
+                raise
+            contadores_posteo["reintentos"] += 1
+            sleep(espera * 2 ** intento * random.uniform(0.5, 1.5))
+
+def bloquear_stock(claves):
+    """
+    SELECT ... FOR UPDATE de las filas de Stock de esas (bodega, producto), siempre
+    en orden (bodega, producto) para que posteos concurrentes no se crucen.
+    Donde no hay bloqueo de filas (SQLite) manda la versión (ver aplicar_deltas_stock).
+    """
+    if not claves:
+        return {}
+    return {
+        (s.bodega_id, s.producto_id): s
+        for s in Stock.objects.select_for_update()
+        .filter(bodega_id__in={b for b, _ in claves}, producto_id__in={p for _, p in claves})
+        .order_by("bodega_id", "producto_id")
+        .only("id", "bodega_id", "producto_id", "cantidad", "version")
+    }
+
+def aplicar_deltas_stock(deltas, skus=None, existentes=None):
+    """
+    Aplica {(bodega_id, producto_id): delta} sobre Stock en forma set-based:
+    un SELECT ... FOR UPDATE (o las filas ya leídas en `existentes`), un upsert
+    (INSERT ... ON CONFLICT DO NOTHING) en 0 para las filas nuevas y un
+    UPDATE cantidad = cantidad + delta, version = version + 1 condicionado a la
+    versión leída. Si alguna fila cambió entretanto levanta ConflictoStock (ver
+    con_reintentos). Retorna {clave: cantidad_final}.
+    Debe llamarse dentro de una transacción.
+    """
+    deltas = {k: d for k, d in deltas.items() if d}
+    if not deltas:
+        return {}
+    skus = skus or {}
+
+    bodegas_ids = {b for b, _ in deltas}
+    productos_ids = {p for _, p in deltas}
+    if existentes is None:
+        existentes = bloquear_stock(deltas)
+
+    resultado = {}
+    for key in sorted(deltas):
+        disponible = existentes[key].cantidad if key in existentes else Decimal("0")
+        final = disponible + deltas[key]
+        if final < 0:
+            sku = skus.get(key[1]) or Producto.objects.only("sku").get(pk=key[1]).sku
+            raise ValidationError(
+                f"Stock insuficiente para {sku}. Disponible: {disponible}, solicitado: {-deltas[key]}"
+            )
+        resultado[key] = final
+
+    # una fila que no existía se espera en (cantidad 0, versión 0); si otro
+    # proceso la creó primero el upsert no falla y el UPDATE condicional
+    # detecta si alcanzó a moverla
+    versiones = {k: existentes[k].version if k in existentes else 0 for k in deltas}
+    nuevos = sorted(k for k in deltas if k not in existentes)
+    if nuevos:
+        Stock.objects.bulk_create([Stock(bodega_id=b, producto_id=p) for b, p in nuevos], ignore_conflicts=True)
+        existentes = {**bloquear_stock(nuevos), **existentes}
+
+    cambios = [(existentes[k].pk, deltas[k]) for k in sorted(deltas)]
+    actualizadas = _actualizar_por_id(
+        Stock, "cantidad", cambios, sumar=True,
+        versiones={existentes[k].pk: v for k, v in versiones.items()},
+    )
+    if actualizadas != len(cambios):
+        raise ConflictoStock("El stock fue modificado por otro proceso; reintente.")
+
+    AlertaReposicion.actualizar(productos_ids, bodegas_ids)
+    return resultado
+
+def _actualizar_por_id(modelo, campo, valores, sumar=False, versiones=None):
+    """
+    UPDATE campo = [campo +] CASE pk WHEN .. END (+ actualizado_en) por lotes, en
+    SQL directo: armar un Case() con miles de When() en el ORM cuesta más que el
+    propio UPDATE. `valores` es una lista de (pk, Decimal); con varios campos,
+    (pk, valor1, valor2, ...). Con `versiones` ({pk: versión}) solo se tocan las
+    filas que siguen en esa versión y se incrementa. Retorna la cantidad de
+    filas actualizadas.
+
+    La suma se redondea a los decimales del campo: SQLite guarda los decimales
+    como REAL y 0.7 + 0.1 quedaría en 0.7999999999999999, que una salida de 0.8
+    deja bajo cero en el CHECK de la base.
+    """
+    qn = connection.ops.quote_name
+    opts = modelo._meta
+    tabla, pk, actualizado_en = qn(opts.db_table), qn(opts.pk.column), qn(opts.get_field("actualizado_en").column)
+    campos = [opts.get_field(c) for c in ([campo] if isinstance(campo, str) else campo)]
+    columnas = [qn(f.column) for f in campos]
+    decimales = [getattr(f, "decimal_places", None) for f in campos]
+    ahora = connection.ops.adapt_datetimefield_value(timezone.now())
+    actualizadas = 0
+    with connection.cursor() as cursor:
+        for lote in _lote(valores, STOCK_LOTE_UPDATE):
+            casos = " ".join(["WHEN %s THEN CAST(%s AS NUMERIC)"] * len(lote))
+            asignaciones = ", ".join(
+                f"{c} = ROUND({c} + CASE {pk} {casos} END, {d})" if sumar and d is not None
+                else f"{c} = {c + ' + ' if sumar else ''}CASE {pk} {casos} END"
+                for c, d in zip(columnas, decimales)
+            )
+            ids = ", ".join(["%s"] * len(lote))
+            params = [v for i in range(len(columnas)) for fila in lote for v in (fila[0], str(fila[i + 1]))]
+            params += [ahora] + [fila[0] for fila in lote]
+            version, condicion = "", ""
+            if versiones is not None:
+                col = qn(opts.get_field("version").column)
+                version = f", {col} = {col} + 1"
+                condicion = f" AND {col} = CASE {pk} {' '.join(['WHEN %s THEN %s'] * len(lote))} END"
+                params += [v for fila in lote for v in (fila[0], versiones[fila[0]])]
+            sql = f"UPDATE {tabla} SET {asignaciones}, {actualizado_en} = %s{version} WHERE {pk} IN ({ids}){condicion}"
+            cursor.execute(sql, params)
+            actualizadas += cursor.rowcount
+    return actualizadas
+
+
 class BaseMovimiento(TimeStampedModel):
     class Estado(models.TextChoices):
         BORRADOR = "BORRADOR", "Borrador"
@@ -153,80 +843,96 @@ class BaseMovimiento(TimeStampedModel):
     class Meta:
         abstract = True
         ordering = ["-fecha", "-id"]
+        indexes = [
+            models.Index(fields=["-fecha", "-id"], name="%(class)s_fecha_idx"),  # paginación keyset
+            models.Index(fields=["bodega", "estado", "-fecha", "-id"], name="%(class)s_bodega_idx"),  # ?bodega=&estado=&fecha_desde=
+            models.Index(fields=["referencia"], name="%(class)s_ref_idx"),
+        ]
 
     def clean(self):
         if not self.bodega_id:
             raise ValidationError("Debe seleccionar una bodega.")
 
-    def _lineas(self):
-        return list(self.lineas.all())
+    def postear(self):
+        error = con_reintentos(lambda: postear_documentos([self]))[self]
+        if error:
+            raise ValidationError(error)
 
-    def _validar_lineas(self):
-        lineas = self._lineas()
+    def _validar_posteo(self, lineas):
+        if self.estado != self.Estado.BORRADOR:
+            raise ValidationError("Solo se pueden postear movimientos en BORRADOR.")
         if not lineas:
             raise ValidationError("No puedes postear un movimiento sin líneas.")
         for l in lineas:
             if l.cantidad <= 0:
                 raise ValidationError("Todas las líneas deben tener cantidad > 0.")
-        return lineas
 
-    def _get_or_create_stock_map(self, productos_ids):
-        stocks = Stock.objects.select_for_update().filter(bodega_id=self.bodega_id, producto_id__in=productos_ids)
-        return {(s.bodega_id, s.producto_id): s for s in stocks}  # mapa stock
-
-    def _get_or_create_stock(self, stock_map, producto_id):
-        key = (self.bodega_id, producto_id)
-        if key in stock_map:
-            return stock_map[key]
-        s = Stock.objects.create(bodega_id=self.bodega_id, producto_id=producto_id, cantidad=0)
-        stock_map[key] = s
-        return s
+    def _deltas(self, lineas):
+        # agrupa las líneas por producto -> {(bodega, producto): delta con signo}
+        deltas = defaultdict(Decimal)
+        for l in lineas:
+            deltas[(self.bodega_id, l.producto_id)] += self.signo * l.cantidad
+        return deltas
 
 class MovimientoEntrada(BaseMovimiento):
     proveedor = models.ForeignKey(Proveedor, on_delete=models.PROTECT, null=True, blank=True, related_name="entradas")  # proveedor opcional
 
-    @transaction.atomic
-    def postear(self):
-        if self.estado != self.Estado.BORRADOR:
-            raise ValidationError("Solo se pueden postear movimientos en BORRADOR.")
-
-        lineas = self._validar_lineas()
-        productos_ids = [l.producto_id for l in lineas]
-        stock_map = self._get_or_create_stock_map(productos_ids)
-
-        for l in lineas:
-            st = self._get_or_create_stock(stock_map, l.producto_id)
-            st.cantidad += l.cantidad
-            st.save()
+    class Meta(BaseMovimiento.Meta):
+        indexes = [
+            *BaseMovimiento.Meta.indexes,
+            models.Index(fields=["proveedor", "-fecha", "-id"], name="movimientoentrada_prov_idx"),
+        ]
 
-        self.estado = self.Estado.POSTEADO
-        self.posteado_en = timezone.now()
-        self.save()
+    signo = 1
+    tipo_kardex = Kardex.Tipo.ENTRADA
+    linea_fk = "movimiento_entrada"
 
 class MovimientoSalida(BaseMovimiento):
     destino = models.CharField(max_length=120, blank=True, default="")
 
-    @transaction.atomic
-    def postear(self):
-        if self.estado != self.Estado.BORRADOR:
-            raise ValidationError("Solo se pueden postear movimientos en BORRADOR.")
+    signo = -1
+    tipo_kardex = Kardex.Tipo.SALIDA
+    linea_fk = "movimiento_salida"
 
-        lineas = self._validar_lineas()
-        productos_ids = [l.producto_id for l in lineas]
-        stock_map = self._get_or_create_stock_map(productos_ids)
+class MovimientoTransferencia(BaseMovimiento):
+    """
+    Traslado entre bodegas en un solo documento: bodega = origen. Al postear
+    sale de origen y entra en destino en la misma transacción (un solo bloqueo
+    de Stock y dos filas de kardex por producto); los lotes pasan con su
+    vencimiento y las líneas sin lote se reparten FEFO como en una salida.
+    """
+    bodega_destino = models.ForeignKey(Bodega, on_delete=models.PROTECT, related_name="transferencias_recibidas")
 
-        for l in lineas:
-            st = self._get_or_create_stock(stock_map, l.producto_id)
-            if st.cantidad < l.cantidad:
-                raise ValidationError(
-                    f"Stock insuficiente para {l.producto.sku}. Disponible: {st.cantidad}, solicitado: {l.cantidad}"
-                )
-            st.cantidad -= l.cantidad
-            st.save()
+    signo = -1  # descuenta del origen: se simula después de las entradas de la misma fecha
+    tipo_kardex = Kardex.Tipo.TRANSFERENCIA
+    linea_fk = "movimiento_transferencia"
+
+    class Meta(BaseMovimiento.Meta):
+        # nombres explícitos: "movimientotransferencia_..." pasa el límite de 30 caracteres
+        indexes = [
+            models.Index(fields=["-fecha", "-id"], name="transferencia_fecha_idx"),  # paginación keyset
+            models.Index(fields=["bodega", "estado", "-fecha", "-id"], name="transferencia_bodega_idx"),
+            models.Index(fields=["bodega_destino", "estado", "-fecha", "-id"], name="transferencia_destino_idx"),
+            models.Index(fields=["referencia"], name="transferencia_ref_idx"),
+        ]
+
+    def clean(self):
+        super().clean()
+        if not self.bodega_destino_id:
+            raise ValidationError("Debe seleccionar la bodega de destino.")
+        if self.bodega_destino_id == self.bodega_id:
+            raise ValidationError("La bodega de destino debe ser distinta de la de origen.")
+
+    def _validar_posteo(self, lineas):
+        super()._validar_posteo(lineas)
+        self.clean()
 
-        self.estado = self.Estado.POSTEADO
-        self.posteado_en = timezone.now()
-        self.save()
+    def _deltas(self, lineas):
+        deltas = defaultdict(Decimal)
+        for l in lineas:
+            deltas[(self.bodega_id, l.producto_id)] -= l.cantidad
+            deltas[(self.bodega_destino_id, l.producto_id)] += l.cantidad
+        return deltas
 
 class MovimientoLinea(TimeStampedModel):
     movimiento_entrada = models.ForeignKey(
@@ -235,6 +941,9 @@ class MovimientoLinea(TimeStampedModel):
     movimiento_salida = models.ForeignKey(
         MovimientoSalida, on_delete=models.CASCADE, related_name="lineas", null=True, blank=True
     )
+    movimiento_transferencia = models.ForeignKey(
+        MovimientoTransferencia, on_delete=models.CASCADE, related_name="lineas", null=True, blank=True
+    )
 
     producto = models.ForeignKey(Producto, on_delete=models.PROTECT, related_name="lineas_movimiento")
     cantidad = models.DecimalField(max_digits=14, decimal_places=3)
@@ -248,14 +957,18 @@ class MovimientoLinea(TimeStampedModel):
         constraints = [
             models.CheckConstraint(
                 condition=(
-                    (Q(movimiento_entrada__isnull=False) & Q(movimiento_salida__isnull=True)) |
-                    (Q(movimiento_entrada__isnull=True) & Q(movimiento_salida__isnull=False))
+                    (Q(movimiento_entrada__isnull=False) & Q(movimiento_salida__isnull=True) & Q(movimiento_transferencia__isnull=True)) |
+                    (Q(movimiento_entrada__isnull=True) & Q(movimiento_salida__isnull=False) & Q(movimiento_transferencia__isnull=True)) |
+                    (Q(movimiento_entrada__isnull=True) & Q(movimiento_salida__isnull=True) & Q(movimiento_transferencia__isnull=False))
                 ),
-                name="linea_xor_entrada_salida"
+                name="linea_un_movimiento"
             )
         ]
         indexes = [
-            models.Index(fields=["producto"]),
+            # ?producto= en los movimientos: ids de documento sin leer la tabla
+            models.Index(fields=["producto", "movimiento_entrada"], name="linea_producto_entrada_idx"),
+            models.Index(fields=["producto", "movimiento_salida"], name="linea_producto_salida_idx"),
+            models.Index(fields=["producto", "movimiento_transferencia"], name="linea_producto_transf_idx"),
         ]
 
     def __str__(self):
@@ -268,3 +981,310 @@ class MovimientoLinea(TimeStampedModel):
         if self.producto_id and not self.producto.permite_fraccion:
             if self.cantidad != self.cantidad.to_integral_value():
                 raise ValidationError(f"El producto {self.producto.sku} no permite fracciones.")
+
+
+# =========================
+# Posteo
+# =========================
+
+MOVIMIENTOS = (MovimientoEntrada, MovimientoSalida, MovimientoTransferencia)
+
+def _lineas_por_documento(documentos):
+    # un query por tipo de movimiento, con el producto (sku para los mensajes)
+    lineas = {doc: [] for doc in documentos}
+    for modelo in MOVIMIENTOS:
+        docs = {d.pk: d for d in documentos if isinstance(d, modelo)}
+        if not docs:
+            continue
+        fk = f"{modelo.linea_fk}_id"
+        for l in MovimientoLinea.objects.filter(**{f"{fk}__in": list(docs)}).select_related("producto"):
+            lineas[docs[getattr(l, fk)]].append(l)
+    return lineas
+
+class _CostoPromedio:
+    """
+    Costo promedio ponderado (sobre el stock de todas las bodegas) y
+    costo_ultima_compra del proveedor, calculados en memoria mientras se simulan
+    los documentos y escritos en bloque al final. Líneas con costo 0 se valorizan
+    al promedio vigente.
+    """
+
+    def __init__(self, productos_ids):
+        self.promedios = dict(Producto.objects.filter(pk__in=productos_ids).values_list("id", "costo_promedio"))
+        self.originales = dict(self.promedios)
+        self.totales = defaultdict(Decimal, (
+            Stock.objects.filter(producto_id__in=productos_ids)
+            .values("producto_id").annotate(total=Sum("cantidad")).values_list("producto_id", "total")
+        ))
+        self.ultimas = defaultdict(dict)  # proveedor -> {producto: costo}
+
+    def aplicar(self, doc, lineas):
+        if isinstance(doc, MovimientoTransferencia):
+            return  # no cambia el stock total del producto
+        if doc.signo < 0:
+            for l in lineas:
+                if l.producto_id in self.promedios:
+                    self.totales[l.producto_id] -= l.cantidad
+            return
+
+        entrada = defaultdict(lambda: [Decimal("0"), Decimal("0")])  # producto -> [cantidad, valor]
+        for l in lineas:
+            costo = l.costo_unitario if l.costo_unitario > 0 else self.promedios[l.producto_id]
+            entrada[l.producto_id][0] += l.cantidad
+            entrada[l.producto_id][1] += l.cantidad * costo
+            if l.costo_unitario > 0 and doc.proveedor_id:
+                self.ultimas[doc.proveedor_id][l.producto_id] = l.costo_unitario
+
+        for producto_id, (cantidad, valor) in entrada.items():
+            anterior = max(self.totales[producto_id], Decimal("0"))
+            promedio = (anterior * self.promedios[producto_id] + valor) / (anterior + cantidad)
+            self.promedios[producto_id] = promedio.quantize(CENTAVO)
+            self.totales[producto_id] = anterior + cantidad
+
+    def guardar(self):
+        cambios = [(p, c) for p, c in self.promedios.items() if c != self.originales[p]]
+        if cambios:
+            _actualizar_por_id(Producto, "costo_promedio", cambios)
+        for proveedor in Proveedor.objects.filter(pk__in=self.ultimas):
+            proveedor.registrar_ultima_compra(self.ultimas[proveedor.pk])
+
+class _Lotes:
+    """
+    Saldos por lote de las (bodega, producto) del posteo, leídos en un solo
+    query después de bloquear Stock y movidos en memoria mientras se simulan
+    los documentos. Las líneas de salida con lote descuentan de ese lote; las
+    sin lote se reparten FEFO y al guardar la línea se divide en una por lote:
+    la línea original conserva su id con el primer lote (y la cantidad de ese
+    lote) y cada lote adicional es una línea nueva con el mismo costo y
+    observación. El total del documento no cambia, pero un cliente que guardó
+    los ids de las líneas antes de postear debe releerlas (el documento
+    posteado ya no se puede editar). Las líneas son el registro de qué lote
+    salió, sin tabla de asignación aparte: la exportación y
+    StockLote.reconstruir() las leen tal cual.
+    """
+
+    def __init__(self, claves):
+        self.saldos, self.vencimientos, self.ids = {}, {}, {}
+        self.lotes = defaultdict(set)  # (bodega, producto) -> nombres de lote
+        if claves:
+            filas = StockLote.objects.filter(
+                bodega_id__in={b for b, _ in claves}, producto_id__in={p for _, p in claves}
+            ).values_list("id", "bodega_id", "producto_id", "lote", "cantidad", "vencimiento")
+            for pk, b, p, lote, cantidad, vencimiento in filas:
+                if (b, p) in claves:
+                    self._registrar((b, p, lote), cantidad, vencimiento)
+                    self.ids[(b, p, lote)] = pk
+        self.deltas = defaultdict(Decimal)
+        self.completar = {}  # lotes existentes sin vencimiento que una entrada informa
+        self.repartos = []  # (bodega, línea de salida, [(lote, cantidad)])
+
+    def _registrar(self, clave, cantidad, vencimiento):
+        self.saldos[clave] = cantidad
+        self.vencimientos[clave] = vencimiento
+        self.lotes[clave[:2]].add(clave[2])
+
+    def _fefo(self, bodega_id, producto_id):
+        claves = [(bodega_id, producto_id, lote) for lote in self.lotes[(bodega_id, producto_id)]]
+        return sorted(claves, key=lambda k: StockLote.orden_fefo(k[2], self.vencimientos[k]))
+
+    def aplicar(self, doc, lineas):
+        """Mueve los lotes del documento o levanta ValidationError sin tocar nada."""
+        movs, vencimientos, repartos = defaultdict(Decimal), {}, []
+        if doc.signo > 0:
+            for l in lineas:
+                clave = (doc.bodega_id, l.producto_id, l.lote)
+                movs[clave] += l.cantidad
+                if l.vencimiento and not self.vencimientos.get(clave) and clave not in vencimientos:
+                    vencimientos[clave] = l.vencimiento
+        else:
+            # primero las líneas con lote indicado; el resto toma FEFO lo que queda
+            for l in sorted(lineas, key=lambda l: l.lote == ""):
+                if l.lote:
+                    clave = (doc.bodega_id, l.producto_id, l.lote)
+                    disponible = self.saldos.get(clave, Decimal("0")) + movs[clave]
+                    if disponible < l.cantidad:
+                        raise ValidationError(
+                            f"Stock insuficiente en el lote {l.lote} de {l.producto.sku}. "
+                            f"Disponible: {disponible}, solicitado: {l.cantidad}"
+                        )
+                    movs[clave] -= l.cantidad
+                    repartos.append((doc.bodega_id, l, [(l.lote, l.cantidad)]))
+                    continue
+                pendiente, partes = l.cantidad, []
+                for clave in self._fefo(doc.bodega_id, l.producto_id):
+                    tomado = min(self.saldos[clave] + movs[clave], pendiente)
+                    if tomado > 0:
+                        movs[clave] -= tomado
+                        partes.append((clave[2], tomado))
+                        pendiente -= tomado
+                    if not pendiente:
+                        break
+                if pendiente:
+                    raise ValidationError(f"Los lotes de {l.producto.sku} no cubren la salida; ejecute recalcular_lotes.")
+                repartos.append((doc.bodega_id, l, partes))
+
+        if isinstance(doc, MovimientoTransferencia):
+            # el destino recibe los mismos lotes que salieron del origen, con su vencimiento
+            for bodega_id, l, partes in repartos:
+                for lote, cantidad in partes:
+                    clave = (doc.bodega_destino_id, l.producto_id, lote)
+                    movs[clave] += cantidad
+                    vencimiento = self.vencimientos.get((bodega_id, l.producto_id, lote))
+                    if vencimiento and not self.vencimientos.get(clave) and clave not in vencimientos:
+                        vencimientos[clave] = vencimiento
+
+        for clave, d in movs.items():
+            if clave not in self.saldos:
+                self._registrar(clave, Decimal("0"), vencimientos.get(clave))
+            elif clave in vencimientos:
+                self.vencimientos[clave] = vencimientos[clave]
+                if clave in self.ids:
+                    self.completar[clave] = vencimientos[clave]
+            self.saldos[clave] += d
+            self.deltas[clave] += d
+        self.repartos += repartos
+
+    def guardar(self):
+        # se llama después de aplicar_deltas_stock: con Stock ya actualizado (o ConflictoStock)
+        # nadie más mueve los lotes de estas (bodega, producto) en esta transacción
+        nuevos = [(k, d) for k, d in sorted(self.deltas.items()) if k not in self.ids]
+        if nuevos:
+            StockLote.objects.bulk_create([
+                StockLote(bodega_id=b, producto_id=p, lote=lote, vencimiento=self.vencimientos[(b, p, lote)], cantidad=d)
+                for (b, p, lote), d in nuevos
+            ])
+        cambios = [(self.ids[k], d) for k, d in sorted(self.deltas.items()) if d and k in self.ids]
+        if cambios:
+            _actualizar_por_id(StockLote, "cantidad", cambios, sumar=True)
+        por_fecha = defaultdict(list)
+        for clave, vencimiento in self.completar.items():
+            por_fecha[vencimiento].append(self.ids[clave])
+        for vencimiento, ids in por_fecha.items():
+            StockLote.objects.filter(pk__in=ids, vencimiento__isnull=True).update(vencimiento=vencimiento)
+
+        # las líneas de salida y transferencia quedan con el lote (y vencimiento) del que salieron
+        por_lote, recortadas, agregadas = defaultdict(list), [], []
+        for bodega_id, l, partes in self.repartos:
+            clave = (bodega_id, l.producto_id)
+            (lote, cantidad), resto = partes[0], partes[1:]
+            vencimiento = l.vencimiento or self.vencimientos[(*clave, lote)]
+            if (l.lote, l.vencimiento) != (lote, vencimiento):
+                l.lote, l.vencimiento = lote, vencimiento
+                por_lote[(lote, vencimiento)].append(l.pk)
+            if l.cantidad != cantidad:
+                l.cantidad = cantidad
+                recortadas.append((l.pk, cantidad))
+            agregadas += [
+                MovimientoLinea(
+                    movimiento_salida_id=l.movimiento_salida_id, movimiento_transferencia_id=l.movimiento_transferencia_id,
+                    producto_id=l.producto_id, cantidad=c,
+                    costo_unitario=l.costo_unitario, lote=lote, vencimiento=self.vencimientos[(*clave, lote)],
+                    observacion=l.observacion,
+                )
+                for lote, c in resto
+            ]
+        # un UPDATE por (lote, vencimiento): con miles de líneas el CASE por fila de bulk_update cuesta segundos
+        for (lote, vencimiento), ids in por_lote.items():
+            for ids_lote in _lote(ids, STOCK_LOTE_UPDATE):
+                MovimientoLinea.objects.filter(pk__in=ids_lote).update(lote=lote, vencimiento=vencimiento)
+        if recortadas:
+            _actualizar_por_id(MovimientoLinea, "cantidad", recortadas)
+        if agregadas:
+            MovimientoLinea.objects.bulk_create(agregadas)
+
+def _ajustar_cierres(kardex):
+    # un movimiento con fecha anterior a un cierre ya hecho entra en ese cierre y los siguientes
+    claves = {(k.bodega_id, k.producto_id) for k in kardex}
+    ultimos = {
+        (b, p): f for b, p, f in KardexCierre.objects.filter(
+            bodega_id__in={b for b, _ in claves}, producto_id__in={p for _, p in claves}
+        ).order_by().values("bodega_id", "producto_id").annotate(f=Max("fecha")).values_list("bodega_id", "producto_id", "f")
+    }
+    for k in kardex:
+        clave = (k.bodega_id, k.producto_id)
+        if clave in ultimos and k.fecha <= ultimos[clave]:
+            KardexCierre.objects.filter(bodega_id=k.bodega_id, producto_id=k.producto_id, fecha__gte=k.fecha).update(
+                saldo=F("saldo") + k.delta
+            )
+
+def postear_documentos(documentos):
+    """
+    Postea entradas, salidas y transferencias en una sola pasada set-based:
+    carga las líneas (un query por tipo), bloquea una sola vez todas las filas
+    de Stock afectadas (las dos bodegas de cada transferencia) en orden fijo,
+    simula los documentos por fecha (entradas antes que salidas)
+    para decidir cuáles se pueden postear (incluida la asignación FEFO de
+    lotes), y escribe el neto por (bodega, producto) y por lote, el kardex, los
+    costos y los estados en bloque.
+
+    Retorna {documento: None | mensaje de error}; los rechazados no se tocan.
+    Debe llamarse dentro de una transacción.
+    """
+    resultados = {doc: None for doc in documentos}
+    lineas = _lineas_por_documento(documentos)
+
+    candidatos = []
+    for doc in documentos:
+        try:
+            doc._validar_posteo(lineas[doc])
+        except ValidationError as e:
+            resultados[doc] = e.messages[0]
+        else:
+            candidatos.append(doc)
+    candidatos.sort(key=lambda d: (d.fecha, d.signo < 0, d.pk))
+
+    deltas_doc = {d: d._deltas(lineas[d]) for d in candidatos}
+    claves = {k for deltas in deltas_doc.values() for k in deltas}
+    existentes = bloquear_stock(claves)
+    saldos = {k: existentes[k].cantidad if k in existentes else Decimal("0") for k in claves}
+    costos = _CostoPromedio({l.producto_id for d in candidatos if d.signo > 0 for l in lineas[d]})
+    lotes = _Lotes(claves)
+
+    ahora = timezone.now()
+    netos, kardex, posteados = defaultdict(Decimal), [], []
+    for doc in candidatos:
+        deltas = deltas_doc[doc]
+        faltante = next((k for k in sorted(deltas) if saldos[k] + deltas[k] < 0), None)
+        if faltante:
+            sku = next(l.producto.sku for l in lineas[doc] if l.producto_id == faltante[1])
+            resultados[doc] = (
+                f"Stock insuficiente para {sku}. Disponible: {saldos[faltante]}, solicitado: {-deltas[faltante]}"
+            )
+            continue
+        try:
+            lotes.aplicar(doc, lineas[doc])
+        except ValidationError as e:
+            resultados[doc] = e.messages[0]
+            continue
+
+        for (b, p), d in sorted(deltas.items()):
+            saldos[(b, p)] += d
+            netos[(b, p)] += d
+            kardex.append(Kardex(bodega_id=b, producto_id=p, delta=d, saldo=saldos[(b, p)],
+                                 fecha=doc.fecha, tipo=doc.tipo_kardex, movimiento_id=doc.pk))
+        costos.aplicar(doc, lineas[doc])
+        posteados.append(doc)
+
+    if not posteados:
+        return resultados
+
+    with ResumenInventario.ajustando(list({p for _, p in netos} | set(costos.promedios))):
+        aplicar_deltas_stock(netos, existentes=existentes)
+        costos.guardar()
+    lotes.guardar()
+    Kardex.objects.bulk_create(kardex)
+    _ajustar_cierres(kardex)
+
+    for modelo in MOVIMIENTOS:
+        ids = [d.pk for d in posteados if isinstance(d, modelo)]
+        if not ids:
+            continue
+        marcados = modelo.objects.filter(pk__in=ids, estado=BaseMovimiento.Estado.BORRADOR).update(
+            estado=BaseMovimiento.Estado.POSTEADO, posteado_en=ahora, actualizado_en=ahora,
+        )
+        if marcados != len(ids):
+            raise ValidationError("Otro proceso posteó alguno de estos movimientos; reintente.")
+    for doc in posteados:
+        doc.estado = BaseMovimiento.Estado.POSTEADO
+        doc.posteado_en = ahora
+    return resultados
@@ -0,0 +1,61 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class PaginacionNumerada(PageNumberPagination):
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class PaginacionCursor(CursorPagination):
+    """
+    Paginación keyset por defecto: el cursor avanza sobre el `ordering` de la
+    vista o el Meta.ordering del modelo (ej: -fecha, -id), así que la página
+    1000 cuesta lo mismo que la primera. Con ?page=N se usa paginación
+    numerada (UI tipo admin).
+    """
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, "ordering", None)
+        # el cursor codifica la posición como texto (un None vuelve como "None"): del Meta.ordering
+        # no se usa una primera columna nula; un ordering explícito de la vista debe excluir los nulos
+        nulos = not ordering
+        ordering = ordering or queryset.model._meta.ordering
+        if isinstance(ordering, str):
+            ordering = [ordering]
+        ordering = [o for o in ordering if isinstance(o, str)]
+
+        # el cursor solo puede posicionarse sobre una columna propia del modelo
+        if not ordering or "__" in ordering[0] or (nulos and self._nullable(queryset.model, ordering[0].lstrip("-"))):
+            ordering = ["-id"] if ordering and ordering[0].startswith("-") else ["id"]
+        if not any(o.lstrip("-") in ("id", "pk") for o in ordering):
+            ordering.append("-id" if ordering[0].startswith("-") else "id")  # desempate estable
+        return tuple(ordering)
+
+    @staticmethod
+    def _nullable(model, campo):
+        try:
+            return model._meta.get_field(campo).null
+        except FieldDoesNotExist:
+            return False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.numerada = None
+        if PaginacionNumerada.page_query_param in request.query_params:
+            self.numerada = PaginacionNumerada()
+            if not queryset.ordered:
+                queryset = queryset.order_by(*self.get_ordering(request, queryset, view))
+            return self.numerada.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.numerada is not None:
+            return self.numerada.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.numerada is not None:
+            return self.numerada.to_html()
+        return super().to_html()
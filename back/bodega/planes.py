@@ -0,0 +1,129 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+class Plan:
+    """
+    Qué necesita cargar un serializer, derivado de sus campos:
+
+    - source="producto.sku"                  -> select_related("producto") + only("producto__sku")
+    - serializer anidado many=True (lineas)  -> Prefetch("lineas", queryset con su propio plan)
+    - PrimaryKeyRelatedField many=True       -> prefetch_related de la relación (solo ids)
+    - el resto de los campos del modelo      -> only()
+
+    Si el serializer lee algo que no es columna (SerializerMethodField,
+    properties, anotaciones que el queryset no trae) no se aplica only().
+    """
+
+    def __init__(self):
+        self.select = set()
+        self.prefetch = {}  # ruta -> Prefetch
+        self.only = set()
+        self.fuera_del_modelo = set()
+
+    def aplicar(self, qs):
+        if self.select:
+            qs = qs.select_related(*sorted(self.select))
+        if self.prefetch:
+            qs = qs.prefetch_related(*self.prefetch.values())
+        if self.only and self.fuera_del_modelo <= set(qs.query.annotations) and _select_previo(qs) <= self.select:
+            qs = qs.only(*sorted(self.only))
+        return qs
+
+
+def _select_previo(qs):
+    # rutas de select_related que ya traía el queryset (only() no puede diferirlas)
+    rutas, pendientes = set(), [("", qs.query.select_related)]
+    while pendientes:
+        prefijo, arbol = pendientes.pop()
+        if arbol is True:
+            return {"*"}
+        for nombre, hijos in (arbol or {}).items():
+            rutas.add(prefijo + nombre)
+            pendientes.append((prefijo + nombre + "__", hijos))
+    return rutas
+
+
+def _campo(modelo, nombre):
+    try:
+        return modelo._meta.get_field(nombre)
+    except FieldDoesNotExist:
+        return None
+
+
+def _recorrer(plan, serializer, modelo, prefijo=""):
+    for campo in serializer.fields.values():
+        if campo.write_only:
+            continue
+        if campo.source == "*":
+            plan.fuera_del_modelo.add("*")
+            continue
+
+        nombre = campo.source_attrs[0]
+        relacion = _campo(modelo, nombre)
+        if isinstance(campo, serializers.ListSerializer) and isinstance(campo.child, serializers.Serializer):
+            if relacion is None or not (relacion.one_to_many or relacion.many_to_many):
+                plan.fuera_del_modelo.add(prefijo + nombre)
+                continue
+            hijo = Plan()
+            _recorrer(hijo, campo.child, relacion.related_model)
+            if relacion.one_to_many:
+                hijo.only.add(relacion.field.name)  # FK de vuelta: el prefetch agrupa por ella
+            plan.prefetch[prefijo + nombre] = Prefetch(prefijo + nombre, queryset=hijo.aplicar(relacion.related_model._default_manager.all()))
+        elif isinstance(campo, serializers.ManyRelatedField):
+            if relacion is not None and (relacion.one_to_many or relacion.many_to_many):
+                # si también hay un serializer anidado sobre la relación, su prefetch sirve para ambos
+                plan.prefetch.setdefault(prefijo + nombre, Prefetch(
+                    prefijo + nombre, queryset=relacion.related_model._default_manager.only("pk"),
+                ))
+            else:
+                plan.fuera_del_modelo.add(prefijo + nombre)
+        elif isinstance(campo, serializers.Serializer):
+            if relacion is not None and (relacion.many_to_one or relacion.one_to_one) and relacion.concrete:
+                plan.select.add(prefijo + relacion.name)
+                plan.only.add(prefijo + relacion.name)
+                _recorrer(plan, campo, relacion.related_model, f"{prefijo}{relacion.name}__")
+            else:
+                plan.fuera_del_modelo.add(prefijo + nombre)
+        else:
+            _columna(plan, modelo, campo.source_attrs, prefijo)
+
+
+def _columna(plan, modelo, atributos, prefijo):
+    # producto.sku: cada paso intermedio tiene que ser una FK hacia adelante
+    for nombre in atributos[:-1]:
+        relacion = _campo(modelo, nombre)
+        if relacion is None or not (relacion.many_to_one or relacion.one_to_one) or not relacion.concrete:
+            plan.fuera_del_modelo.add(prefijo + nombre)
+            return
+        prefijo += relacion.name
+        plan.select.add(prefijo)
+        plan.only.add(prefijo)
+        prefijo += "__"
+        modelo = relacion.related_model
+    campo = _campo(modelo, atributos[-1])
+    if campo is not None and campo.concrete:
+        plan.only.add(prefijo + campo.name)  # marca_id -> marca
+    else:
+        plan.fuera_del_modelo.add(prefijo + atributos[-1])
+
+
+def plan_de(serializer, modelo=None):
+    plan = Plan()
+    _recorrer(plan, serializer, modelo or serializer.Meta.model)
+    return plan
+
+
+def aplicar(qs, serializer, ordering=()):
+    """
+    qs con el select_related / prefetch_related / only() que pide el serializer.
+    ordering: campos que además lee la paginación por cursor.
+    """
+    plan = plan_de(serializer, qs.model)
+    for orden in ordering:
+        if isinstance(orden, str) and "__" not in orden:
+            campo = _campo(qs.model, orden.lstrip("-"))
+            if campo is not None and campo.concrete:
+                plan.only.add(campo.name)
+    return plan.aplicar(qs)
@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa el JSONRenderer de DRF
+    orjson = None
+
+
+def _filas(data):
+    # listas (paginadas o no) -> filas; cualquier otro dict -> una fila
+    if isinstance(data, dict) and isinstance(data.get("results"), list):
+        data = data["results"]
+    if isinstance(data, dict):
+        data = [data]
+    return data or []
+
+
+class JSONRapidoRenderer(JSONRenderer):
+    """
+    JSONRenderer con orjson si está instalado, con la misma salida que el de
+    DRF (compacta, UTF-8, U+2028/U+2029 escapados; fechas y decimales sueltos
+    pasan por el mismo encoder). Con ?indent / ensure_ascii o si orjson no
+    puede serializar algo, se usa el de DRF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except (orjson.JSONEncodeError, TypeError):
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
+
+
+class CSVRenderer(BaseRenderer):
+    """Render simple para ?format=csv; los listados grandes se exportan en streaming (ver ExportacionMixin)."""
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        filas = _filas(data)
+        buffer = io.StringIO()
+        if filas:
+            writer = csv.DictWriter(buffer, fieldnames=list(filas[0].keys()), extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(filas)
+        return buffer.getvalue().encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        lineas = (json.dumps(f, cls=DjangoJSONEncoder, ensure_ascii=False) for f in _filas(data))
+        return "".join(l + "\n" for l in lineas).encode(self.charset)
+
+
+class _Eco:
+    # pseudo-archivo para csv.writer: devuelve lo escrito en vez de guardarlo
+    def write(self, valor):
+        return valor
+
+
+def _valor(v):
+    # mismo formato que la API JSON: decimales como texto y fechas ISO en hora local
+    if isinstance(v, datetime):
+        return timezone.localtime(v).isoformat()
+    if isinstance(v, date):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return str(v)
+    return v
+
+
+def stream_csv(columnas, filas, lote=500):
+    writer = csv.writer(_Eco())
+    yield writer.writerow(columnas)
+    bloque = []
+    for fila in filas:
+        bloque.append(writer.writerow([_valor(v) for v in fila]))
+        if len(bloque) >= lote:
+            yield "".join(bloque)
+            bloque = []
+    if bloque:
+        yield "".join(bloque)
+
+
+def stream_ndjson(columnas, filas, lote=500):
+    bloque = []
+    for fila in filas:
+        bloque.append(json.dumps(dict(zip(columnas, map(_valor, fila))), ensure_ascii=False) + "\n")
+        if len(bloque) >= lote:
+            yield "".join(bloque)
+            bloque = []
+    if bloque:
+        yield "".join(bloque)
@@ -1,23 +1,266 @@
-from rest_framework import serializers
-from django.db import transaction
+from collections import defaultdict
+import decimal
+from decimal import Decimal
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models, transaction
+from django.utils import timezone
 from .models import *
+from .cache import referencia
 
-class CategoriaSerializer(serializers.ModelSerializer):
+class NombreReferenciaField(serializers.ReadOnlyField):
+    """Nombre de Marca/UnidadMedida/Categoria/Bodega desde la cache de referencia (sin join)."""
+
+    def __init__(self, modelo, **kwargs):
+        self.modelo = modelo
+        super().__init__(**kwargs)
+
+    def to_representation(self, pk):
+        return referencia(self.modelo).get(pk)
+
+def _lista(valor):
+    return [v.strip() for v in (valor or "").split(",") if v.strip()]
+
+class CamposDinamicosMixin:
+    """
+    Lecturas con ?fields=id,sku,nombre (solo esos campos) y ?expand=categorias
+    (los anidados de Meta.expandibles, que con ?fields se omiten salvo que se
+    pidan). Solo aplica al serializer raíz; PlanConsultaMixin arma el queryset
+    con los campos que quedan, así que lo omitido tampoco se consulta.
+    """
+
+    def get_fields(self):
+        campos = super().get_fields()
+        request = self.context.get("request")
+        raiz = self.parent is None or (isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is None)
+        if request is None or not raiz or request.method not in SAFE_METHODS:
+            return campos
+
+        pedidos = _lista(request.query_params.get("fields"))
+        expandir = _lista(request.query_params.get("expand"))
+        expandibles = getattr(self.Meta, "expandibles", {})
+        desconocidos = [c for c in pedidos if c not in campos]
+        if desconocidos:
+            raise serializers.ValidationError({"fields": f"Campos desconocidos: {', '.join(desconocidos)}."})
+        desconocidos = [e for e in expandir if e not in expandibles]
+        if desconocidos:
+            raise serializers.ValidationError({"expand": f"No se puede expandir: {', '.join(desconocidos)}."})
+        if not pedidos:
+            return campos
+        visibles = set(pedidos) | {expandibles[e] for e in expandir}
+        return {nombre: campo for nombre, campo in campos.items() if nombre in visibles}
+
+def _memo(conversor):
+    # nombres, fechas y cantidades se repiten mucho en una página (los posteos en bloque comparten timestamp)
+    memo = {}
+
+    def convertir(v):
+        try:
+            return memo[v]
+        except KeyError:
+            memo[v] = salida = conversor(v)
+            return salida
+    return convertir
+
+class LecturaRapida:
+    """
+    Listado sin instanciar modelos ni pasar por los Field de DRF: el queryset se
+    lee con values_list() (tuplas con nombre) y cada campo tiene un conversor armado una sola vez, con la
+    misma salida que to_representation() (decimales cuantizados como texto,
+    fechas en la zona actual, claves omitidas cuando la FK intermedia es nula).
+    Soporta columnas, FK hacia adelante (producto.sku), PK de relaciones,
+    NombreReferenciaField y serializers anidados many=True sobre una FK inversa
+    (las líneas), que se leen con un query por página.
+
+    La usan los serializers con Meta.list_serializer_class = ListaRapidaSerializer;
+    compilar() retorna None si alguno de sus campos no se puede resolver así.
+    """
+
+    def __init__(self, modelo):
+        self.modelo = modelo
+        self.columnas = []  # lookups de values_list()
+        self.campos = []  # (nombre, posición, conversor, posición que si es nula omite el campo, anidado)
+        self.anidados = []  # (LecturaRapida, posición de la FK inversa)
+
+    @classmethod
+    def compilar(cls, serializer, modelo=None):
+        lista = getattr(getattr(serializer, "Meta", None), "list_serializer_class", None)
+        if modelo is None and not (lista and issubclass(lista, ListaRapidaSerializer)):
+            return None
+        lectura = cls(modelo or serializer.Meta.model)
+        for nombre, campo in serializer.fields.items():
+            if not campo.write_only and not lectura._agregar(nombre, campo):
+                return None
+        return lectura
+
+    def _columna(self, columna):
+        if columna not in self.columnas:
+            self.columnas.append(columna)
+        return self.columnas.index(columna)
+
+    def _agregar(self, nombre, campo):
+        if campo.source == "*":
+            return False
+        opts = self.modelo._meta
+        if isinstance(campo, serializers.ListSerializer):
+            try:
+                relacion = opts.get_field(campo.source)
+            except FieldDoesNotExist:
+                return False
+            hijo = relacion.one_to_many and LecturaRapida.compilar(campo.child, relacion.related_model)
+            if not hijo:
+                return False
+            self.anidados.append((hijo, hijo._columna(relacion.field.attname)))
+            self.campos.append((nombre, self._columna("pk"), None, None, len(self.anidados) - 1))
+            return True
+        if isinstance(campo, (serializers.BaseSerializer, serializers.ManyRelatedField)):
+            return False
+
+        # producto.sku -> producto__sku; una FK intermedia nula omite el campo (SkipField en DRF)
+        modelo, prefijo, nula = self.modelo, "", None
+        for atributo in campo.source_attrs[:-1]:
+            try:
+                relacion = modelo._meta.get_field(atributo)
+            except FieldDoesNotExist:
+                return False
+            if not (relacion.many_to_one or relacion.one_to_one) or not relacion.concrete:
+                return False
+            if relacion.null and nula is None:
+                nula = self._columna(prefijo + relacion.name)
+            prefijo += relacion.name + "__"
+            modelo = relacion.related_model
+        try:
+            destino = modelo._meta.get_field(campo.source_attrs[-1])
+        except FieldDoesNotExist:
+            return False
+        if not destino.concrete:
+            return False
+
+        if isinstance(campo, serializers.RelatedField):
+            pk = serializers.PrimaryKeyRelatedField
+            if not isinstance(campo, pk) or type(campo).to_representation is not pk.to_representation or campo.pk_field is not None:
+                return False
+            conversor = None  # la columna de la FK ya es el pk
+        elif type(campo).get_attribute is not serializers.Field.get_attribute:
+            return False
+        else:
+            conversor = self._conversor(campo)
+            if isinstance(campo, (NombreReferenciaField, serializers.DecimalField, serializers.DateTimeField, serializers.DateField)):
+                conversor = _memo(conversor)
+        self.campos.append((nombre, self._columna(prefijo + destino.name), conversor, nula, None))
+        return True
+
+    @staticmethod
+    def _conversor(campo):
+        if isinstance(campo, NombreReferenciaField):
+            cache = referencia(campo.modelo)
+            return cache.get
+        if isinstance(campo, serializers.DecimalField):
+            texto = getattr(campo, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+            if not texto or campo.localize or campo.normalize_output or campo.decimal_places is None:
+                return campo.to_representation
+            exponente = Decimal(".1") ** campo.decimal_places
+            contexto = decimal.getcontext().copy()
+            if campo.max_digits is not None:
+                contexto.prec = campo.max_digits
+            rounding = campo.rounding
+
+            def a_texto(v):
+                if not isinstance(v, Decimal):
+                    v = Decimal(str(v).strip())
+                return f"{v.quantize(exponente, rounding=rounding, context=contexto):f}"
+            return a_texto
+        if isinstance(campo, serializers.DateTimeField):
+            formato = getattr(campo, "format", api_settings.DATETIME_FORMAT)
+            zona = campo.timezone if hasattr(campo, "timezone") else campo.default_timezone()
+            if formato is None or formato.lower() != ISO_8601 or zona is None:
+                return campo.to_representation
+
+            def fecha_hora(v):
+                if v.tzinfo is None:
+                    return campo.to_representation(v)
+                v = v.astimezone(zona).isoformat()
+                return v[:-6] + "Z" if v.endswith("+00:00") else v
+            return fecha_hora
+        if isinstance(campo, serializers.DateField):
+            formato = getattr(campo, "format", api_settings.DATE_FORMAT)
+            if formato is None or formato.lower() != ISO_8601:
+                return campo.to_representation
+            return lambda v: v.isoformat()
+        if isinstance(campo, serializers.BooleanField):
+            return lambda v: v if v is True or v is False else campo.to_representation(v)
+        if type(campo) in (serializers.IntegerField, serializers.CharField, serializers.ReadOnlyField):
+            return {serializers.IntegerField: int, serializers.CharField: str}.get(type(campo))
+        return campo.to_representation
+
+    def queryset(self, qs, ordering=()):
+        # la paginación por cursor lee las columnas del orden como atributos de cada fila
+        extra = [o.lstrip("-") for o in ordering if isinstance(o, str) and "__" not in o] + ["id"]
+        return qs.values_list(*self.columnas, *dict.fromkeys(c for c in extra if c not in self.columnas), named=True)
+
+    def filas(self, valores):
+        valores = list(valores)
+        grupos = []
+        for hijo, fk in self.anidados:
+            grupo = defaultdict(list)
+            pk = self.columnas.index("pk")
+            ids = [v[pk] for v in valores]
+            crudos = list(hijo.modelo._default_manager.filter(**{f"{hijo.columnas[fk]}__in": ids}).values_list(*hijo.columnas)) if ids else []
+            for crudo, fila in zip(crudos, hijo.filas(crudos)):
+                grupo[crudo[fk]].append(fila)
+            grupos.append(grupo)
+
+        campos = self.campos
+        salida = []
+        for v in valores:
+            fila = {}
+            for nombre, posicion, conversor, nula, anidado in campos:
+                if nula is not None and v[nula] is None:
+                    continue
+                valor = v[posicion]
+                if anidado is not None:
+                    fila[nombre] = grupos[anidado].get(valor, [])
+                else:
+                    fila[nombre] = valor if valor is None or conversor is None else conversor(valor)
+            salida.append(fila)
+        return salida
+
+class ListaRapidaSerializer(serializers.ListSerializer):
+    """Filas de values_list() (ver LecturaRapida); instancias de modelo por el camino normal."""
+
+    def to_representation(self, data):
+        iterable = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if iterable and isinstance(iterable[0], tuple):
+            lectura = LecturaRapida.compilar(self.child)
+            if lectura is not None:
+                return lectura.filas(iterable)
+        return [self.child.to_representation(item) for item in iterable]
+
+class CategoriaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Categoria
         fields = ["id", "nombre", "padre", "activa", "creado_en", "actualizado_en"]
 
-class MarcaSerializer(serializers.ModelSerializer):
+    def validate_padre(self, padre):
+        instance = getattr(self, "instance", None)
+        if instance and padre and CategoriaArbol.objects.filter(ancestro=instance, descendiente=padre).exists():
+            raise serializers.ValidationError("La categoría padre no puede ser la misma categoría ni una subcategoría suya.")
+        return padre
+
+class MarcaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Marca
         fields = ["id", "nombre", "activa", "creado_en", "actualizado_en"]
 
-class UnidadMedidaSerializer(serializers.ModelSerializer):
+class UnidadMedidaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = UnidadMedida
         fields = ["id", "nombre", "simbolo", "activa", "creado_en", "actualizado_en"]
 
-class ProveedorSerializer(serializers.ModelSerializer):
+class ProveedorSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Proveedor
         fields = [
@@ -25,7 +268,7 @@ class ProveedorSerializer(serializers.ModelSerializer):
             "creado_en", "actualizado_en"
         ]
 
-class ProductoProveedorSerializer(serializers.ModelSerializer):
+class ProductoProveedorSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     proveedor_nombre = serializers.CharField(source="proveedor.nombre", read_only=True)
 
     class Meta:
@@ -39,9 +282,9 @@ class ProductoProveedorSerializer(serializers.ModelSerializer):
             "creado_en", "actualizado_en"
         ]
 
-class ProductoSerializer(serializers.ModelSerializer):
-    marca_nombre = serializers.CharField(source="marca.nombre", read_only=True)
-    unidad_medida_nombre = serializers.CharField(source="unidad_medida.nombre", read_only=True)
+class ProductoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    marca_nombre = NombreReferenciaField(Marca, source="marca_id")
+    unidad_medida_nombre = NombreReferenciaField(UnidadMedida, source="unidad_medida_id")
     categorias_detalle = CategoriaSerializer(source="categorias", many=True, read_only=True)
 
     class Meta:
@@ -58,16 +301,17 @@ class ProductoSerializer(serializers.ModelSerializer):
             "ubicacion",
             "creado_en", "actualizado_en"
         ]
+        expandibles = {"categorias": "categorias_detalle"}
 
-class BodegaSerializer(serializers.ModelSerializer):
+class BodegaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Bodega
         fields = ["id", "nombre", "direccion", "activa", "creado_en", "actualizado_en"]
 
-class StockSerializer(serializers.ModelSerializer):
+class StockSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     producto_sku = serializers.CharField(source="producto.sku", read_only=True)
     producto_nombre = serializers.CharField(source="producto.nombre", read_only=True)
-    bodega_nombre = serializers.CharField(source="bodega.nombre", read_only=True)
+    bodega_nombre = NombreReferenciaField(Bodega, source="bodega_id")
 
     class Meta:
         model = Stock
@@ -78,8 +322,109 @@ class StockSerializer(serializers.ModelSerializer):
             "cantidad",
             "creado_en", "actualizado_en"
         ]
+        list_serializer_class = ListaRapidaSerializer
+
+class StockLoteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    producto_sku = serializers.CharField(source="producto.sku", read_only=True)
+    producto_nombre = serializers.CharField(source="producto.nombre", read_only=True)
+    bodega_nombre = NombreReferenciaField(Bodega, source="bodega_id")
+
+    class Meta:
+        model = StockLote
+        fields = [
+            "id",
+            "bodega", "bodega_nombre",
+            "producto", "producto_sku", "producto_nombre",
+            "lote", "vencimiento", "cantidad",
+            "actualizado_en"
+        ]
+
+class KardexSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    producto_sku = serializers.CharField(source="producto.sku", read_only=True)
+
+    class Meta:
+        model = Kardex
+        fields = ["id", "bodega", "producto", "producto_sku", "delta", "saldo", "fecha", "tipo", "movimiento_id"]
+
+class StockAFechaSerializer(serializers.ModelSerializer):
+    producto_sku = serializers.CharField(source="producto.sku", read_only=True)
+    producto_nombre = serializers.CharField(source="producto.nombre", read_only=True)
+    cantidad = serializers.DecimalField(source="cantidad_a_fecha", max_digits=14, decimal_places=3, read_only=True)
+
+    class Meta:
+        model = Stock
+        fields = ["bodega", "producto", "producto_sku", "producto_nombre", "cantidad"]
+
+class AlertaReposicionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    bodega_nombre = NombreReferenciaField(Bodega, source="bodega_id")
+    producto_sku = serializers.CharField(source="producto.sku", read_only=True)
+    producto_nombre = serializers.CharField(source="producto.nombre", read_only=True)
+    stock_minimo = serializers.DecimalField(source="producto.stock_minimo", max_digits=14, decimal_places=3, read_only=True)
+    stock_maximo = serializers.DecimalField(source="producto.stock_maximo", max_digits=14, decimal_places=3, read_only=True)
+
+    class Meta:
+        model = AlertaReposicion
+        fields = [
+            "id",
+            "bodega", "bodega_nombre",
+            "producto", "producto_sku", "producto_nombre",
+            "cantidad", "stock_minimo", "stock_maximo",
+            "faltante", "sugerido",
+            "actualizado_en"
+        ]
+
+class ResumenInventarioSerializer(serializers.Serializer):
+    # filas del modelo o dicts agregados (?global=1, bodega = None)
+    NOMBRES_CERO = {
+        ResumenInventario.Dimension.TOTAL: "Total",
+        ResumenInventario.Dimension.CATEGORIA: "Sin categoría",
+        ResumenInventario.Dimension.MARCA: "Sin marca",
+    }
+    MODELOS = {ResumenInventario.Dimension.CATEGORIA: Categoria, ResumenInventario.Dimension.MARCA: Marca}
+
+    bodega = serializers.IntegerField(source="bodega_id", allow_null=True)
+    bodega_nombre = NombreReferenciaField(Bodega, source="bodega_id")
+    dimension = serializers.CharField()
+    referencia = serializers.IntegerField()
+    nombre = serializers.SerializerMethodField()
+    cantidad = serializers.DecimalField(max_digits=16, decimal_places=3)
+    valor = serializers.DecimalField(max_digits=18, decimal_places=2)
+    productos = serializers.IntegerField()
+
+    def get_nombre(self, fila):
+        dimension, ref = (fila["dimension"], fila["referencia"]) if isinstance(fila, dict) else (fila.dimension, fila.referencia)
+        if not ref:
+            return self.NOMBRES_CERO[dimension]
+        return referencia(self.MODELOS[dimension]).get(ref)
+
+class ProductoLineaField(serializers.PrimaryKeyRelatedField):
+    """Resuelve el producto desde el mapa precargado por LineasListSerializer."""
+    precargados = None
+
+    def to_internal_value(self, data):
+        if self.precargados is not None:
+            try:
+                return self.precargados[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+class LineasListSerializer(serializers.ListSerializer):
+    # un solo in_bulk para los productos de todas las líneas (en vez de un get por línea)
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            ids = set()
+            for item in data:
+                try:
+                    ids.add(int(item.get("producto")))
+                except (AttributeError, TypeError, ValueError):
+                    pass
+            self.child.fields["producto"].precargados = Producto.objects.in_bulk(ids)
+        return super().to_internal_value(data)
 
 class MovimientoLineaEntradaSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)  # permite identificar líneas existentes al actualizar
+    producto = ProductoLineaField(queryset=Producto.objects.all())
     producto_sku = serializers.CharField(source="producto.sku", read_only=True)
     producto_nombre = serializers.CharField(source="producto.nombre", read_only=True)
 
@@ -92,8 +437,11 @@ class MovimientoLineaEntradaSerializer(serializers.ModelSerializer):
             "lote", "vencimiento", "observacion",
             "creado_en", "actualizado_en"
         ]
+        list_serializer_class = LineasListSerializer
 
 class MovimientoLineaSalidaSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)  # permite identificar líneas existentes al actualizar
+    producto = ProductoLineaField(queryset=Producto.objects.all())
     producto_sku = serializers.CharField(source="producto.sku", read_only=True)
     producto_nombre = serializers.CharField(source="producto.nombre", read_only=True)
 
@@ -106,30 +454,21 @@ class MovimientoLineaSalidaSerializer(serializers.ModelSerializer):
             "lote", "vencimiento", "observacion",
             "creado_en", "actualizado_en"
         ]
+        list_serializer_class = LineasListSerializer
 
-class MovimientoEntradaSerializer(serializers.ModelSerializer):
-    lineas = MovimientoLineaEntradaSerializer(many=True, required=False)
-    bodega_nombre = serializers.CharField(source="bodega.nombre", read_only=True)
-    proveedor_nombre = serializers.CharField(source="proveedor.nombre", read_only=True)
-
-    class Meta:
-        model = MovimientoEntrada
-        fields = [
-            "id",
-            "estado", "fecha",
-            "bodega", "bodega_nombre",
-            "proveedor", "proveedor_nombre",
-            "referencia", "observacion",
-            "creado_por", "posteado_en",
-            "lineas",
-            "creado_en", "actualizado_en"
-        ]
-        read_only_fields = ["creado_por", "posteado_en"]
+class LineasBulkMixin:
+    """
+    Escritura de movimientos con sus líneas en bloque: create() hace un solo
+    bulk_create y update() compara contra las líneas existentes y solo
+    inserta, actualiza o borra las que cambiaron. Un movimiento POSTEADO no se
+    puede modificar.
+    """
+    linea_fk = None  # "movimiento_entrada" / "movimiento_salida" / "movimiento_transferencia"
 
     def validate(self, data):
         # Evitar que editen un movimiento ya posteado
         instance = getattr(self, "instance", None)
-        if instance and instance.estado == MovimientoEntrada.Estado.POSTEADO:
+        if instance and instance.estado == BaseMovimiento.Estado.POSTEADO:
             raise serializers.ValidationError("No puedes modificar un movimiento ya POSTEADO.")
         return data
 
@@ -138,13 +477,12 @@ class MovimientoEntradaSerializer(serializers.ModelSerializer):
         lineas_data = validated_data.pop("lineas", [])
         request = self.context.get("request")
 
-        movimiento = MovimientoEntrada.objects.create(
+        movimiento = self.Meta.model.objects.create(
             creado_por=request.user if request and request.user.is_authenticated else None,
             **validated_data
         )
 
-        for l in lineas_data:
-            MovimientoLinea.objects.create(movimiento_entrada=movimiento, **l)
+        self._crear_lineas(movimiento, lineas_data)
 
         return movimiento
 
@@ -156,17 +494,117 @@ class MovimientoEntradaSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
 
-        # Si mandan "lineas", reemplazamos todas (modo simple)
+        # Si mandan "lineas", se sincronizan contra las existentes
         if lineas_data is not None:
-            instance.lineas.all().delete()
-            for l in lineas_data:
-                MovimientoLinea.objects.create(movimiento_entrada=instance, **l)
+            self._sincronizar_lineas(instance, lineas_data)
 
         return instance
 
-class MovimientoSalidaSerializer(serializers.ModelSerializer):
+    def _campos_linea(self):
+        return [
+            f.source for f in self.fields["lineas"].child.fields.values()
+            if not f.read_only and f.source != "id"
+        ]
+
+    def _crear_lineas(self, movimiento, lineas_data):
+        MovimientoLinea.objects.bulk_create(
+            MovimientoLinea(**{self.linea_fk: movimiento}, **{k: v for k, v in l.items() if k != "id"})
+            for l in lineas_data
+        )
+
+    def _sincronizar_lineas(self, movimiento, lineas_data):
+        campos = self._campos_linea()
+        opts = MovimientoLinea._meta
+        attnames = [opts.get_field(c).attname for c in campos]  # producto -> producto_id
+
+        def firma_linea(linea):
+            return tuple(getattr(linea, a) for a in attnames)
+
+        def firma_dato(l):
+            valores = []
+            for c in campos:
+                v = l[c] if c in l else opts.get_field(c).get_default()
+                valores.append(getattr(v, "pk", v))
+            return tuple(valores)
+
+        existentes = {l.pk: l for l in MovimientoLinea.objects.filter(**{self.linea_fk: movimiento})}
+        vistos, sin_id, a_actualizar = set(), [], []
+
+        # 1) las líneas que traen id se actualizan solo si cambiaron
+        for l in lineas_data:
+            pk = l.get("id")
+            if pk is None:
+                sin_id.append(l)
+                continue
+            if pk not in existentes or pk in vistos:
+                raise serializers.ValidationError({"lineas": f"La línea {pk} no pertenece a este movimiento."})
+            vistos.add(pk)
+            linea = existentes[pk]
+            if firma_dato({**{c: getattr(linea, a) for c, a in zip(campos, attnames)}, **l}) != firma_linea(linea):
+                for c in campos:
+                    if c in l:
+                        setattr(linea, c, l[c])
+                a_actualizar.append(linea)
+
+        # 2) las que vienen sin id reutilizan una línea idéntica si ya existe
+        libres = defaultdict(list)
+        for pk, linea in existentes.items():
+            if pk not in vistos:
+                libres[firma_linea(linea)].append(pk)
+        nuevas = []
+        for l in sin_id:
+            iguales = libres.get(firma_dato(l))
+            if iguales:
+                vistos.add(iguales.pop())
+            else:
+                nuevas.append(l)
+
+        a_borrar = [pk for pk in existentes if pk not in vistos]
+        if a_borrar:
+            MovimientoLinea.objects.filter(pk__in=a_borrar).delete()
+        if a_actualizar:
+            ahora = timezone.now()
+            for linea in a_actualizar:
+                linea.actualizado_en = ahora
+            MovimientoLinea.objects.bulk_update(a_actualizar, campos + ["actualizado_en"])
+        if nuevas:
+            self._crear_lineas(movimiento, nuevas)
+
+    def to_representation(self, instance):
+        # la respuesta de create/update relee las líneas con su producto en un solo query
+        # (DRF limpia el prefetch después de perform_update; list/retrieve ya lo traen del plan)
+        if "lineas" in self.fields and "lineas" not in getattr(instance, "_prefetched_objects_cache", {}):
+            models.prefetch_related_objects(
+                [instance], models.Prefetch("lineas", queryset=MovimientoLinea.objects.select_related("producto"))
+            )
+        return super().to_representation(instance)
+
+class MovimientoEntradaSerializer(CamposDinamicosMixin, LineasBulkMixin, serializers.ModelSerializer):
+    lineas = MovimientoLineaEntradaSerializer(many=True, required=False)
+    linea_fk = "movimiento_entrada"
+    bodega_nombre = NombreReferenciaField(Bodega, source="bodega_id")
+    proveedor_nombre = serializers.CharField(source="proveedor.nombre", read_only=True)
+
+    class Meta:
+        model = MovimientoEntrada
+        fields = [
+            "id",
+            "estado", "fecha",
+            "bodega", "bodega_nombre",
+            "proveedor", "proveedor_nombre",
+            "referencia", "observacion",
+            "creado_por", "posteado_en",
+            "lineas",
+            "creado_en", "actualizado_en"
+        ]
+        read_only_fields = ["creado_por", "posteado_en"]
+        expandibles = {"lineas": "lineas"}
+        list_serializer_class = ListaRapidaSerializer
+
+class MovimientoSalidaSerializer(CamposDinamicosMixin, LineasBulkMixin, serializers.ModelSerializer):
     lineas = MovimientoLineaSalidaSerializer(many=True, required=False)
-    bodega_nombre = serializers.CharField(source="bodega.nombre", read_only=True)
+    linea_fk = "movimiento_salida"
+    bodega_nombre = NombreReferenciaField(Bodega, source="bodega_id")
 
     class Meta:
         model = MovimientoSalida
@@ -181,39 +619,36 @@ class MovimientoSalidaSerializer(serializers.ModelSerializer):
             "creado_en", "actualizado_en"
         ]
         read_only_fields = ["creado_por", "posteado_en"]
+        expandibles = {"lineas": "lineas"}
+        list_serializer_class = ListaRapidaSerializer
+
+class MovimientoTransferenciaSerializer(CamposDinamicosMixin, LineasBulkMixin, serializers.ModelSerializer):
+    lineas = MovimientoLineaSalidaSerializer(many=True, required=False)  # sin lote: FEFO en el origen
+    linea_fk = "movimiento_transferencia"
+    bodega_nombre = NombreReferenciaField(Bodega, source="bodega_id")
+    bodega_destino_nombre = NombreReferenciaField(Bodega, source="bodega_destino_id")
+
+    class Meta:
+        model = MovimientoTransferencia
+        fields = [
+            "id",
+            "estado", "fecha",
+            "bodega", "bodega_nombre",
+            "bodega_destino", "bodega_destino_nombre",
+            "referencia", "observacion",
+            "creado_por", "posteado_en",
+            "lineas",
+            "creado_en", "actualizado_en"
+        ]
+        read_only_fields = ["creado_por", "posteado_en"]
+        expandibles = {"lineas": "lineas"}
+        list_serializer_class = ListaRapidaSerializer
 
     def validate(self, data):
+        data = super().validate(data)
         instance = getattr(self, "instance", None)
-        if instance and instance.estado == MovimientoSalida.Estado.POSTEADO:
-            raise serializers.ValidationError("No puedes modificar un movimiento ya POSTEADO.")
+        origen = data.get("bodega", getattr(instance, "bodega", None))
+        destino = data.get("bodega_destino", getattr(instance, "bodega_destino", None))
+        if origen is not None and origen == destino:
+            raise serializers.ValidationError({"bodega_destino": "La bodega de destino debe ser distinta de la de origen."})
         return data
-
-    @transaction.atomic
-    def create(self, validated_data):
-        lineas_data = validated_data.pop("lineas", [])
-        request = self.context.get("request")
-
-        movimiento = MovimientoSalida.objects.create(
-            creado_por=request.user if request and request.user.is_authenticated else None,
-            **validated_data
-        )
-
-        for l in lineas_data:
-            MovimientoLinea.objects.create(movimiento_salida=movimiento, **l)
-
-        return movimiento
-
-    @transaction.atomic
-    def update(self, instance, validated_data):
-        lineas_data = validated_data.pop("lineas", None)
-
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-        if lineas_data is not None:
-            instance.lineas.all().delete()
-            for l in lineas_data:
-                MovimientoLinea.objects.create(movimiento_salida=instance, **l)
-
-        return instance
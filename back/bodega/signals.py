@@ -0,0 +1,189 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import busqueda, sync
+from .cache import codigos, referencia
+from .models import (
+    AlertaReposicion, Bodega, Categoria, CategoriaArbol, CodigoProducto, Eliminacion, Marca, Producto,
+    ProductoProveedor, ResumenInventario, UnidadMedida,
+)
+
+
+# --- árbol de categorías (closure table) ------------------------------------
+
+@receiver(pre_save, sender=Categoria)
+def _categoria_padre_anterior(sender, instance, raw=False, **kwargs):
+    instance._padre_anterior = (
+        Categoria.objects.filter(pk=instance.pk).values_list("padre_id", flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Categoria)
+def _categoria_arbol(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        CategoriaArbol.insertar(instance.pk, instance.padre_id)
+    elif instance.padre_id != getattr(instance, "_padre_anterior", instance.padre_id):
+        with transaction.atomic():
+            CategoriaArbol.mover(instance.pk, instance.padre_id)
+
+
+@receiver(pre_delete, sender=Categoria)
+def _categoria_borrada(sender, instance, **kwargs):
+    # los hijos quedan como raíces (padre SET_NULL): se cortan de los ancestros
+    for hijo_id in instance.hijos.values_list("id", flat=True):
+        CategoriaArbol.desligar(hijo_id)
+
+
+# --- alertas de reposición ---------------------------------------------------
+
+@receiver(post_save, sender=Producto)
+def _producto_alertas(sender, instance, raw=False, **kwargs):
+    # stock_minimo / stock_maximo / activo pueden haber cambiado
+    if not raw:
+        AlertaReposicion.actualizar([instance.pk])
+
+
+# --- resumen de inventario y búsqueda ------------------------------------------
+# marca, costo_promedio y categorías cambian el grupo o el valor del stock: se
+# toman los aportes antes del cambio y se aplica la diferencia después. Los
+# mismos cambios (y los renombres de marca/categoría) reindexan la búsqueda.
+
+@receiver(pre_save, sender=Producto)
+@receiver(pre_delete, sender=Producto)
+def _producto_resumen_antes(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._resumen_antes = ResumenInventario.aportes([instance.pk])
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def _producto_resumen(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    antes = getattr(instance, "_resumen_antes", None)
+    if antes is not None:
+        ResumenInventario.aplicar(antes, ResumenInventario.aportes([instance.pk]))
+        del instance._resumen_antes
+    busqueda.indexar([instance.pk])
+
+
+@receiver(m2m_changed, sender=Producto.categorias.through)
+def _producto_categorias(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith("pre_"):
+        if not reverse:
+            ids = [instance.pk]
+        elif pk_set is not None:
+            ids = list(pk_set)
+        else:  # categoria.productos.clear()
+            ids = list(instance.productos.values_list("id", flat=True))
+        instance._resumen_categorias = (ids, ResumenInventario.aportes(ids))
+    elif hasattr(instance, "_resumen_categorias"):
+        ids, antes = instance._resumen_categorias
+        ResumenInventario.aplicar(antes, ResumenInventario.aportes(ids))
+        busqueda.indexar(ids)
+        _tocar_productos(ids)
+        del instance._resumen_categorias
+
+
+@receiver(pre_delete, sender=Categoria)
+def _categoria_resumen_antes(sender, instance, **kwargs):
+    # el borrado en cascada de producto.categorias no dispara m2m_changed
+    ids = list(instance.productos.values_list("id", flat=True))
+    instance._resumen_categorias = (ids, ResumenInventario.aportes(ids))
+
+
+@receiver(post_delete, sender=Categoria)
+def _categoria_resumen(sender, instance, **kwargs):
+    ids, antes = instance._resumen_categorias
+    ResumenInventario.aplicar(antes, ResumenInventario.aportes(ids))
+    busqueda.indexar(ids)
+    _tocar_productos(ids)
+
+
+@receiver(pre_save, sender=Marca)
+@receiver(pre_save, sender=Categoria)
+@receiver(pre_save, sender=UnidadMedida)
+def _nombre_anterior(sender, instance, raw=False, **kwargs):
+    instance._nombre_anterior = (
+        sender.objects.filter(pk=instance.pk).values_list("nombre", flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Marca)
+@receiver(post_save, sender=Categoria)
+def _nombre_reindexar(sender, instance, created, raw=False, **kwargs):
+    if not (raw or created) and instance.nombre != instance._nombre_anterior:
+        busqueda.indexar(list(instance.productos.values_list("id", flat=True)))
+
+
+# --- fecha de modificación de productos ----------------------------------------
+# El listado de productos lleva el nombre de marca y unidad y el detalle de sus
+# categorías: cuando cambian se toca actualizado_en de los productos afectados,
+# que es lo que miran el ETag del listado (CondicionalMixin).
+
+def _tocar_productos(ids):
+    Producto.objects.filter(pk__in=ids).update(actualizado_en=timezone.now())
+
+
+@receiver(post_save, sender=Categoria)
+def _categoria_tocar_productos(sender, instance, created, raw=False, **kwargs):
+    # categorias_detalle incluye todos los campos de la categoría
+    if not (raw or created):
+        _tocar_productos(instance.productos.values("id"))
+
+
+@receiver(post_save, sender=Marca)
+@receiver(post_save, sender=UnidadMedida)
+def _nombre_tocar_productos(sender, instance, created, raw=False, **kwargs):
+    if not (raw or created) and instance.nombre != instance._nombre_anterior:
+        _tocar_productos(instance.productos.values("id"))
+
+
+# --- códigos para lectores ----------------------------------------------------
+
+@receiver(post_save, sender=Producto)
+def _producto_codigos(sender, instance, raw=False, **kwargs):
+    if not raw:
+        CodigoProducto.sincronizar([instance.pk])
+
+
+@receiver(post_save, sender=ProductoProveedor)
+@receiver(post_delete, sender=ProductoProveedor)
+def _producto_proveedor_codigos(sender, instance, raw=False, origin=None, **kwargs):
+    # si se está borrando el producto, sus códigos ya van en la cascada
+    if raw or isinstance(origin, Producto) or getattr(origin, "model", None) is Producto:
+        return
+    CodigoProducto.sincronizar([instance.producto_id])
+
+
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=UnidadMedida)
+def _invalidar_codigos(sender, **kwargs):
+    # los códigos del producto se borran en cascada; la unidad va en la respuesta cacheada
+    codigos.invalidar()
+
+
+# --- tombstones para /bodega/sync/ ---------------------------------------------
+
+def _registrar_eliminacion(sender, instance, **kwargs):
+    Eliminacion.objects.create(modelo=sender._meta.model_name, objeto_id=instance.pk)
+
+
+for _modelo in sync.MODELOS:
+    post_delete.connect(_registrar_eliminacion, sender=_modelo, dispatch_uid=f"sync_delete_{_modelo.__name__}")
+
+
+# --- cache de nombres de referencia ----------------------------------------
+
+def _invalidar_referencia(sender, **kwargs):
+    referencia(sender).invalidar()
+
+
+for _modelo in (Marca, UnidadMedida, Categoria, Bodega):
+    post_save.connect(_invalidar_referencia, sender=_modelo, dispatch_uid=f"ref_save_{_modelo.__name__}")
+    post_delete.connect(_invalidar_referencia, sender=_modelo, dispatch_uid=f"ref_delete_{_modelo.__name__}")
@@ -0,0 +1,162 @@
+import base64
+import binascii
+import json
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+from .models import POSTEO_ESPERA, POSTEO_INTENTOS, Bodega, Categoria, Eliminacion, Marca, Producto, Stock
+
+LIMITE = 500
+LIMITE_MAXIMO = 2000
+
+# (nombre, modelo, columnas) en orden de dependencias: el cliente aplica en este orden
+FUENTES = [
+    ("bodega", Bodega, ["id", "nombre", "direccion", "activa", "actualizado_en"]),
+    ("marca", Marca, ["id", "nombre", "activa", "actualizado_en"]),
+    ("categoria", Categoria, ["id", "nombre", "padre_id", "activa", "actualizado_en"]),
+    ("producto", Producto, [
+        "id", "sku", "nombre", "descripcion", "codigo_barra", "marca_id", "unidad_medida_id",
+        "activo", "permite_fraccion", "stock_minimo", "stock_maximo", "costo_promedio",
+        "precio_referencia", "ubicacion", "actualizado_en",
+    ]),
+    ("stock", Stock, ["id", "bodega_id", "producto_id", "cantidad", "actualizado_en"]),
+]
+MODELOS = [modelo for _, modelo, _ in FUENTES]
+
+
+def margen():
+    """
+    Cuánto antes de ahora termina una ventana nueva del feed. Una fila lleva el
+    actualizado_en del momento en que se guardó, pero otros la ven recién al
+    confirmarse la transacción: lo que esté en vuelo no debe quedar detrás del
+    token del cliente. Por defecto es la espera máxima por el lock (timeout de
+    la conexión: busy timeout de SQLite, 5 s si no se indica) más el peor caso
+    del backoff de con_reintentos y un segundo para la transacción.
+    settings.BODEGA_SYNC_MARGEN_SEGUNDOS lo fija a mano.
+    """
+    segundos = getattr(settings, "BODEGA_SYNC_MARGEN_SEGUNDOS", None)
+    if segundos is None:
+        espera_lock = connection.settings_dict.get("OPTIONS", {}).get("timeout", 5)
+        reintentos = sum(POSTEO_ESPERA * 2 ** i * 1.5 for i in range(POSTEO_INTENTOS - 1))  # jitter máximo
+        segundos = espera_lock + reintentos + 1
+    return timedelta(seconds=segundos)
+
+
+class TokenInvalido(ValueError):
+    pass
+
+
+class TokenVencido(ValueError):
+    """El token es más viejo que la retención de tombstones: hay que resincronizar desde cero."""
+
+
+def _codificar(estado):
+    return base64.urlsafe_b64encode(json.dumps(estado, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def _decodificar(token):
+    try:
+        estado = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(estado, dict) or not isinstance(estado.get("m", 0), int) or not isinstance(estado.get("i", 0), int):
+            raise ValueError
+        fechas = {k: parse_datetime(estado[k]) if estado.get(k) else None for k in ("d", "h", "t")}
+        if any(fechas[k] is None and estado.get(k) for k in fechas):
+            raise ValueError
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise TokenInvalido("Token de sincronización inválido.")
+    return estado, fechas
+
+
+_fecha = serializers.DateTimeField().to_representation
+
+
+def _fila(fila):
+    # decimales como texto y fechas en la zona local, igual que los serializers
+    fila = {k: str(v) if isinstance(v, Decimal) else v for k, v in fila.items()}
+    fila["actualizado_en"] = _fecha(fila["actualizado_en"])
+    return fila
+
+
+def _pagina(qs, campo, desde, hasta, ultimo, limite):
+    qs = qs.filter(**{f"{campo}__lte": hasta})
+    if desde is not None:
+        qs = qs.filter(**{f"{campo}__gt": desde})
+    if ultimo is not None:
+        t, i = ultimo
+        qs = qs.filter(Q(**{f"{campo}__gt": t}) | Q(**{campo: t, "id__gt": i}))
+    return qs.order_by(campo, "id")[:limite]
+
+
+def cambios(token=None, limite=LIMITE):
+    """
+    Una página del feed de cambios. Sin token arma la foto completa (sin
+    tombstones); con el token de la última sincronización, solo lo modificado
+    y lo borrado desde entonces.
+
+    Cada ventana (desde, hasta] se recorre fuente por fuente con keyset sobre
+    (actualizado_en, id) y al final los tombstones; "mas" indica que quedan
+    páginas de la ventana. El "siguiente" de la última página es el token a
+    guardar para la próxima sincronización.
+    """
+    estado, fechas = _decodificar(token) if token else ({}, {})
+    desde = fechas.get("d")
+    retencion = getattr(settings, "BODEGA_SYNC_RETENCION_DIAS", 90)
+    if desde is not None and desde < timezone.now() - timedelta(days=retencion):
+        raise TokenVencido("El token es anterior a la retención de borrados; sincronice desde cero.")
+    hasta = fechas.get("h") or timezone.now() - margen()
+    fuente = estado.get("m", 0)
+    ultimo = (fechas["t"], estado.get("i", 0)) if fechas.get("t") else None
+
+    respuesta = {"cambios": {}, "eliminados": {}}
+    restantes = limite
+    while fuente <= len(FUENTES) and restantes > 0:
+        if fuente < len(FUENTES):
+            nombre, modelo, columnas = FUENTES[fuente]
+            filas = list(_pagina(modelo.objects.values(*columnas), "actualizado_en", desde, hasta, ultimo, restantes))
+            if filas:
+                posicion = (filas[-1]["actualizado_en"], filas[-1]["id"])
+                filas = [_fila(f) for f in filas]
+                if modelo is Producto:
+                    categorias = defaultdict(list)
+                    through = Producto.categorias.through.objects.filter(producto_id__in=[f["id"] for f in filas])
+                    for producto_id, categoria_id in through.values_list("producto_id", "categoria_id"):
+                        categorias[producto_id].append(categoria_id)
+                    for f in filas:
+                        f["categorias"] = categorias[f["id"]]
+                respuesta["cambios"][nombre] = filas
+        else:
+            # tombstones, después de las altas: un alta y borrado en la misma ventana termina borrado
+            filas = []
+            if desde is not None:
+                filas = list(_pagina(
+                    Eliminacion.objects.filter(modelo__in=[m._meta.model_name for m in MODELOS]).values("id", "modelo", "objeto_id", "eliminado_en"),
+                    "eliminado_en", desde, hasta, ultimo, restantes,
+                ))
+            for f in filas:
+                respuesta["eliminados"].setdefault(f["modelo"], []).append(f["objeto_id"])
+            if filas:
+                posicion = (filas[-1]["eliminado_en"], filas[-1]["id"])
+        restantes -= len(filas)
+        if restantes > 0:  # fuente agotada
+            fuente, ultimo = fuente + 1, None
+        else:
+            ultimo = posicion
+
+    respuesta["mas"] = fuente <= len(FUENTES)
+    if respuesta["mas"]:
+        siguiente = {"d": desde.isoformat() if desde else None, "h": hasta.isoformat(), "m": fuente}
+        if ultimo is not None:
+            siguiente.update(t=ultimo[0].isoformat(), i=ultimo[1])
+    else:
+        siguiente = {"d": hasta.isoformat()}
+    respuesta["siguiente"] = _codificar(siguiente)
+    respuesta["hasta"] = hasta
+    return respuesta
@@ -1,3 +1,974 @@
-from django.test import TestCase
+import csv
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import busqueda, sync
+from .cache import CacheCodigos, codigos, referencia
+from .filtros import verificar_indices
+from .metricas import PresupuestoExcedido, presupuesto, presupuesto_de, registro, verificar_presupuesto
+from .models import (
+    AlertaReposicion, Bodega, Categoria, CategoriaArbol, CodigoProducto, ConflictoStock, Kardex, KardexCierre,
+    Marca, MovimientoEntrada, MovimientoLinea, MovimientoSalida, MovimientoTransferencia, Producto,
+    ProductoProveedor, Proveedor, ResumenInventario, Stock, StockLote, UnidadMedida, aplicar_deltas_stock,
+    bloquear_stock, con_reintentos, contadores_posteo, normalizar_codigo, postear_documentos, stock_a_fecha,
+)
+from .pagination import PaginacionCursor
+from .serializers import LecturaRapida
+from .urls import router
+
+
+class InstrumentacionTests(TestCase):
+    def setUp(self):
+        registro.limpiar()
+        Marca.objects.create(nombre="Acme")
+
+    def test_server_timing_y_metrics(self):
+        respuesta = self.client.get(reverse("marca-list"))
+
+        partes = [p.split(";")[0].strip() for p in respuesta["Server-Timing"].split(",")]
+        self.assertEqual(partes, ["db", "render", "app", "total"])
+        metricas = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('bodega_http_requests_total{ruta="marca-list",metodo="GET",estado="200"} 1', metricas)
+        self.assertIn('bodega_db_queries_max{ruta="marca-list",metodo="GET"}', metricas)
+
+    def test_presupuesto_excedido_falla_con_el_sql(self):
+        with self.assertRaises(PresupuestoExcedido) as error:
+            verificar_presupuesto(self.client, reverse("marca-list"), maximo=0)
+        self.assertIn("SELECT", str(error.exception))
+        # con el presupuesto de settings.BODEGA_PRESUPUESTO_QUERIES
+        self.assertEqual(verificar_presupuesto(self.client, reverse("marca-list")).status_code, 200)
+
+
+def cargar(n, prefijo):
+    """n filas de cada tabla (y n líneas por movimiento), todas relacionadas, con los movimientos posteados."""
+    categorias = [Categoria.objects.create(nombre=f"{prefijo} cat {i}") for i in range(n)]
+    marcas = [Marca.objects.create(nombre=f"{prefijo} marca {i}") for i in range(n)]
+    unidades = [UnidadMedida.objects.create(nombre=f"{prefijo} um {i}") for i in range(n)]
+    proveedores = [Proveedor.objects.create(nombre=f"{prefijo} prov {i}") for i in range(n)]
+    productos = []
+    for i in range(n):
+        p = Producto.objects.create(sku=f"{prefijo}-{i}", nombre=f"{prefijo} producto {i}", codigo_barra=f"{prefijo}{i:06d}",
+                                    marca=marcas[i], unidad_medida=unidades[i], stock_minimo=Decimal("50"))
+        p.categorias.set(categorias)
+        ProductoProveedor.objects.bulk_create(ProductoProveedor(producto=p, proveedor=pr) for pr in proveedores)
+        productos.append(p)
+
+    origen = Bodega.objects.create(nombre=f"{prefijo} origen")
+    destino = Bodega.objects.create(nombre=f"{prefijo} destino")
+    vence = timezone.localdate() + timedelta(days=10)
+    entrada = MovimientoEntrada.objects.create(bodega=origen, proveedor=proveedores[0])
+    salida = MovimientoSalida.objects.create(bodega=origen)
+    transferencia = MovimientoTransferencia.objects.create(bodega=origen, bodega_destino=destino)
+    MovimientoLinea.objects.bulk_create(
+        [MovimientoLinea(movimiento_entrada=entrada, producto=p, cantidad=Decimal("10"), lote=f"L{i}", vencimiento=vence)
+         for i, p in enumerate(productos)]
+        + [MovimientoLinea(movimiento_salida=salida, producto=p, cantidad=Decimal("1")) for p in productos]
+        + [MovimientoLinea(movimiento_transferencia=transferencia, producto=p, cantidad=Decimal("2")) for p in productos]
+    )
+    postear_documentos([entrada, salida, transferencia])
+    return productos[-1], origen
+
+
+@mock.patch("bodega.cache.VERIFICAR_VERSION_CADA", 3600)  # sin revisar la versión de las caches entre requests
+class PresupuestoQueriesTests(TestCase):
+    """
+    Cada listado y detalle hace la misma cantidad de queries con pocas y con
+    más filas (sin N+1) y queda dentro de BODEGA_PRESUPUESTO_QUERIES.
+    """
+
+    def rutas(self, producto, bodega):
+        def ultimo(modelo, **filtro):
+            return modelo.objects.filter(**filtro).order_by("-id").values_list("id", flat=True)[0]
+
+        rutas = {
+            f"{base}-list": reverse(f"{base}-list") for base in (
+                "categoria", "marca", "unidadmedida", "proveedor", "producto", "productoproveedor", "bodega",
+                "stock", "stocklote", "kardex", "alertareposicion", "resumeninventario",
+                "movimientoentrada", "movimientosalida", "movimientotransferencia",
+            )
+        }
+        detalles = {
+            "categoria": Categoria, "marca": Marca, "unidadmedida": UnidadMedida, "proveedor": Proveedor,
+            "producto": Producto, "productoproveedor": ProductoProveedor, "bodega": Bodega, "stock": Stock,
+            "stocklote": StockLote, "kardex": Kardex, "alertareposicion": AlertaReposicion,
+            "movimientoentrada": MovimientoEntrada, "movimientosalida": MovimientoSalida,
+            "movimientotransferencia": MovimientoTransferencia,
+        }
+        rutas.update({f"{base}-detail": reverse(f"{base}-detail", args=[ultimo(m)]) for base, m in detalles.items()})
+        categoria = ultimo(Categoria)
+        rutas.update({
+            "resumeninventario-detail": reverse(
+                "resumeninventario-detail", args=[ultimo(ResumenInventario, dimension=ResumenInventario.Dimension.TOTAL)]
+            ),
+            "categoria-ancestros": reverse("categoria-ancestros", args=[categoria]),
+            "categoria-descendientes": reverse("categoria-descendientes", args=[categoria]),
+            "producto-buscar": reverse("producto-buscar") + "?q=producto",
+            "producto-codigo": reverse("producto-codigo") + f"?codigo={producto.codigo_barra}",
+            "stock-a-fecha": reverse("stock-a-fecha") + f"?bodega={bodega.pk}&fecha={timezone.localdate()}",
+            "stocklote-por-vencer": reverse("stocklote-por-vencer") + "?dias=30",
+            "sync": reverse("sync"),
+        })
+        return rutas
+
+    def medir(self, producto, bodega):
+        queries = {}
+        for ruta, url in self.rutas(producto, bodega).items():
+            with override_settings(BODEGA_PRESUPUESTO_QUERIES={}):  # el request frío no se mide ni avisa
+                self.client.get(url)  # caches de referencia y de códigos ya cargadas, como en régimen
+            with presupuesto(presupuesto_de(ruta), f"GET {url} ({ruta})") as medicion:
+                respuesta = self.client.get(url)
+            self.assertEqual(respuesta.status_code, 200, f"{url}: {respuesta.content[:200]}")
+            queries[ruta] = medicion.queries
+        return queries
+
+    def test_queries_no_dependen_de_las_filas(self):
+        pocas = self.medir(*cargar(2, "A"))
+        muchas = self.medir(*cargar(12, "B"))
+        for ruta in pocas:
+            with self.subTest(ruta=ruta):
+                self.assertEqual(pocas[ruta], muchas[ruta])
+        self.assertTrue(AlertaReposicion.objects.exists() and ResumenInventario.objects.exists())
+
+
+class IndicesTests(TestCase):
+    def test_filtros_usan_indices(self):
+        # lo mismo que manage.py verificar_indices: un SCAN en un listado filtrado falla
+        consultas = [(vista, params) for _, vista, _ in router.registry for params in getattr(vista, "consultas_indexadas", ())]
+        self.assertTrue(consultas)
+        for vista, params in consultas:
+            with self.subTest(vista=vista.__name__, params=params):
+                verificar_indices(vista, params)
+
+
+def datos_base():
+    um = UnidadMedida.objects.create(nombre="Kilogramo", simbolo="kg")
+    bodega = Bodega.objects.create(nombre="Central")
+    producto = Producto.objects.create(sku="P-1", nombre="Producto 1", unidad_medida=um)
+    return bodega, producto
+
+
+def movimiento(modelo, bodega, producto, cantidad, destino=None, **linea):
+    mov = modelo.objects.create(bodega=bodega, **({"bodega_destino": destino} if destino else {}))
+    fk = {
+        MovimientoEntrada: "movimiento_entrada", MovimientoSalida: "movimiento_salida",
+        MovimientoTransferencia: "movimiento_transferencia",
+    }[modelo]
+    MovimientoLinea.objects.create(producto=producto, cantidad=Decimal(cantidad), **{fk: mov}, **linea)
+    return mov
+
+
+class PosteoTests(TestCase):
+    def setUp(self):
+        self.bodega, self.producto = datos_base()
+
+    def stock(self):
+        return Stock.objects.get(bodega=self.bodega, producto=self.producto)
+
+    def test_fracciones_suman_exacto(self):
+        # 0.7 + 0.1 en binario es 0.7999999999999999: la salida de 0.8 no debe quedar bajo cero
+        movimiento(MovimientoEntrada, self.bodega, self.producto, "0.700", lote="A").postear()
+        movimiento(MovimientoEntrada, self.bodega, self.producto, "0.100", lote="A").postear()
+        movimiento(MovimientoSalida, self.bodega, self.producto, "0.800").postear()
+
+        self.assertEqual(self.stock().cantidad, Decimal("0"))
+        saldos = list(Kardex.objects.filter(producto=self.producto).order_by("id").values_list("saldo", flat=True))
+        self.assertEqual(saldos, [Decimal("0.7"), Decimal("0.8"), Decimal("0")])
+        self.assertEqual(StockLote.objects.get(producto=self.producto, lote="A").cantidad, Decimal("0"))
+
+    def test_postear_lote_fracciones(self):
+        entradas = [movimiento(MovimientoEntrada, self.bodega, self.producto, c).pk for c in ("0.700", "0.100")]
+        salida = movimiento(MovimientoSalida, self.bodega, self.producto, "0.800").pk
+
+        r = self.client.post(reverse("postear-lote"), {"entradas": entradas, "salidas": [salida]},
+                             content_type="application/json")
+
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual((r.json()["posteados"], r.json()["rechazados"]), (3, 0))
+        # el lote se escribe neto (0.7 + 0.1 - 0.8 = 0): el kardex queda con el saldo de cada paso
+        self.assertEqual(Kardex.objects.filter(producto=self.producto).latest("id").saldo, Decimal("0"))
+        self.assertEqual(Stock.objects.filter(producto=self.producto, cantidad__gt=0).count(), 0)
+
+    def test_salida_sin_stock_se_rechaza(self):
+        movimiento(MovimientoEntrada, self.bodega, self.producto, "0.100").postear()
+        salida = movimiento(MovimientoSalida, self.bodega, self.producto, "0.800")
+
+        r = self.client.post(reverse("postear-lote"), {"salidas": [salida.pk]}, content_type="application/json")
+
+        self.assertEqual(r.json()["rechazados"], 1)
+        self.assertIn("Stock insuficiente", r.json()["salidas"][0]["detail"])
+        self.assertEqual(self.stock().cantidad, Decimal("0.1"))
+
+
+class ConflictoVersionTests(TestCase):
+    def setUp(self):
+        self.bodega, self.producto = datos_base()
+        movimiento(MovimientoEntrada, self.bodega, self.producto, "1.000").postear()
+        self.clave = (self.bodega.pk, self.producto.pk)
+
+    def test_version_vieja_levanta_conflicto(self):
+        leidas = bloquear_stock({self.clave})
+        # otro proceso mueve la fila entre la lectura y el UPDATE
+        aplicar_deltas_stock({self.clave: Decimal("0.5")})
+
+        with self.assertRaises(ConflictoStock):
+            aplicar_deltas_stock({self.clave: Decimal("-0.3")}, existentes=leidas)
+        self.assertEqual(Stock.objects.get().cantidad, Decimal("1.5"))
+
+    def test_con_reintentos_relee_y_aplica(self):
+        leidas = bloquear_stock({self.clave})
+        aplicar_deltas_stock({self.clave: Decimal("0.5")})
+        intentos, antes = [], dict(contadores_posteo)
+
+        def posteo():
+            # el primer intento usa la lectura vieja; el reintento vuelve a leer
+            intentos.append(1)
+            return aplicar_deltas_stock({self.clave: Decimal("-0.3")}, existentes=leidas if len(intentos) == 1 else None)
+
+        self.assertEqual(con_reintentos(posteo, espera=0), {self.clave: Decimal("1.2")})
+        self.assertEqual(len(intentos), 2)
+        self.assertEqual(contadores_posteo["reintentos"], antes["reintentos"] + 1)
+        self.assertEqual(Stock.objects.get().cantidad, Decimal("1.2"))
+
+    def test_con_reintentos_agota_intentos(self):
+        def siempre_choca():
+            raise ConflictoStock("El stock fue modificado por otro proceso; reintente.")
+
+        with self.assertRaises(ConflictoStock):
+            con_reintentos(siempre_choca, intentos=3, espera=0)
+
+
+class PorVencerTests(TestCase):
+    def test_orden_por_vencimiento_entre_paginas(self):
+        bodega, producto = datos_base()
+        hoy = timezone.localdate()
+        # ids en orden inverso al vencimiento: el Meta.ordering (bodega, producto, ...) no sirve de orden
+        for i, dias in enumerate((20, 15, 10, 5, -3)):
+            StockLote.objects.create(bodega=bodega, producto=producto, lote=f"L{i}",
+                                     vencimiento=hoy + timedelta(days=dias), cantidad=Decimal("1"))
+
+        vencimientos, url = [], reverse("stocklote-por-vencer") + "?dias=30&page_size=2"
+        while url:
+            datos = self.client.get(url).json()
+            vencimientos += [l["vencimiento"] for l in datos["results"]]
+            url = datos["next"]
+
+        esperado = [str(hoy + timedelta(days=d)) for d in (-3, 5, 10, 15, 20)]
+        self.assertEqual(vencimientos, esperado)
+
+
+class ReposicionPaginasTests(TestCase):
+    def test_recorre_todas_las_paginas(self):
+        bodega, producto = datos_base()
+        otra = Bodega.objects.create(nombre="Norte")
+        productos = [producto] + [
+            Producto.objects.create(sku=f"P-{i}", nombre=f"Producto {i}", unidad_medida=producto.unidad_medida)
+            for i in range(2, 4)
+        ]
+        Producto.objects.update(stock_minimo=Decimal("10"))
+        # alertas por bodega y totales (bodega nula) en la misma lista
+        for b in (bodega, otra):
+            for p in productos:
+                movimiento(MovimientoEntrada, b, p, "1").postear()
+        esperadas = set(AlertaReposicion.objects.values_list("pk", flat=True))
+        self.assertEqual(len(esperadas), 9)
+
+        vistas, url = [], reverse("alertareposicion-list") + "?page_size=2"
+        while url:
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200, r.content)
+            vistas += [a["id"] for a in r.json()["results"]]
+            url = r.json()["next"]
+
+        self.assertEqual(len(vistas), len(esperadas))
+        self.assertEqual(set(vistas), esperadas)
+
+    def test_cursor_no_se_posiciona_en_columna_nula(self):
+        self.assertEqual(PaginacionCursor().get_ordering(None, AlertaReposicion.objects.all(), None), ("id",))
+
+
+class PresupuestoPorMetodoTests(TestCase):
+    @override_settings(BODEGA_PRESUPUESTO_QUERIES={"marca-list": 0, ("marca-list", "PUT"): 0})
+    def test_escrituras_sin_presupuesto_propio_no_cuentan(self):
+        registro.limpiar()
+        with self.assertLogs("bodega", "WARNING"):
+            self.client.get(reverse("marca-list"))
+        self.client.post(reverse("marca-list"), {"nombre": "Nueva"}, content_type="application/json")
+
+        self.assertEqual(dict(registro.excedidos), {("marca-list", "GET"): 1})
+        self.assertEqual(presupuesto_de("marca-list", "PUT"), 0)
+
+
+class CacheReferenciaTests(TestCase):
+    def test_ve_cambios_de_otro_proceso_sin_cache_compartida(self):
+        marca = Marca.objects.create(nombre="Antes")
+        self.assertEqual(referencia(Marca).get(marca.pk), "Antes")
+
+        # otro worker renombra la marca: los signals de este proceso no se enteran
+        Marca.objects.filter(pk=marca.pk).update(nombre="Después", actualizado_en=timezone.now())
+        with mock.patch("bodega.cache.VERIFICAR_VERSION_CADA", -1):
+            self.assertEqual(referencia(Marca).get(marca.pk), "Después")
+
+
+class BusquedaTests(TestCase):
+    def test_rankea_todos_los_calces(self):
+        _, producto = datos_base()
+        producto.nombre = "Perno"
+        producto.save()
+        # calces más nuevos y menos relevantes (solo en la descripción) no desplazan al más antiguo
+        for i in range(30):
+            Producto.objects.create(sku=f"X-{i}", nombre=f"Otro {i}", descripcion="perno", unidad_medida=producto.unidad_medida)
+
+        if not busqueda.fts_disponible():
+            self.skipTest("SQLite sin FTS5")
+        self.assertEqual(busqueda.buscar("perno", 5)[0], producto.pk)
+        self.assertEqual(len(busqueda.buscar("perno", 100)), 31)
+
+
+class SyncMargenTests(TestCase):
+    def test_margen_por_defecto_cubre_lock_y_reintentos(self):
+        self.assertGreater(sync.margen(), timedelta(seconds=5))
+
+    @override_settings(BODEGA_SYNC_MARGEN_SEGUNDOS=60)
+    def test_fila_confirmada_tarde_entra_en_la_ventana_siguiente(self):
+        ahora = timezone.now()
+        token = sync.cambios()["siguiente"]  # ventana hasta ahora - 60 s
+        # una transacción larga: guardó hace 30 s y se confirma recién ahora
+        marca = Marca.objects.create(nombre="Tardía")
+        Marca.objects.filter(pk=marca.pk).update(actualizado_en=ahora - timedelta(seconds=30))
+
+        with mock.patch("django.utils.timezone.now", return_value=ahora + timedelta(seconds=61)):
+            respuesta = sync.cambios(token)
+        self.assertEqual([f["id"] for f in respuesta["cambios"]["marca"]], [marca.pk])
+
+
+class LineasBulkTests(TestCase):
+    def setUp(self):
+        self.bodega, self.producto = datos_base()
+
+    def crear(self, *cantidades):
+        lineas = [{"producto": self.producto.pk, "cantidad": c, "costo_unitario": "10"} for c in cantidades]
+        r = self.client.post(reverse("movimientoentrada-list"), {"bodega": self.bodega.pk, "lineas": lineas},
+                             content_type="application/json")
+        self.assertEqual(r.status_code, 201, r.content)
+        return r.json()["id"], [l["id"] for l in r.json()["lineas"]]
+
+    def actualizar(self, pk, lineas):
+        return self.client.patch(reverse("movimientoentrada-detail", args=[pk]), {"lineas": lineas},
+                                 content_type="application/json")
+
+    def test_update_conserva_ids_y_borra_omitidas(self):
+        pk, ids = self.crear("1", "2", "3")
+
+        r = self.actualizar(pk, [
+            {"id": ids[0], "producto": self.producto.pk, "cantidad": "1", "costo_unitario": "10"},
+            {"id": ids[1], "producto": self.producto.pk, "cantidad": "5", "costo_unitario": "10"},
+            {"producto": self.producto.pk, "cantidad": "7", "costo_unitario": "10"},
+        ])
+
+        self.assertEqual(r.status_code, 200, r.content)
+        lineas = dict(MovimientoLinea.objects.filter(movimiento_entrada_id=pk).values_list("id", "cantidad"))
+        self.assertEqual(lineas[ids[0]], Decimal("1"))
+        self.assertEqual(lineas[ids[1]], Decimal("5"))
+        self.assertNotIn(ids[2], lineas)
+        self.assertEqual(sorted(lineas.values()), [Decimal("1"), Decimal("5"), Decimal("7")])
+
+    def test_rechaza_linea_de_otro_movimiento(self):
+        pk, ids = self.crear("1")
+        _, ajenas = self.crear("9")
+
+        r = self.actualizar(pk, [{"id": ajenas[0], "producto": self.producto.pk, "cantidad": "2", "costo_unitario": "10"}])
+
+        self.assertEqual(r.status_code, 400)
+        self.assertIn("no pertenece a este movimiento", str(r.json()["lineas"]))
+        # nada cambió en ninguno de los dos movimientos
+        self.assertEqual(MovimientoLinea.objects.get(pk=ids[0]).cantidad, Decimal("1"))
+        self.assertEqual(MovimientoLinea.objects.get(pk=ajenas[0]).cantidad, Decimal("9"))
+
+    def test_queries_constantes_al_crecer_las_lineas(self):
+        conteos = []
+        for n in (3, 30):
+            pk, ids = self.crear(*["1"] * (n + 1))
+            # cambia todas, borra una y agrega otra
+            lineas = [{"id": i, "producto": self.producto.pk, "cantidad": "2", "costo_unitario": "10"} for i in ids[1:]]
+            lineas.append({"producto": self.producto.pk, "cantidad": "3", "costo_unitario": "10"})
+            with presupuesto(100) as medicion:
+                r = self.actualizar(pk, lineas)
+            self.assertEqual(r.status_code, 200, r.content)
+            self.assertEqual(MovimientoLinea.objects.filter(movimiento_entrada_id=pk).count(), n + 1)
+            conteos.append(medicion.queries)
+
+        self.assertEqual(conteos[0], conteos[1])
+
+
+class ImportacionTests(TestCase):
+    def test_errores_por_fila(self):
+        filas = [
+            {"sku": "A-1", "nombre": "Perno", "unidad_medida": "kg", "stock_minimo": "5,5"},
+            {"sku": "A-2", "nombre": "Tuerca", "unidad_medida": "kg", "stock_minimo": "abc"},
+            {"sku": "A-3", "nombre": "Golilla", "unidad_medida": "kg", "stock_minimo": "1e20"},
+            {"sku": "A-4", "nombre": "Arandela", "unidad_medida": "kg", "costo_promedio": "1.999"},
+            {"sku": "A-1", "nombre": "Perno repetido", "unidad_medida": "kg"},
+            {"sku": "A-5", "nombre": "x" * 201, "unidad_medida": "kg"},
+        ]
+
+        r = self.client.post(reverse("producto-importar"), filas, content_type="application/json")
+
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual((r.json()["creados"], r.json()["actualizados"]), (1, 0))
+        errores = {e["fila"]: e["error"] for e in r.json()["errores"]}
+        self.assertEqual(sorted(errores), [2, 3, 4, 5, 6])
+        self.assertIn("stock_minimo", errores[3])
+        self.assertIn("costo_promedio", errores[4])
+        self.assertIn("duplicado", errores[5])
+        self.assertIn("nombre", errores[6])
+        producto = Producto.objects.get()
+        self.assertEqual((producto.sku, producto.stock_minimo), ("A-1", Decimal("5.5")))
+
+
+class CostoPromedioTests(TestCase):
+    def setUp(self):
+        self.bodega, self.producto = datos_base()
+        self.proveedor = Proveedor.objects.create(nombre="Proveedor 1")
+
+    def entrada(self, cantidad, costo):
+        mov = movimiento(MovimientoEntrada, self.bodega, self.producto, cantidad, costo_unitario=Decimal(costo))
+        mov.proveedor = self.proveedor
+        mov.save()
+        mov.postear()
+
+    def costos(self):
+        self.producto.refresh_from_db()
+        ultima = ProductoProveedor.objects.get(producto=self.producto, proveedor=self.proveedor).costo_ultima_compra
+        return self.producto.costo_promedio, ultima
+
+    def test_promedio_ponderado_y_ultima_compra(self):
+        self.entrada("10", "100")
+        self.entrada("10", "200")
+        self.assertEqual(self.costos(), (Decimal("150"), Decimal("200")))
+
+        # una línea a costo 0 entra al promedio vigente y no es una compra
+        self.entrada("10", "0")
+        self.assertEqual(self.costos(), (Decimal("150"), Decimal("200")))
+
+        # la salida baja el stock sobre el que pondera la entrada siguiente: (25 * 150 + 5 * 300) / 30
+        movimiento(MovimientoSalida, self.bodega, self.producto, "5").postear()
+        self.entrada("5", "300")
+        self.assertEqual(self.costos(), (Decimal("175"), Decimal("300")))
+
+    def test_recalcular_costos_reproduce_el_posteo(self):
+        for cantidad, costo in (("10", "100"), ("10", "200"), ("4", "0")):
+            self.entrada(cantidad, costo)
+        movimiento(MovimientoSalida, self.bodega, self.producto, "7").postear()
+        self.entrada("3", "133.33")
+        incremental = self.costos()
+
+        Producto.objects.update(costo_promedio=0)
+        ProductoProveedor.objects.update(costo_ultima_compra=0)
+        call_command("recalcular_costos", stdout=io.StringIO())
+
+        self.assertEqual(self.costos(), incremental)
+
+
+class LotesTests(TestCase):
+    def setUp(self):
+        self.bodega, self.producto = datos_base()
+        hoy = timezone.localdate()
+        self.vence = {"A": hoy + timedelta(days=20), "B": hoy + timedelta(days=5)}
+        for lote in ("A", "B"):
+            movimiento(MovimientoEntrada, self.bodega, self.producto, "5", lote=lote, vencimiento=self.vence[lote]).postear()
+
+    def saldos(self, bodega):
+        return dict(StockLote.objects.filter(bodega=bodega, producto=self.producto).values_list("lote", "cantidad"))
+
+    def test_salida_sin_lote_se_reparte_fefo_y_divide_la_linea(self):
+        salida = movimiento(MovimientoSalida, self.bodega, self.producto, "7")
+        original = salida.lineas.get().pk
+        salida.postear()
+
+        lineas = list(salida.lineas.order_by("id").values_list("id", "lote", "cantidad", "vencimiento"))
+        # la línea original queda con el lote que vence primero; el resto es una línea nueva
+        self.assertEqual(lineas, [
+            (original, "B", Decimal("5"), self.vence["B"]),
+            (lineas[1][0], "A", Decimal("2"), self.vence["A"]),
+        ])
+        self.assertEqual(self.saldos(self.bodega), {"A": Decimal("3"), "B": Decimal("0")})
+
+    def test_salida_con_lote_descuenta_ese_lote(self):
+        movimiento(MovimientoSalida, self.bodega, self.producto, "2", lote="A").postear()
+
+        self.assertEqual(self.saldos(self.bodega), {"A": Decimal("3"), "B": Decimal("5")})
+
+    def test_transferencia_lleva_los_lotes_al_destino(self):
+        destino = Bodega.objects.create(nombre="Norte")
+        movimiento(MovimientoTransferencia, self.bodega, self.producto, "6", destino=destino).postear()
+
+        self.assertEqual(self.saldos(self.bodega), {"A": Decimal("4"), "B": Decimal("0")})
+        self.assertEqual(self.saldos(destino), {"A": Decimal("1"), "B": Decimal("5")})
+        vencimientos = dict(StockLote.objects.filter(bodega=destino).values_list("lote", "vencimiento"))
+        self.assertEqual(vencimientos, self.vence)
+
+
+class KardexCierreTests(TestCase):
+    def setUp(self):
+        self.bodega, self.producto = datos_base()
+        self.ahora = timezone.now()
+
+    def postear(self, modelo, cantidad, dias):
+        mov = movimiento(modelo, self.bodega, self.producto, cantidad)
+        mov.fecha = self.ahora - timedelta(days=dias)
+        mov.save()
+        mov.postear()
+
+    def a_fecha(self, dias):
+        return stock_a_fecha(self.bodega.pk, self.ahora - timedelta(days=dias)).get(producto=self.producto).cantidad_a_fecha
+
+    def test_kardex_con_fecha_del_movimiento(self):
+        self.postear(MovimientoEntrada, "10", dias=10)
+        self.postear(MovimientoEntrada, "5", dias=2)
+
+        fechas = list(Kardex.objects.order_by("id").values_list("fecha", flat=True))
+        self.assertEqual(fechas, [self.ahora - timedelta(days=10), self.ahora - timedelta(days=2)])
+        self.assertEqual([self.a_fecha(11), self.a_fecha(5), self.a_fecha(0)], [0, 10, 15])
+
+    def test_a_fecha_antes_y_despues_de_un_cierre(self):
+        self.postear(MovimientoEntrada, "10", dias=10)
+        self.postear(MovimientoEntrada, "5", dias=2)
+        call_command("cerrar_kardex", fecha=(self.ahora - timedelta(days=5)).isoformat(), stdout=io.StringIO())
+        self.assertEqual(KardexCierre.objects.get().saldo, Decimal("10"))
+
+        # el cierre es el punto de partida: después de él solo se suma el kardex posterior
+        KardexCierre.objects.update(saldo=Decimal("100"))
+        self.assertEqual([self.a_fecha(11), self.a_fecha(5), self.a_fecha(0)], [0, 100, 105])
+
+    def test_movimiento_atrasado_corrige_el_cierre(self):
+        self.postear(MovimientoEntrada, "10", dias=10)
+        self.postear(MovimientoEntrada, "5", dias=2)
+        call_command("cerrar_kardex", fecha=(self.ahora - timedelta(days=5)).isoformat(), stdout=io.StringIO())
+
+        # se postea hoy una salida fechada antes del cierre
+        self.postear(MovimientoSalida, "3", dias=8)
+
+        self.assertEqual(KardexCierre.objects.get().saldo, Decimal("7"))
+        self.assertEqual([self.a_fecha(9), self.a_fecha(5), self.a_fecha(0)], [10, 7, 12])
+        self.assertEqual(Stock.objects.get().cantidad, Decimal("12"))
+
+
+class CondicionalTests(TestCase):
+    def setUp(self):
+        self.bodega, self.producto = datos_base()
+        self.categoria = Categoria.objects.create(nombre="Ferretería")
+        self.producto.categorias.add(self.categoria)
+        self.url = reverse("producto-list")
+
+    def etag(self):
+        r = self.client.get(self.url)
+        self.assertEqual(r.status_code, 200)
+        return r["ETag"]
+
+    def test_304_con_la_misma_version(self):
+        r = self.client.get(self.url)
+        etag, modificado = r["ETag"], r["Last-Modified"]
+
+        r = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(r["ETag"], etag)
+        self.assertEqual(self.client.get(self.url, headers={"If-Modified-Since": modificado}).status_code, 304)
+        # otros query params son otra versión
+        self.assertEqual(self.client.get(self.url + "?page_size=1", headers={"If-None-Match": etag}).status_code, 200)
+
+    def test_etag_cambia_con_lo_que_muestra_el_listado(self):
+        otro = Producto.objects.create(sku="P-2", nombre="Producto 2", unidad_medida=self.producto.unidad_medida)
+        vistos = [self.etag()]
+
+        self.categoria.nombre = "Herramientas"
+        self.categoria.save()
+        vistos.append(self.etag())
+
+        unidad = self.producto.unidad_medida
+        unidad.nombre = "Kilo"
+        unidad.save()
+        vistos.append(self.etag())
+
+        # el posteo cambia costo_promedio sin pasar por Producto.save()
+        movimiento(MovimientoEntrada, self.bodega, self.producto, "2", costo_unitario=Decimal("10")).postear()
+        vistos.append(self.etag())
+
+        # un borrado no mueve max(actualizado_en), sí el count
+        otro.delete()
+        vistos.append(self.etag())
+
+        self.assertEqual(len(set(vistos)), len(vistos))
+        r = self.client.get(self.url, headers={"If-None-Match": vistos[0]})
+        producto = r.json()["results"][0]
+        self.assertEqual((producto["unidad_medida_nombre"], producto["costo_promedio"]), ("Kilo", "10.00"))
+        self.assertEqual(producto["categorias_detalle"][0]["nombre"], "Herramientas")
+
+
+class LecturaRapidaTests(TestCase):
+    def setUp(self):
+        bodega, producto = datos_base()
+        destino = Bodega.objects.create(nombre="Norte")
+        proveedor = Proveedor.objects.create(nombre="Ñandú Ltda.")
+        # decimales con redondeo, costo 0, lote y vencimiento vacíos, proveedor nulo y con nombre
+        entrada = movimiento(MovimientoEntrada, bodega, producto, "0.700", costo_unitario=Decimal("1234.5"),
+                             lote="A", vencimiento=timezone.localdate() + timedelta(days=3), observacion="línea «1»")
+        MovimientoLinea.objects.create(movimiento_entrada=entrada, producto=producto, cantidad=Decimal("2.125"))
+        entrada.postear()
+        con_proveedor = movimiento(MovimientoEntrada, bodega, producto, "1", costo_unitario=Decimal("0.01"))
+        con_proveedor.proveedor = proveedor
+        con_proveedor.save()
+        movimiento(MovimientoSalida, bodega, producto, "0.1").postear()
+        movimiento(MovimientoTransferencia, bodega, producto, "0.5", destino=destino).postear()
+
+    def test_misma_salida_que_los_serializers(self):
+        urls = [
+            reverse("stock-list"), reverse("stock-list") + "?fields=id,cantidad,producto_sku",
+            reverse("stock-list") + "?page_size=1",
+        ]
+        for ruta in ("movimientoentrada-list", "movimientosalida-list", "movimientotransferencia-list"):
+            urls += [
+                reverse(ruta), reverse(ruta) + "?page_size=1", reverse(ruta) + "?fields=id,fecha,bodega_nombre",
+                reverse(ruta) + "?fields=id&expand=lineas",
+            ]
+        urls.append(reverse("movimientoentrada-list") + "?fields=id,proveedor,proveedor_nombre")
+
+        for url in urls:
+            with self.subTest(url=url), mock.patch.object(LecturaRapida, "filas", autospec=True,
+                                                          side_effect=LecturaRapida.filas) as filas:
+                rapida = self.client.get(url)
+                llamadas = filas.call_count
+                with override_settings(BODEGA_LECTURA_RAPIDA=False):
+                    drf = self.client.get(url)
+                self.assertGreater(llamadas, 0)
+                self.assertEqual(filas.call_count, llamadas)  # la segunda pasó por DRF
+                self.assertEqual(rapida.status_code, 200)
+                self.assertEqual(rapida.content, drf.content)
+
+
+class CategoriaArbolTests(TestCase):
+    def setUp(self):
+        _, producto = datos_base()
+        self.a = Categoria.objects.create(nombre="A")
+        self.b = Categoria.objects.create(nombre="B", padre=self.a)
+        self.c = Categoria.objects.create(nombre="C", padre=self.b)
+        self.d = Categoria.objects.create(nombre="D")
+        for i, categoria in enumerate((self.a, self.b, self.c, self.d)):
+            p = Producto.objects.create(sku=f"C-{i}", nombre=f"Producto {i}", unidad_medida=producto.unidad_medida)
+            p.categorias.add(categoria)
+
+    def subarbol(self, pk):
+        # recorrido recursivo por padre, sin la closure table
+        ids = {pk}
+        for hijo in Categoria.objects.filter(padre_id=pk).values_list("id", flat=True):
+            ids |= self.subarbol(hijo)
+        return ids
+
+    def verificar(self):
+        filas = set(CategoriaArbol.objects.values_list("ancestro_id", "descendiente_id", "profundidad"))
+        CategoriaArbol.reconstruir()
+        self.assertEqual(filas, set(CategoriaArbol.objects.values_list("ancestro_id", "descendiente_id", "profundidad")))
+
+        for categoria in Categoria.objects.all():
+            r = self.client.get(reverse("producto-list") + f"?categoria_descendiente={categoria.pk}&page_size=100")
+            esperados = set(Producto.objects.filter(categorias__in=self.subarbol(categoria.pk)).values_list("id", flat=True))
+            self.assertEqual({p["id"] for p in r.json()["results"]}, esperados, categoria.nombre)
+
+    def test_alta(self):
+        self.verificar()
+        self.assertEqual(CategoriaArbol.objects.get(ancestro=self.a, descendiente=self.c).profundidad, 2)
+
+    def test_mover_subarbol(self):
+        self.b.padre = self.d
+        self.b.save()
+        self.verificar()
+        self.assertFalse(CategoriaArbol.objects.filter(ancestro=self.a, descendiente=self.c).exists())
+
+        # y de vuelta a raíz
+        self.b.padre = None
+        self.b.save()
+        self.verificar()
+
+    def test_borrar_deja_hijos_como_raices(self):
+        self.b.delete()
+        self.c.refresh_from_db()
+        self.assertIsNone(self.c.padre_id)
+        self.verificar()
+
+    def test_rechaza_ciclos(self):
+        for padre in (self.a, self.c):
+            r = self.client.patch(reverse("categoria-detail", args=[self.a.pk]), {"padre": padre.pk},
+                                  content_type="application/json")
+            self.assertEqual(r.status_code, 400)
+        self.a.refresh_from_db()
+        self.assertIsNone(self.a.padre_id)
+        self.verificar()
+
+
+class TransferenciaTests(TestCase):
+    def setUp(self):
+        self.origen, self.producto = datos_base()
+        self.destino = Bodega.objects.create(nombre="Norte")
+        hoy = timezone.localdate()
+        self.vence = {"A": hoy + timedelta(days=20), "B": hoy + timedelta(days=5)}
+        for lote in ("A", "B"):
+            movimiento(MovimientoEntrada, self.origen, self.producto, "5", lote=lote, vencimiento=self.vence[lote]).postear()
+
+    def crear(self, cantidad):
+        r = self.client.post(reverse("movimientotransferencia-list"), {
+            "bodega": self.origen.pk, "bodega_destino": self.destino.pk,
+            "lineas": [{"producto": self.producto.pk, "cantidad": cantidad}],
+        }, content_type="application/json")
+        self.assertEqual(r.status_code, 201, r.content)
+        return r.json()["id"]
+
+    def postear(self, pk):
+        return self.client.post(reverse("movimientotransferencia-postear", args=[pk]))
+
+    def stock(self):
+        return dict(Stock.objects.filter(producto=self.producto).values_list("bodega_id", "cantidad"))
+
+    def test_postear_mueve_stock_lotes_y_kardex(self):
+        pk = self.crear("6")
+
+        r = self.postear(pk)
+
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual(r.json()["estado"], "POSTEADO")
+        self.assertEqual(self.stock(), {self.origen.pk: Decimal("4"), self.destino.pk: Decimal("6")})
+        kardex = set(Kardex.objects.filter(tipo=Kardex.Tipo.TRANSFERENCIA, movimiento_id=pk)
+                     .values_list("bodega_id", "delta", "saldo"))
+        self.assertEqual(kardex, {(self.origen.pk, Decimal("-6"), Decimal("4")), (self.destino.pk, Decimal("6"), Decimal("6"))})
+        lotes = set(StockLote.objects.filter(bodega=self.destino).values_list("lote", "vencimiento", "cantidad"))
+        self.assertEqual(lotes, {("B", self.vence["B"], Decimal("5")), ("A", self.vence["A"], Decimal("1"))})
+
+        # ya posteada: ni se vuelve a postear ni se edita
+        self.assertEqual(self.postear(pk).status_code, 400)
+        r = self.client.patch(reverse("movimientotransferencia-detail", args=[pk]), {"referencia": "x"},
+                              content_type="application/json")
+        self.assertEqual(r.status_code, 400)
+
+    def test_stock_insuficiente(self):
+        pk = self.crear("11")
+
+        r = self.postear(pk)
+
+        self.assertEqual(r.status_code, 400)
+        self.assertIn("Stock insuficiente", r.json()["detail"])
+        self.assertEqual(self.stock(), {self.origen.pk: Decimal("10")})
+        self.assertEqual(MovimientoTransferencia.objects.get(pk=pk).estado, "BORRADOR")
+        self.assertFalse(Kardex.objects.filter(tipo=Kardex.Tipo.TRANSFERENCIA).exists())
+
+    def test_conflicto_agotado_es_409(self):
+        pk = self.crear("1")
+        with mock.patch.object(MovimientoTransferencia, "postear", side_effect=ConflictoStock("reintente")):
+            r = self.postear(pk)
+        self.assertEqual(r.status_code, 409)
+
+
+class ExportacionTests(TestCase):
+    def setUp(self):
+        self.bodega, self.producto = datos_base()
+        self.otra = Bodega.objects.create(nombre="Norte")
+        for bodega, cantidad in ((self.bodega, "1.500"), (self.otra, "2")):
+            movimiento(MovimientoEntrada, bodega, self.producto, cantidad, costo_unitario=Decimal("10")).postear()
+
+    def exportar(self, url):
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        return r, b"".join(r.streaming_content).decode()
+
+    def test_csv_de_stock_con_filtros(self):
+        r, contenido = self.exportar(reverse("stock-list") + f"?format=csv&bodega={self.otra.pk}")
+
+        self.assertTrue(r["Content-Type"].startswith("text/csv"))
+        self.assertEqual(r["Content-Disposition"], 'attachment; filename="stock.csv"')
+        filas = list(csv.reader(io.StringIO(contenido)))
+        self.assertEqual(filas[0], ["id", "bodega", "bodega_nombre", "producto", "producto_sku", "producto_nombre",
+                                    "cantidad", "actualizado_en"])
+        stock = Stock.objects.get(bodega=self.otra)
+        self.assertEqual(filas[1][:7], [str(stock.pk), str(self.otra.pk), "Norte", str(self.producto.pk), "P-1",
+                                        "Producto 1", "2.000"])
+        self.assertEqual(len(filas), 2)
+
+    def test_ndjson_de_stock_y_de_lineas(self):
+        _, contenido = self.exportar(reverse("stock-list") + "?format=ndjson")
+        filas = [json.loads(l) for l in contenido.splitlines()]
+        self.assertEqual([f["id"] for f in filas], sorted(Stock.objects.values_list("id", flat=True)))
+        self.assertEqual([f["cantidad"] for f in filas], ["1.500", "2.000"])
+
+        # los movimientos exportan una fila por línea
+        _, contenido = self.exportar(reverse("movimientoentrada-list") + f"?format=ndjson&bodega={self.bodega.pk}")
+        filas = [json.loads(l) for l in contenido.splitlines()]
+        self.assertEqual(len(filas), 1)
+        self.assertEqual((filas[0]["bodega"], filas[0]["estado"], filas[0]["cantidad"], filas[0]["costo_unitario"]),
+                         ("Central", "POSTEADO", "1.500", "10.00"))
+
+
+class AlertaReposicionTests(TestCase):
+    def setUp(self):
+        self.b1, self.producto = datos_base()
+        self.b2 = Bodega.objects.create(nombre="Norte")
+        self.producto.stock_minimo, self.producto.stock_maximo = Decimal("10"), Decimal("30")
+        self.producto.save()
+
+    def alertas(self):
+        return {
+            a.bodega_id: (a.cantidad, a.faltante, a.sugerido)
+            for a in AlertaReposicion.objects.filter(producto=self.producto)
+        }
+
+    def test_por_bodega_y_total(self):
+        movimiento(MovimientoEntrada, self.b1, self.producto, "4").postear()
+        movimiento(MovimientoEntrada, self.b2, self.producto, "8").postear()
+        # cada bodega bajo el mínimo, el total (12) no
+        self.assertEqual(self.alertas(), {
+            self.b1.pk: (Decimal("4"), Decimal("6"), Decimal("26")),
+            self.b2.pk: (Decimal("8"), Decimal("2"), Decimal("22")),
+        })
+
+        movimiento(MovimientoSalida, self.b2, self.producto, "3").postear()
+        self.assertEqual(self.alertas()[None], (Decimal("9"), Decimal("1"), Decimal("21")))
+
+        totales = self.client.get(reverse("alertareposicion-list") + "?total=1").json()["results"]
+        self.assertEqual([a["bodega"] for a in totales], [None])
+        de_b2 = self.client.get(reverse("alertareposicion-list") + f"?bodega={self.b2.pk}").json()["results"]
+        self.assertEqual([a["bodega"] for a in de_b2], [self.b2.pk])
+
+    def test_se_limpia_al_recuperar_stock(self):
+        movimiento(MovimientoEntrada, self.b1, self.producto, "4").postear()
+        self.assertEqual(set(self.alertas()), {self.b1.pk, None})
+
+        movimiento(MovimientoEntrada, self.b1, self.producto, "6").postear()
+        self.assertEqual(self.alertas(), {})
+
+    def test_cambio_de_minimo_o_producto_inactivo(self):
+        movimiento(MovimientoEntrada, self.b1, self.producto, "4").postear()
+
+        self.producto.stock_minimo = Decimal("3")
+        self.producto.save()
+        self.assertEqual(self.alertas(), {})
+
+        self.producto.stock_minimo = Decimal("10")
+        self.producto.save()
+        self.assertEqual(set(self.alertas()), {self.b1.pk, None})
+
+        self.producto.activo = False
+        self.producto.save()
+        self.assertEqual(self.alertas(), {})
+
+
+# dentro de TestCase la LRU no guarda: cada lectura cuesta más que el presupuesto del endpoint
+@override_settings(BODEGA_PRESUPUESTO_QUERIES={})
+class CodigosTests(TestCase):
+    def setUp(self):
+        self.bodega, self.producto = datos_base()
+        self.producto.codigo_barra = "012345678905"  # UPC-A
+        self.producto.save()
+
+    def buscar(self, codigo):
+        return self.client.get(reverse("producto-codigo"), {"codigo": codigo})
+
+    def test_normalizar_codigo(self):
+        self.assertEqual(normalizar_codigo(" 7801234 567890 "), "07801234567890")
+        self.assertEqual(normalizar_codigo("012345678905"), normalizar_codigo("0012345678905"))
+        self.assertEqual(normalizar_codigo("12345"), "12345")  # no es GTIN: sin relleno
+        self.assertEqual(normalizar_codigo("ab-1 x"), "AB-1X")
+        self.assertEqual(normalizar_codigo(None), "")
+
+    def test_busca_por_sku_y_codigo_de_barra(self):
+        movimiento(MovimientoEntrada, self.bodega, self.producto, "5").postear()
+
+        res = self.buscar("0012345678905")  # el mismo código leído como EAN-13
+        self.assertEqual(res.status_code, 200)
+        [encontrado] = res.json()
+        self.assertEqual((encontrado["id"], encontrado["coincide"]), (self.producto.pk, "BARRA"))
+        self.assertEqual(encontrado["stock"], [{"bodega": self.bodega.pk, "bodega_nombre": "Central", "cantidad": "5.000"}])
+        self.assertEqual(self.buscar(" p-1 ").json()[0]["coincide"], "SKU")
+        self.assertEqual(self.buscar("").status_code, 400)
+        self.assertEqual(self.buscar("NO-EXISTE").status_code, 404)
+
+    def test_codigos_de_proveedor(self):
+        proveedor = Proveedor.objects.create(nombre="Proveedor")
+        vinculo = ProductoProveedor.objects.create(producto=self.producto, proveedor=proveedor, codigo_proveedor=" ab 12 ")
+        self.assertEqual(self.buscar("AB12").json()[0]["coincide"], "PROVEEDOR")
+
+        vinculo.codigo_proveedor = "CD-34"
+        vinculo.save()
+        self.assertEqual(self.buscar("AB12").status_code, 404)
+        self.assertEqual(self.buscar("cd-34").json()[0]["id"], self.producto.pk)
+
+        vinculo.delete()
+        self.assertEqual(self.buscar("CD-34").status_code, 404)
+        self.assertEqual(
+            set(CodigoProducto.objects.filter(producto=self.producto).values_list("tipo", flat=True)), {"SKU", "BARRA"}
+        )
+
+    def test_cambio_de_codigo_de_barra(self):
+        self.producto.codigo_barra = "7801234567890"
+        self.producto.save()
+        self.assertEqual(self.buscar("012345678905").status_code, 404)
+        self.assertEqual(self.buscar("7801234567890").json()[0]["id"], self.producto.pk)
+
+
+@mock.patch("bodega.cache.VERIFICAR_VERSION_CADA", 3600)
+class CacheCodigosTests(TransactionTestCase):
+    # fuera de TestCase: la LRU no guarda nada dentro de un bloque atómico
+    def setUp(self):
+        self.cargas = []
+
+    def cargar(self, codigo):
+        self.cargas.append(codigo)
+        return [codigo.lower()]
+
+    def test_lru(self):
+        cache = CacheCodigos(maximo=2)
+        for codigo in ["A", "B", "A", "C", "B", "A"]:
+            self.assertEqual(cache.get(codigo, self.cargar), [codigo.lower()])
+        # C desplaza a B (el menos usado); luego B desplaza a A
+        self.assertEqual(self.cargas, ["A", "B", "C", "B", "A"])
+        self.assertEqual(cache.estadisticas()["hits"], 1)
+        self.assertEqual(cache.estadisticas()["filas"], 2)
+
+    def test_invalidar(self):
+        cache = CacheCodigos(maximo=2)
+        cache.get("A", self.cargar)
+        cache.invalidar()
+        self.assertEqual(cache.estadisticas()["filas"], 0)
+        cache.get("A", self.cargar)
+        self.assertEqual(self.cargas, ["A", "A"])
+
+    def test_ve_codigos_de_otro_proceso_sin_cache_compartida(self):
+        cache = CacheCodigos(maximo=2)
+        _, producto = datos_base()
+        cache.get("X", self.cargar)
+
+        # otro worker sincroniza códigos: sus signals no llegan a este proceso
+        CodigoProducto.objects.create(codigo="X", tipo="BARRA", producto=producto)
+        cache.get("X", self.cargar)
+        self.assertEqual(self.cargas, ["X"])  # aún no revisa la versión
+        with mock.patch("bodega.cache.VERIFICAR_VERSION_CADA", -1):
+            cache.get("X", self.cargar)
+        self.assertEqual(self.cargas, ["X", "X"])
+
+    def test_signals_vacian_la_cache(self):
+        _, producto = datos_base()
+        codigos.invalidar()
+        CodigoProducto.buscar("P-1")
+        self.assertEqual(codigos.estadisticas()["filas"], 1)
+
+        proveedor = Proveedor.objects.create(nombre="Proveedor")
+        ProductoProveedor.objects.create(producto=producto, proveedor=proveedor, codigo_proveedor="AB12")
+        self.assertEqual(codigos.estadisticas()["filas"], 0)
+        self.assertEqual(CodigoProducto.buscar("AB12")[0]["id"], producto.pk)
+
+        CodigoProducto.buscar("P-1")
+        producto.unidad_medida.save()
+        self.assertEqual(codigos.estadisticas()["filas"], 0)
@@ -12,9 +12,18 @@ router.register(r"productos", ProductoViewSet)
 router.register(r"producto-proveedores", ProductoProveedorViewSet)
 router.register(r"bodegas", BodegaViewSet)
 router.register(r"stocks", StockViewSet)
+router.register(r"stock-lotes", StockLoteViewSet)
+router.register(r"kardex", KardexViewSet)
+router.register(r"reposicion", ReposicionViewSet)
+router.register(r"resumen-inventario", ResumenInventarioViewSet)
 router.register(r"movimientos-entrada", MovimientoEntradaViewSet)
 router.register(r"movimientos-salida", MovimientoSalidaViewSet)
+router.register(r"movimientos-transferencia", MovimientoTransferenciaViewSet)
 
 urlpatterns = [
+    path("cache-referencia/", CacheReferenciaView.as_view(), name="cache-referencia"),
+    path("movimientos/postear-lote/", PostearLoteView.as_view(), name="postear-lote"),
+    path("sync/", SyncView.as_view(), name="sync"),
+    path("metrics", metricas, name="metrics"),
     path("", include(router.urls)),
 ]
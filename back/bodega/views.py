@@ -1,16 +1,174 @@
+import hashlib
+
 from django.shortcuts import render
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, transaction
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Exists, OuterRef, Q, Sum
+from django.utils.http import http_date, parse_http_date_safe, parse_etags
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.settings import api_settings
+from django.http import HttpResponse, StreamingHttpResponse
 from .models import *
 from .serializers import *
+from .busqueda import buscar as buscar_productos
+from .cache import estadisticas as estadisticas_cache, referencia
+from .importacion import ImportadorProductos, leer_filas
+from .metricas import prometheus
+from . import planes
+from .filtros import Filtro, FiltrosMixin, booleano, desde, elegir, hasta, parse_fecha, texto
+from .sync import LIMITE_MAXIMO as SYNC_LIMITE_MAXIMO, TokenInvalido, TokenVencido, cambios as sync_cambios
+from .renderers import CSVRenderer, NDJSONRenderer, stream_csv, stream_ndjson
+
+class ExportacionMixin:
+    """
+    ?format=csv / ?format=ndjson en el listado: exportación en streaming desde
+    values_list().iterator(), sin instanciar modelos ni serializers.
+    La vista define export_columnas = [(columna, lookup), ...]; get_export_queryset()
+    es el queryset filtrado del listado salvo que la vista exporte otra cosa
+    (ej: una fila por línea de movimiento).
+    """
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, CSVRenderer, NDJSONRenderer]
+    export_columnas = ()
+    export_chunk_size = 2000
+
+    def get_export_queryset(self):
+        qs = self.filter_queryset(self.get_queryset())
+        return qs if qs.ordered else qs.order_by("pk")  # orden estable entre exportaciones
+
+    def list(self, request, *args, **kwargs):
+        formato = getattr(request.accepted_renderer, "format", None)
+        if formato not in ("csv", "ndjson"):
+            return super().list(request, *args, **kwargs)
+
+        columnas = [c for c, _ in self.export_columnas]
+        filas = (
+            self.get_export_queryset()
+            .values_list(*[l for _, l in self.export_columnas])
+            .iterator(chunk_size=self.export_chunk_size)
+        )
+        stream = stream_csv if formato == "csv" else stream_ndjson
+        response = StreamingHttpResponse(stream(columnas, filas), content_type=request.accepted_renderer.media_type)
+        nombre = f"{self.basename}.{formato}"
+        response["Content-Disposition"] = f'attachment; filename="{nombre}"'
+        return response
+
+class PlanConsultaMixin:
+    """
+    list/retrieve con el select_related / prefetch_related / only() derivado
+    de los campos del serializer (ver planes.py): la cantidad de queries no
+    depende de cuántas filas o líneas trae la página. Si el serializer admite
+    LecturaRapida, el listado se lee con values() y se serializa desde dicts.
+    Las escrituras y las acciones usan el queryset base.
+    """
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action in ("list", "retrieve"):
+            serializer = self.get_serializer()
+            ordering = getattr(self, "ordering", None) or qs.model._meta.ordering
+            rapida = self.action == "list" and getattr(settings, "BODEGA_LECTURA_RAPIDA", True)
+            lectura = LecturaRapida.compilar(serializer) if rapida else None
+            qs = lectura.queryset(qs, ordering) if lectura else planes.aplicar(qs, serializer, ordering)
+        return qs
+
+class CondicionalMixin:
+    """
+    GET condicional del listado para clientes que hacen polling: ETag y
+    Last-Modified salen de max(actualizado_en) y count sobre el queryset
+    filtrado, sin serializar; si el cliente ya tiene esa versión se responde
+    304. Con settings.BODEGA_CACHE_LISTADOS = "<alias de CACHES>" se
+    guarda además la respuesta serializada por ETag (que ya incluye la ruta, los
+    query params y el formato).
+
+    Un borrado sin otros cambios mueve el count (ETag) pero no la fecha, así que
+    If-Modified-Since solo se usa si el cliente no manda If-None-Match.
+    """
+    condicional_ttl = 300  # segundos en la cache de listados
+
+    def _version_listado(self, request):
+        # dos queries y no aggregate(Max, Count): solo el MAX suelto baja por el índice de actualizado_en
+        qs = self.filter_queryset(self.get_queryset()).order_by()
+        modificado = qs.order_by("-actualizado_en").values_list("actualizado_en", flat=True).first()
+        clave = "|".join([
+            request.path, request.GET.urlencode(), getattr(request.accepted_renderer, "format", ""),
+            str(modificado), str(qs.count()),
+        ])
+        return f'"{hashlib.md5(clave.encode()).hexdigest()}"', modificado
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+    @staticmethod
+    def _no_modificado(request, etag, modificado):
+        si_no_coincide = request.headers.get("If-None-Match")
+        if si_no_coincide:
+            return etag in parse_etags(si_no_coincide) or si_no_coincide.strip() == "*"
+        desde = parse_http_date_safe(request.headers.get("If-Modified-Since") or "")
+        return desde is not None and modificado is not None and int(modificado.timestamp()) <= desde
+
+    def list(self, request, *args, **kwargs):
+        etag, modificado = self._version_listado(request)
+        cabeceras = {"ETag": etag, "Cache-Control": "no-cache"}  # el navegador revalida siempre
+        if modificado is not None:
+            cabeceras["Last-Modified"] = http_date(modificado.timestamp())
+        if self._no_modificado(request, etag, modificado):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=cabeceras)
+
+        alias = getattr(settings, "BODEGA_CACHE_LISTADOS", None)
+        backend = caches[alias] if alias else None
+        data = backend.get(f"bodega:listado:{etag}") if backend is not None else None
+        if data is not None:
+            response = Response(data)
+        else:
+            response = super().list(request, *args, **kwargs)
+            if backend is not None and response.status_code == 200 and hasattr(response, "data"):
+                backend.set(f"bodega:listado:{etag}", response.data, self.condicional_ttl)
+        for k, v in cabeceras.items():
+            response[k] = v
+        return response
+
+class PosteoMixin:
+    """
+    POST <movimiento>/<id>/postear/: 400 si el movimiento no se puede postear
+    (estado, líneas, stock o lotes) y 409 si chocó con otro posteo en todos
+    los reintentos.
+    """
+
+    @action(detail=True, methods=["post"])
+    def postear(self, request, pk=None):
+        movimiento = self.get_object()
+
+        try:
+            movimiento.postear()
+        except ValidationError as e:
+            return Response({"detail": " ".join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+        except ConflictoStock as e:
+            return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+
+        serializer = self.get_serializer(movimiento)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+class CategoriaViewSet(CondicionalMixin, viewsets.ModelViewSet):
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
     # permission_classes = [IsAuthenticated]
 
+    @action(detail=True, methods=["get"])
+    def descendientes(self, request, pk=None):
+        # subárbol completo (incluye la categoría) en un solo query sobre la closure table
+        qs = Categoria.objects.filter(arbol_ancestros__ancestro_id=pk).order_by("arbol_ancestros__profundidad", "nombre")
+        return Response(self.get_serializer(qs, many=True).data)
+
+    @action(detail=True, methods=["get"])
+    def ancestros(self, request, pk=None):
+        # camino desde la raíz hasta la categoría
+        qs = Categoria.objects.filter(arbol_descendientes__descendiente_id=pk).order_by("-arbol_descendientes__profundidad")
+        return Response(self.get_serializer(qs, many=True).data)
+
 class MarcaViewSet(viewsets.ModelViewSet):
     queryset = Marca.objects.all()
     serializer_class = MarcaSerializer
@@ -26,13 +184,81 @@ class ProveedorViewSet(viewsets.ModelViewSet):
     serializer_class = ProveedorSerializer
     # permission_classes = [IsAuthenticated]
 
-class ProductoViewSet(viewsets.ModelViewSet):
-    queryset = Producto.objects.prefetch_related("categorias").select_related("marca", "unidad_medida")
+class ProductoViewSet(CondicionalMixin, PlanConsultaMixin, viewsets.ModelViewSet):
+    queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
     # permission_classes = [IsAuthenticated]
 
-class ProductoProveedorViewSet(viewsets.ModelViewSet):
-    queryset = ProductoProveedor.objects.select_related("producto", "proveedor")
+    def get_queryset(self):
+        qs = super().get_queryset()
+        # ?categoria_descendiente=X -> productos en X o cualquier subcategoría
+        categoria = self.request.query_params.get("categoria_descendiente")
+        if categoria and categoria.isdigit():
+            qs = qs.filter(Exists(
+                Producto.categorias.through.objects.filter(
+                    producto_id=OuterRef("pk"),
+                    categoria_id__in=CategoriaArbol.descendientes_ids(int(categoria)),
+                )
+            ))
+        return qs
+
+    @action(detail=False, methods=["get"])
+    def buscar(self, request):
+        # /productos/buscar/?q=torn hex&limite=20 -> sku, nombre, descripción, marca y categorías, por relevancia.
+        # Proyección liviana (un query + cache de nombres): se llama en cada tecla.
+        limite = request.query_params.get("limite", "")
+        limite = min(int(limite), 100) if limite.isdigit() and int(limite) > 0 else 20
+        ids = buscar_productos(request.query_params.get("q"), limite)
+        filas = {
+            f["id"]: f for f in self.get_queryset().filter(pk__in=ids)
+            .values("id", "sku", "nombre", "marca_id", "unidad_medida_id", "activo")
+        }
+        return Response([
+            {
+                "id": f["id"], "sku": f["sku"], "nombre": f["nombre"],
+                "marca": f["marca_id"], "marca_nombre": referencia(Marca).get(f["marca_id"]),
+                "unidad_medida_nombre": referencia(UnidadMedida).get(f["unidad_medida_id"]),
+                "activo": f["activo"],
+            }
+            for f in (filas[pk] for pk in ids if pk in filas)
+        ])
+
+    @action(detail=False, methods=["get"])
+    def codigo(self, request):
+        # /productos/codigo/?codigo=7801234567890 -> sku, código de barra o código de proveedor exacto
+        codigo = normalizar_codigo(request.query_params.get("codigo"))
+        if not codigo:
+            return Response({"detail": "Debe indicar un código."}, status=status.HTTP_400_BAD_REQUEST)
+        productos = CodigoProducto.buscar(codigo)
+        if not productos:
+            return Response({"detail": "Código no encontrado."}, status=status.HTTP_404_NOT_FOUND)
+        for p in productos:
+            p["stock"] = [
+                {"bodega": s["bodega"], "bodega_nombre": referencia(Bodega).get(s["bodega"]), "cantidad": str(s["cantidad"])}
+                for s in p["stock"]
+            ]
+        return Response(productos)
+
+    @action(detail=False, methods=["post"], parser_classes=[JSONParser, MultiPartParser])
+    def importar(self, request):
+        # JSON: lista de productos en el body; multipart: campo "archivo" (.csv o .json)
+        try:
+            if "archivo" in request.FILES:
+                archivo = request.FILES["archivo"]
+                formato = "json" if archivo.name.lower().endswith(".json") else "csv"
+                filas = leer_filas(archivo.read(), formato)
+            elif isinstance(request.data, list):
+                filas = request.data
+            else:
+                return Response({"detail": "Envíe una lista JSON o un archivo CSV/JSON en 'archivo'."}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        resultado = ImportadorProductos().importar(filas)
+        return Response(resultado, status=status.HTTP_200_OK)
+
+class ProductoProveedorViewSet(PlanConsultaMixin, viewsets.ModelViewSet):
+    queryset = ProductoProveedor.objects.all()
     serializer_class = ProductoProveedorSerializer
     # permission_classes = [IsAuthenticated]
 
@@ -41,41 +267,313 @@ class BodegaViewSet(viewsets.ModelViewSet):
     serializer_class = BodegaSerializer
     # permission_classes = [IsAuthenticated]
 
-class StockViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Stock.objects.select_related("bodega", "producto")
+class StockViewSet(ExportacionMixin, FiltrosMixin, PlanConsultaMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Stock.objects.all()
     serializer_class = StockSerializer
     # permission_classes = [IsAuthenticated]
+    filtros = {
+        "bodega": Filtro("bodega_id"),
+        "producto": Filtro("producto_id"),
+        "con_saldo": Filtro(lambda v: Q(cantidad__gt=0) if v else Q(cantidad=0), booleano),
+    }
+    ordenamientos = ("id", "actualizado_en")
+    # con_saldo solo no es selectivo (casi todo el stock tiene saldo): se recorre la tabla
+    consultas_indexadas = [
+        {"bodega": 1}, {"producto": 1}, {"bodega": 1, "producto": 1}, {"producto": 1, "con_saldo": 1},
+        {"bodega": 1, "con_saldo": 1},
+    ]
+    export_columnas = [
+        ("id", "id"),
+        ("bodega", "bodega_id"), ("bodega_nombre", "bodega__nombre"),
+        ("producto", "producto_id"), ("producto_sku", "producto__sku"), ("producto_nombre", "producto__nombre"),
+        ("cantidad", "cantidad"),
+        ("actualizado_en", "actualizado_en"),
+    ]
 
-class MovimientoEntradaViewSet(viewsets.ModelViewSet):
-    queryset = MovimientoEntrada.objects.select_related("bodega", "proveedor", "creado_por").prefetch_related("lineas")
-    serializer_class = MovimientoEntradaSerializer
+    @action(detail=False, methods=["get"], url_path="a-fecha")
+    def a_fecha(self, request):
+        # /stocks/a-fecha/?bodega=1&fecha=2026-01-31
+        bodega_id = request.query_params.get("bodega")
+        fecha = parse_fecha(request.query_params.get("fecha"))
+        if not (bodega_id or "").isdigit() or fecha is None:
+            return Response({"detail": "Debe indicar bodega y fecha válidas."}, status=status.HTTP_400_BAD_REQUEST)
+
+        qs = stock_a_fecha(int(bodega_id), fecha).select_related("producto")
+        page = self.paginate_queryset(qs)
+        serializer = StockAFechaSerializer(page if page is not None else qs, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+class StockLoteViewSet(PlanConsultaMixin, viewsets.ReadOnlyModelViewSet):
+    # lotes con saldo; ?bodega=<id>, ?producto=<id>
+    queryset = StockLote.objects.filter(cantidad__gt=0)
+    serializer_class = StockLoteSerializer
     # permission_classes = [IsAuthenticated]
 
-    @action(detail=True, methods=["post"])
-    def postear(self, request, pk=None):
-        movimiento = self.get_object()
+    def get_queryset(self):
+        qs = super().get_queryset()
+        for campo in ("bodega", "producto"):
+            valor = self.request.query_params.get(campo)
+            if valor and valor.isdigit():
+                qs = qs.filter(**{f"{campo}_id": int(valor)})
+        return qs
 
-        try:
-            movimiento.postear()
-        except Exception as e:
-            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    @property
+    def ordering(self):
+        # el cursor de por-vencer avanza por vencimiento (el que vence antes primero), no por Meta.ordering
+        return ("vencimiento", "id") if getattr(self, "action", None) == "por_vencer" else None
 
-        serializer = self.get_serializer(movimiento)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    @action(detail=False, methods=["get"], url_path="por-vencer")
+    def por_vencer(self, request):
+        # /stock-lotes/por-vencer/?dias=30&bodega=1 (incluye los ya vencidos)
+        dias = request.query_params.get("dias", "30")
+        bodega = request.query_params.get("bodega")
+        if not dias.isdigit() or (bodega and not bodega.isdigit()):
+            return Response({"detail": "dias y bodega deben ser enteros."}, status=status.HTTP_400_BAD_REQUEST)
+
+        qs = planes.aplicar(StockLote.por_vencer(int(dias), int(bodega) if bodega else None), self.get_serializer())
+        page = self.paginate_queryset(qs)
+        serializer = self.get_serializer(page if page is not None else qs, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+class ReposicionViewSet(PlanConsultaMixin, viewsets.ReadOnlyModelViewSet):
+    # ?bodega=<id> alertas de esa bodega; ?total=1 alertas sobre el stock de todas las bodegas
+    queryset = AlertaReposicion.objects.all()
+    serializer_class = AlertaReposicionSerializer
+    # permission_classes = [IsAuthenticated]
+    ordering = ("-faltante", "id")  # el Meta.ordering parte por bodega_id, nulo en las alertas totales
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        bodega = self.request.query_params.get("bodega")
+        if bodega and bodega.isdigit():
+            qs = qs.filter(bodega_id=int(bodega))
+        elif self.request.query_params.get("total") in ("1", "true"):
+            qs = qs.filter(bodega__isnull=True)
+        return qs
+
+class ResumenInventarioViewSet(viewsets.ReadOnlyModelViewSet):
+    # ?dimension=total|categoria|marca (total por defecto), ?bodega=<id>,
+    # ?global=1 suma todas las bodegas (sin paginar: una fila por grupo)
+    queryset = ResumenInventario.objects.all()
+    serializer_class = ResumenInventarioSerializer
+    # permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        dimension = (self.request.query_params.get("dimension") or "").upper()
+        qs = qs.filter(dimension=dimension if dimension in ResumenInventario.Dimension.values else ResumenInventario.Dimension.TOTAL)
+        qs = qs.exclude(cantidad=0, valor=0, productos=0)  # grupos que quedaron vacíos
+        bodega = self.request.query_params.get("bodega")
+        if bodega and bodega.isdigit():
+            qs = qs.filter(bodega_id=int(bodega))
+        return qs
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("global") not in ("1", "true"):
+            return super().list(request, *args, **kwargs)
+        filas = (
+            self.get_queryset().order_by().values("dimension", "referencia")
+            .annotate(cantidad=Sum("cantidad"), valor=Sum("valor"), productos=Sum("productos"))  # productos = pares producto-bodega
+            .order_by("-valor")
+        )
+        return Response(self.get_serializer([dict(f, bodega_id=None) for f in filas], many=True).data)
+
+class CacheReferenciaView(APIView):
+    # estadísticas de la cache de nombres (hit rate por modelo)
+    def get(self, request):
+        return Response(estadisticas_cache())
+
+def metricas(request):
+    # /bodega/metrics en formato de texto de Prometheus (ver metricas.py)
+    return HttpResponse(prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+class KardexViewSet(PlanConsultaMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Kardex.objects.all()
+    serializer_class = KardexSerializer
+    # permission_classes = [IsAuthenticated]
+
+class MovimientoEntradaViewSet(PosteoMixin, ExportacionMixin, FiltrosMixin, PlanConsultaMixin, viewsets.ModelViewSet):
+    queryset = MovimientoEntrada.objects.all()
+    serializer_class = MovimientoEntradaSerializer
+    # permission_classes = [IsAuthenticated]
+    filtros = {
+        "bodega": Filtro("bodega_id"),
+        "estado": Filtro("estado", elegir(BaseMovimiento.Estado.values)),
+        "fecha_desde": Filtro("fecha__gte", desde),
+        "fecha_hasta": Filtro("fecha__lte", hasta),
+        "referencia": Filtro("referencia", texto),
+        "producto": Filtro(lambda v: Q(pk__in=MovimientoLinea.objects.filter(producto_id=v).values("movimiento_entrada_id"))),
+        "proveedor": Filtro("proveedor_id"),
+    }
+    ordenamientos = ("fecha", "id")
+    # estado solo se filtra dentro de la bodega: con dos estados el índice no ayuda sin ella
+    consultas_indexadas = [
+        {"bodega": 1}, {"bodega": 1, "estado": "POSTEADO"},
+        {"bodega": 1, "estado": "POSTEADO", "fecha_desde": "2026-01-01", "fecha_hasta": "2026-01-31"},
+        {"fecha_desde": "2026-01-01"}, {"referencia": "OC-1"}, {"producto": 1}, {"proveedor": 1},
+    ]
+    export_columnas = [
+        ("movimiento", "movimiento_entrada_id"),
+        ("estado", "movimiento_entrada__estado"), ("fecha", "movimiento_entrada__fecha"),
+        ("bodega", "movimiento_entrada__bodega__nombre"),
+        ("proveedor", "movimiento_entrada__proveedor__nombre"),
+        ("referencia", "movimiento_entrada__referencia"),
+        ("linea", "id"),
+        ("producto_sku", "producto__sku"), ("producto_nombre", "producto__nombre"),
+        ("cantidad", "cantidad"), ("costo_unitario", "costo_unitario"),
+        ("lote", "lote"), ("vencimiento", "vencimiento"),
+    ]
+
+    def get_export_queryset(self):
+        # una fila por línea, con la cabecera del movimiento resuelta en el mismo query
+        movimientos = self.filter_queryset(self.get_queryset()).values("id")
+        return MovimientoLinea.objects.filter(movimiento_entrada__in=movimientos).order_by("movimiento_entrada_id", "id")
 
-class MovimientoSalidaViewSet(viewsets.ModelViewSet):
-    queryset = MovimientoSalida.objects.select_related("bodega", "creado_por").prefetch_related("lineas")
+class MovimientoSalidaViewSet(PosteoMixin, ExportacionMixin, FiltrosMixin, PlanConsultaMixin, viewsets.ModelViewSet):
+    queryset = MovimientoSalida.objects.all()
     serializer_class = MovimientoSalidaSerializer
     # permission_classes = [IsAuthenticated]
+    filtros = {
+        "bodega": Filtro("bodega_id"),
+        "estado": Filtro("estado", elegir(BaseMovimiento.Estado.values)),
+        "fecha_desde": Filtro("fecha__gte", desde),
+        "fecha_hasta": Filtro("fecha__lte", hasta),
+        "referencia": Filtro("referencia", texto),
+        "producto": Filtro(lambda v: Q(pk__in=MovimientoLinea.objects.filter(producto_id=v).values("movimiento_salida_id"))),
+    }
+    ordenamientos = ("fecha", "id")
+    # estado solo se filtra dentro de la bodega: con dos estados el índice no ayuda sin ella
+    consultas_indexadas = [
+        {"bodega": 1}, {"bodega": 1, "estado": "POSTEADO"},
+        {"bodega": 1, "estado": "POSTEADO", "fecha_desde": "2026-01-01", "fecha_hasta": "2026-01-31"},
+        {"fecha_desde": "2026-01-01"}, {"referencia": "OC-1"}, {"producto": 1},
+    ]
+    export_columnas = [
+        ("movimiento", "movimiento_salida_id"),
+        ("estado", "movimiento_salida__estado"), ("fecha", "movimiento_salida__fecha"),
+        ("bodega", "movimiento_salida__bodega__nombre"),
+        ("destino", "movimiento_salida__destino"),
+        ("referencia", "movimiento_salida__referencia"),
+        ("linea", "id"),
+        ("producto_sku", "producto__sku"), ("producto_nombre", "producto__nombre"),
+        ("cantidad", "cantidad"),
+        ("lote", "lote"), ("vencimiento", "vencimiento"),
+    ]
 
-    @action(detail=True, methods=["post"])
-    def postear(self, request, pk=None):
-        movimiento = self.get_object()
+    def get_export_queryset(self):
+        # una fila por línea, con la cabecera del movimiento resuelta en el mismo query
+        movimientos = self.filter_queryset(self.get_queryset()).values("id")
+        return MovimientoLinea.objects.filter(movimiento_salida__in=movimientos).order_by("movimiento_salida_id", "id")
+
+class MovimientoTransferenciaViewSet(PosteoMixin, ExportacionMixin, FiltrosMixin, PlanConsultaMixin, viewsets.ModelViewSet):
+    queryset = MovimientoTransferencia.objects.all()
+    serializer_class = MovimientoTransferenciaSerializer
+    # permission_classes = [IsAuthenticated]
+    filtros = {
+        "bodega": Filtro("bodega_id"),
+        "bodega_destino": Filtro("bodega_destino_id"),
+        "estado": Filtro("estado", elegir(BaseMovimiento.Estado.values)),
+        "fecha_desde": Filtro("fecha__gte", desde),
+        "fecha_hasta": Filtro("fecha__lte", hasta),
+        "referencia": Filtro("referencia", texto),
+        "producto": Filtro(lambda v: Q(pk__in=MovimientoLinea.objects.filter(producto_id=v).values("movimiento_transferencia_id"))),
+    }
+    ordenamientos = ("fecha", "id")
+    consultas_indexadas = [
+        {"bodega": 1}, {"bodega": 1, "estado": "POSTEADO"}, {"bodega_destino": 1, "estado": "POSTEADO"},
+        {"fecha_desde": "2026-01-01"}, {"referencia": "OC-1"}, {"producto": 1},
+    ]
+    export_columnas = [
+        ("movimiento", "movimiento_transferencia_id"),
+        ("estado", "movimiento_transferencia__estado"), ("fecha", "movimiento_transferencia__fecha"),
+        ("bodega", "movimiento_transferencia__bodega__nombre"),
+        ("bodega_destino", "movimiento_transferencia__bodega_destino__nombre"),
+        ("referencia", "movimiento_transferencia__referencia"),
+        ("linea", "id"),
+        ("producto_sku", "producto__sku"), ("producto_nombre", "producto__nombre"),
+        ("cantidad", "cantidad"),
+        ("lote", "lote"), ("vencimiento", "vencimiento"),
+    ]
+
+    def get_export_queryset(self):
+        # una fila por línea, con la cabecera del movimiento resuelta en el mismo query
+        movimientos = self.filter_queryset(self.get_queryset()).values("id")
+        return MovimientoLinea.objects.filter(movimiento_transferencia__in=movimientos).order_by("movimiento_transferencia_id", "id")
+
+class SyncView(APIView):
+    """
+    GET /bodega/sync/?since=<token>&limite=500
+    Feed de cambios para clientes offline (ver sync.py): sin since entrega todo;
+    se pide con "siguiente" mientras "mas" sea true y el último "siguiente" se
+    guarda para la próxima conexión. 410 = token vencido, resincronizar sin since.
+    """
+    # permission_classes = [IsAuthenticated]
 
+    def get(self, request):
+        limite = request.query_params.get("limite", "")
+        limite = min(int(limite), SYNC_LIMITE_MAXIMO) if limite.isdigit() and int(limite) > 0 else None
         try:
-            movimiento.postear()
-        except Exception as e:
+            data = sync_cambios(request.query_params.get("since") or None, **({"limite": limite} if limite else {}))
+        except TokenInvalido as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except TokenVencido as e:
+            return Response({"detail": str(e)}, status=status.HTTP_410_GONE)
+        return Response(data)
 
-        serializer = self.get_serializer(movimiento)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+class PostearLoteView(APIView):
+    """
+    POST {"entradas": [ids], "salidas": [ids], "transferencias": [ids], "atomico": false}
+    Postea varios movimientos en una sola transacción (ver postear_documentos).
+    Por defecto se postean los que se pueden y se informan los rechazados;
+    con "atomico": true basta un rechazo para no postear ninguno.
+    """
+    # permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        ids = {}
+        for clave in ("entradas", "salidas", "transferencias"):
+            valor = request.data.get(clave) or []
+            if not isinstance(valor, list) or not all(isinstance(i, int) for i in valor):
+                return Response({"detail": f"'{clave}' debe ser una lista de ids."}, status=status.HTTP_400_BAD_REQUEST)
+            ids[clave] = list(dict.fromkeys(valor))
+        if not any(ids.values()):
+            return Response({"detail": "No hay movimientos para postear."}, status=status.HTTP_400_BAD_REQUEST)
+        atomico = bool(request.data.get("atomico"))
+
+        def postear():
+            documentos = {
+                clave: modelo.objects.select_for_update().in_bulk(ids[clave])
+                for clave, modelo in (
+                    ("entradas", MovimientoEntrada), ("salidas", MovimientoSalida), ("transferencias", MovimientoTransferencia),
+                )
+            }
+            resultados = postear_documentos([d for docs in documentos.values() for d in docs.values()])
+            faltantes = sum(len(ids[c]) - len(documentos[c]) for c in ids)
+            rechazados = faltantes + sum(1 for error in resultados.values() if error)
+            if atomico and rechazados:
+                transaction.set_rollback(True)
+            return documentos, resultados, rechazados
+
+        try:
+            documentos, resultados, rechazados = con_reintentos(postear)
+        except (ConflictoStock, OperationalError, ValidationError) as e:
+            return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+        except IntegrityError:
+            # un CHECK/UNIQUE de la base (stock negativo, lote duplicado): no se posteó nada
+            return Response({"detail": "La base rechazó el posteo por una restricción de integridad; reintente."}, status=status.HTTP_409_CONFLICT)
+        deshacer = atomico and rechazados > 0
+
+        respuesta = {"posteados": 0, "rechazados": rechazados}
+        for clave in ids:
+            respuesta[clave] = []
+            for pk in ids[clave]:
+                doc = documentos[clave].get(pk)
+                error = "No existe." if doc is None else resultados[doc]
+                posteado = error is None and not deshacer
+                respuesta["posteados"] += posteado
+                respuesta[clave].append({"id": pk, "posteado": posteado, "detail": error})
+        return Response(respuesta, status=status.HTTP_200_OK)